@@ -6,17 +6,14 @@ os.environ["LOCAL_INFERENCE_API_URL"] = "http://localhost:9001"
 from dotenv import load_dotenv
 load_dotenv("config.env")
 
-# 2. Import the InferencePipeline library
-from inference import InferencePipeline
 import cv2
 import time
+import argparse
 from twilio.rest import Client
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-from datetime import datetime, timedelta
-import csv
-from collections import defaultdict
+from datetime import datetime
 import threading
+from csv_log import RotatingCsvLog
+from live_plot import LivePlot
 
 # Twilio configuration
 TWILIO_API_KEY_SID = os.environ.get("TWILIO_API_KEY_SID")
@@ -26,8 +23,10 @@ TWILIO_FROM_NUMBER = os.environ.get("TWILIO_FROM_NUMBER")
 TWILIO_TO_NUMBER = os.environ.get("TWILIO_TO_NUMBER")
 SMS_COOLDOWN_SECONDS = 10
 
-# Initialize Twilio client with API Key
-twilio_client = Client(TWILIO_API_KEY_SID, TWILIO_API_KEY_SECRET, TWILIO_ACCOUNT_SID)
+# Created in main; the plot process imports this file and must not start anything
+twilio_client = None
+counts_log = None
+live_plot = None
 
 # Track last SMS sent time
 last_sms_time = 0
@@ -38,82 +37,13 @@ last_save_time = 0
 # CSV file path
 csv_file_path = "milk_bottle_counts.csv"
 
-# Data storage for plotting (in-memory for past hour)
-data_history = {
-    "whole": [],
-    "1pct": [],
-    "2pct": []
-}
-timestamps = []
-
-# Initialize CSV file if it doesn't exist
-if not os.path.exists(csv_file_path):
-    with open(csv_file_path, 'w', newline='') as f:
-        writer = csv.writer(f)
-        writer.writerow(['timestamp', 'flavor', 'count'])
-
-# Set up matplotlib for real-time plotting
-plt.ion()
-fig, ax = plt.subplots(figsize=(10, 6))
-colors = {
-    "whole": "blue",
-    "1pct": "green",
-    "2pct": "red"
-}
-category_names = {
-    "whole": "Whole Milk",
-    "1pct": "1% Milk",
-    "2pct": "2% Milk"
-}
+# Newest annotated frame; shown from the main thread so the sink never waits on the GUI
+latest_frame = None
+frame_lock = threading.Lock()
 
 def save_counts_to_csv(timestamp, counts):
     """Save counts to CSV file."""
-    with open(csv_file_path, 'a', newline='') as f:
-        writer = csv.writer(f)
-        for flavor in ["whole", "1pct", "2pct"]:
-            count = counts.get(flavor, 0)
-            writer.writerow([timestamp, flavor, count])
-
-def update_plot():
-    """Update the matplotlib plot with latest data."""
-    ax.clear()
-
-    # Filter data to only show past hour
-    one_hour_ago = datetime.now() - timedelta(hours=1)
-
-    for flavor in ["whole", "1pct", "2pct"]:
-        # Filter timestamps and data for past hour
-        filtered_times = []
-        filtered_counts = []
-
-        for i, ts in enumerate(timestamps):
-            if ts >= one_hour_ago:
-                filtered_times.append(ts)
-                filtered_counts.append(data_history[flavor][i] if i < len(data_history[flavor]) else 0)
-
-        if filtered_times:
-            ax.plot(filtered_times, filtered_counts,
-                   label=category_names[flavor],
-                   color=colors[flavor],
-                   linewidth=2,
-                   marker='o',
-                   markersize=4)
-
-    ax.set_xlabel('Time')
-    ax.set_ylabel('Count')
-    ax.set_title('Milk Bottle Counts (Past Hour)')
-    ax.legend()
-    ax.grid(True, alpha=0.3)
-
-    # Format x-axis to show time nicely
-    ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M'))
-    plt.xticks(rotation=45)
-    plt.tight_layout()
-
-    try:
-        plt.pause(0.01)
-    except:
-        pass
+    counts_log.append([[timestamp, flavor, counts.get(flavor, 0)] for flavor in ["whole", "1pct", "2pct"]])
 
 def send_sms_alert(missing_categories):
     """Send SMS alert for missing milk categories with cooldown."""
@@ -163,7 +93,7 @@ def send_sms_alert(missing_categories):
         print(f"Error sending SMS: {e}")
 
 def my_sink(result, video_frame):
-    global last_print_time, last_save_time, timestamps
+    global last_print_time, last_save_time, latest_frame
 
     if result.get("annotated_image"):
         # Get the annotated image
@@ -181,21 +111,8 @@ def my_sink(result, video_frame):
             # Save to CSV
             save_counts_to_csv(timestamp.strftime('%Y-%m-%d %H:%M:%S'), counts)
 
-            # Update in-memory data for plotting
-            timestamps.append(timestamp)
-            for flavor in ["whole", "1pct", "2pct"]:
-                data_history[flavor].append(counts.get(flavor, 0))
-
-            # Remove data older than 1 hour
-            one_hour_ago = datetime.now() - timedelta(hours=1)
-            while timestamps and timestamps[0] < one_hour_ago:
-                timestamps.pop(0)
-                for flavor in ["whole", "1pct", "2pct"]:
-                    if data_history[flavor]:
-                        data_history[flavor].pop(0)
-
-            # Update plot
-            update_plot()
+            # Hand the sample to the plot process (never blocks)
+            live_plot.add(timestamp, counts)
 
             last_save_time = current_time
 
@@ -268,9 +185,9 @@ def my_sink(result, video_frame):
             # Send SMS alert
             #send_sms_alert(missing)
 
-        # Display the image
-        cv2.imshow("Workflow Image", display_image)
-        cv2.waitKey(1)
+        # Displayed by the main thread
+        with frame_lock:
+            latest_frame = display_image
 
     # Print results every 2 seconds
     current_time = time.time()
@@ -279,16 +196,54 @@ def my_sink(result, video_frame):
         last_print_time = current_time
 
 
-# 2. Initialize a pipeline object
-pipeline = InferencePipeline.init_with_workflow(
-    api_key=os.environ.get("ROBOFLOW_API_KEY"),
-    workspace_name="edss",
-    workflow_id="count-milk-alerts",
-    video_reference=0, # Path to video, device id (int, usually 0 for built in webcams), or RTSP stream url
-    max_fps=10,
-    on_prediction=my_sink
-)
-
-# 3. Start the pipeline and wait for it to finish
-pipeline.start()
-pipeline.join()
+def show_frames(pipeline_thread):
+    """Show the newest annotated frame until the pipeline ends (HighGUI wants the main thread)."""
+    shown = None
+    while pipeline_thread.is_alive():
+        with frame_lock:
+            frame = latest_frame
+        if frame is not None and frame is not shown:
+            cv2.imshow("Workflow Image", frame)
+            shown = frame
+        cv2.waitKey(30)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Count milk bottles from the webcam with a live plot")
+    parser.add_argument("--headless", action="store_true",
+                        help="No windows: write the plot to a PNG instead (e.g. over SSH)")
+    parser.add_argument("--plot-png", default="milk_bottle_counts.png", help="PNG written in headless mode")
+    parser.add_argument("--png-seconds", type=float, default=10, help="Seconds between PNG updates")
+    args = parser.parse_args()
+
+    # Initialize Twilio client with API Key
+    twilio_client = Client(TWILIO_API_KEY_SID, TWILIO_API_KEY_SECRET, TWILIO_ACCOUNT_SID)
+
+    # Current day's counts; older days are gzipped under csv_archive/ (see csv_log.py)
+    counts_log = RotatingCsvLog(csv_file_path, ['timestamp', 'flavor', 'count'])
+
+    # The plot renders in its own process, fed by a queue
+    live_plot = LivePlot(headless=args.headless, png_path=args.plot_png, png_seconds=args.png_seconds)
+
+    # 2. Import the InferencePipeline library (not at the top: the plot process imports this file)
+    from inference import InferencePipeline
+
+    # 3. Initialize a pipeline object
+    pipeline = InferencePipeline.init_with_workflow(
+        api_key=os.environ.get("ROBOFLOW_API_KEY"),
+        workspace_name="edss",
+        workflow_id="count-milk-alerts",
+        video_reference=0, # Path to video, device id (int, usually 0 for built in webcams), or RTSP stream url
+        max_fps=10,
+        on_prediction=my_sink
+    )
+
+    # 4. Start the pipeline and wait for it to finish
+    pipeline.start()
+    if args.headless:
+        pipeline.join()
+    else:
+        pipeline_thread = threading.Thread(target=pipeline.join, daemon=True)
+        pipeline_thread.start()
+        show_frames(pipeline_thread)
+    live_plot.close()
@@ -1,18 +1,36 @@
 """
 Flask web application for monitoring milk bottle counts in real-time.
 Provides a web interface with two tabs: Live Video and Analytics Graph.
+
+The inference stack and OpenCV are imported lazily, so the dashboard (with
+history restored from the warm-start snapshot) is served while the pipeline
+is still loading.
 """
 
+import time
+STARTED_AT = time.time()  # Startup timings are measured from here
+
 import os
-from flask import Flask, render_template, Response, jsonify
+import sys
+import atexit
+import signal
+from flask import Flask, render_template, Response, jsonify, abort, send_from_directory, request
 from flask_socketio import SocketIO, emit
 from dotenv import load_dotenv
-import cv2
-import time
 from datetime import datetime, timedelta
 import csv
 from threading import Lock
-from inference import InferencePipeline
+from payload_cache import PayloadCache
+from stage_pipeline import StagePipeline
+from evidence_recorder import EvidenceRecorder, EVIDENCE_DIR
+from stream_variants import StreamVariants
+from warm_start import save_snapshot, load_snapshot, Readiness
+from workflow_cache import load_workflow
+from pipeline_supervisor import PipelineSupervisor
+from count_smoother import CountSmoother
+from consumption_forecast import ConsumptionForecaster
+from csv_log import RotatingCsvLog
+from sampling_profiler import is_admin, profile_response
 
 # Load environment variables
 load_dotenv("config.env")
@@ -25,12 +43,27 @@ socketio = SocketIO(app, cors_allowed_origins="*")
 # Global variables
 csv_file_path = "milk_bottle_counts.csv"
 alerts_csv_path = "milk_bottle_alerts.csv"
-last_save_time = 0
-last_frame = None
-frame_lock = Lock()
+# History and alerts are saved here whenever they change and reloaded on start
+snapshot_path = "dashboard_snapshot.json"
+# Newest annotated frame and its per-client encodings for /video_feed
+stream = StreamVariants()
+
+# Share camera frames through a shared-memory ring so extra consumers
+# (recording, snapshot tools) never open the device a second time
+USE_SHARED_FRAME_RING = os.environ.get("SHARED_FRAME_RING", "0").lower() in ("1", "true", "yes")
+FRAME_RING_NAME = os.environ.get("FRAME_RING_NAME", "milk_frames")
+capture_process = None
+
+# Also keep full-size pre-alert frames in a daily frame pack (see frame_pack.py)
+EVIDENCE_PACK = os.environ.get("EVIDENCE_PACK", "0").lower() in ("1", "true", "yes")
+
+# Enables /admin/profile for requests that send this token (unset: disabled)
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
 
 # Alert cooldown period (in seconds) - should match Roboflow's SMS cooldown
 ALERT_COOLDOWN_SECONDS = 500
+# Time to empty is re-checked this often between count changes
+FORECAST_REFRESH_SECONDS = 60
 
 # Data storage for plotting (in-memory for past hour)
 data_history = {
@@ -41,31 +74,31 @@ data_history = {
 timestamps = []
 data_lock = Lock()
 
+# Filters flapping per-frame results into confirmed count_changed/stock_out events
+smoother = CountSmoother(["whole", "1pct", "2pct"])
+# Consumption rates and time-to-empty, updated from each confirmed count change
+forecaster = ConsumptionForecaster(["whole", "1pct", "2pct"])
+
 # Alerts tracking
 alerts_history = []
 alerts_lock = Lock()
 last_alert_time = 0  # Track when the last alert was sent
+alert_pending = False  # A stock-out held back by the cooldown, raised once it expires
 
-# Initialize CSV files if they don't exist
-if not os.path.exists(csv_file_path):
-    with open(csv_file_path, 'w', newline='') as f:
-        writer = csv.writer(f)
-        writer.writerow(['timestamp', 'flavor', 'count'])
+# Counts CSV holds the current day; older days are gzipped under csv_archive/ (see csv_log.py)
+counts_log = RotatingCsvLog(csv_file_path, ['timestamp', 'flavor', 'count'])
 
+# Initialize alerts CSV file if it doesn't exist
 if not os.path.exists(alerts_csv_path):
     with open(alerts_csv_path, 'w', newline='') as f:
         writer = csv.writer(f)
-        writer.writerow(['timestamp', 'missing_categories'])
+        writer.writerow(['timestamp', 'missing_categories', 'evidence'])
 
 def save_counts_to_csv(timestamp, counts):
     """Save counts to CSV file."""
-    with open(csv_file_path, 'a', newline='') as f:
-        writer = csv.writer(f)
-        for flavor in ["whole", "1pct", "2pct"]:
-            count = counts.get(flavor, 0)
-            writer.writerow([timestamp, flavor, count])
+    counts_log.append([[timestamp, flavor, counts.get(flavor, 0)] for flavor in ["whole", "1pct", "2pct"]])
 
-def save_alert_to_csv(timestamp, missing_categories):
+def save_alert_to_csv(timestamp, missing_categories, evidence=''):
     """Save alert to CSV file."""
     category_names = {
         "whole": "Whole Milk",
@@ -77,20 +110,61 @@ def save_alert_to_csv(timestamp, missing_categories):
 
     with open(alerts_csv_path, 'a', newline='') as f:
         writer = csv.writer(f)
-        writer.writerow([timestamp, missing_text])
+        writer.writerow([timestamp, missing_text, evidence])
 
-def get_recent_alerts(limit=50):
-    """Get recent alerts from CSV file."""
+def load_alerts_from_csv(limit=100):
+    """Load the most recent alerts from the CSV file (oldest first)."""
     alerts = []
     try:
         with open(alerts_csv_path, 'r') as f:
             reader = csv.DictReader(f)
             for row in reader:
+                # Files created before evidence links have a two-column header
+                extra = row.pop(None, None) or []
+                evidence = row.pop('evidence', None) or (extra[0] if extra else '')
+                if evidence:
+                    row['evidence'] = f"/evidence/{evidence}"
                 alerts.append(row)
-        # Return most recent alerts first
-        return list(reversed(alerts[-limit:]))
+                if len(alerts) > limit:
+                    alerts.pop(0)
     except FileNotFoundError:
-        return []
+        pass
+    return alerts
+
+def restore_history():
+    """Seed in-memory history and alerts from the warm-start snapshot, else the alerts CSV."""
+    global last_alert_time
+    snapshot = load_snapshot(snapshot_path)
+    if snapshot is None:
+        alerts_history.extend(load_alerts_from_csv())
+        return
+
+    timestamps.extend(snapshot["timestamps"])
+    for flavor in data_history:
+        data_history[flavor].extend(snapshot["data"].get(flavor, []))
+    # Alerts written after the snapshot (e.g. before a crash) are only in the CSV
+    csv_newer = os.path.exists(alerts_csv_path) and os.path.getmtime(alerts_csv_path) > snapshot["saved_at"]
+    alerts_history.extend(load_alerts_from_csv() if csv_newer else snapshot["alerts"])
+    # Keep the alert cooldown running across the restart
+    last_alert_time = snapshot.get("last_alert_time", 0)
+    forecaster.restore(snapshot.get("forecast"))
+    print(f"✓ Restored {len(timestamps)} samples and {len(alerts_history)} alerts from {snapshot_path}")
+
+def save_history():
+    """Write the warm-start snapshot."""
+    with data_lock:
+        history = (list(timestamps), {flavor: list(values) for flavor, values in data_history.items()})
+    with alerts_lock:
+        alerts = list(alerts_history)
+    save_snapshot(snapshot_path, *history, alerts, last_alert_time=last_alert_time, forecast=forecaster.state())
+
+# Seed in-memory state once so requests never re-parse the CSV
+restore_history()
+
+def get_recent_alerts(limit=50):
+    """Get recent alerts from memory, most recent first."""
+    with alerts_lock:
+        return list(reversed(alerts_history[-limit:]))
 
 def get_graph_data():
     """Get data for plotting (past hour only)."""
@@ -105,8 +179,9 @@ def get_graph_data():
         }
 
         for i, ts in enumerate(timestamps):
-            if ts >= one_hour_ago:
-                graph_data["timestamps"].append(ts.strftime('%Y-%m-%d %H:%M:%S'))
+            # Samples are only taken on changes, so the newest older one gives the starting value
+            if ts >= one_hour_ago or i + 1 == len(timestamps) or timestamps[i + 1] > one_hour_ago:
+                graph_data["timestamps"].append(max(ts, one_hour_ago).strftime('%Y-%m-%d %H:%M:%S'))
                 for flavor in ["whole", "1pct", "2pct"]:
                     if i < len(data_history[flavor]):
                         graph_data[flavor].append(data_history[flavor][i])
@@ -115,164 +190,229 @@ def get_graph_data():
 
         return graph_data
 
+# Pre-serialized payloads, rebuilt by the sink whenever the data changes
+graph_payload = PayloadCache('graph', get_graph_data)
+alerts_payload = PayloadCache('alerts', get_recent_alerts)
+graph_payload.rebuild()
+alerts_payload.rebuild()
+
 def my_sink(result, video_frame):
-    """Process predictions from Roboflow workflow."""
-    global last_save_time, last_frame, timestamps, last_alert_time
+    """Process predictions from Roboflow workflow.
 
-    if result.get("annotated_image"):
-        # Get the annotated image
-        display_image = result["annotated_image"].numpy_image.copy()
+    Runs on the inference callback thread, so it only hands results to the
+    stage pipeline; overlay, persistence and broadcast run on their own threads.
+    """
+    supervisor.result_received(time.time())
+    if not readiness.ready:
+        readiness.set("ready")
 
-        # Get counts and missing categories
+    if result.get("annotated_image"):
         counts = result.get("counts", {})
-        missing = result.get("missing", [])
-
-        # Track alerts with cooldown logic
-        # An alert is sent only if:
-        # 1. There are missing categories
-        # 2. Cooldown period has passed since last alert
-        current_time = time.time()
-        if missing and (current_time - last_alert_time >= ALERT_COOLDOWN_SECONDS):
-            timestamp = datetime.now()
-            timestamp_str = timestamp.strftime('%Y-%m-%d %H:%M:%S')
-
-            # Save alert to CSV
-            save_alert_to_csv(timestamp_str, missing)
-
-            # Add to in-memory alerts history
-            with alerts_lock:
-                category_names = {
-                    "whole": "Whole Milk",
-                    "1pct": "1% Milk",
-                    "2pct": "2% Milk"
-                }
-                missing_names = [category_names.get(m, m) for m in missing]
-                alerts_history.append({
-                    "timestamp": timestamp_str,
-                    "missing_categories": ", ".join(missing_names)
-                })
-                # Keep only last 100 alerts in memory
-                if len(alerts_history) > 100:
-                    alerts_history.pop(0)
-
-            # Emit alert update to all connected clients
-            socketio.emit('alert_update', {
+        now = time.time()
+        events = smoother.update(counts, result.get("missing", []), now)
+        # Live counts on the video, but only a confirmed stock-out raises the banner
+        sink_stages.submit('overlay', (result["annotated_image"].numpy_image, counts, smoother.missing))
+        if events or alert_due(now):
+            sink_stages.submit('persist', (now, datetime.now(), events, smoother.counts, smoother.missing))
+
+def alert_due(now):
+    """True when a stock-out held back by the cooldown can be raised."""
+    return alert_pending and now - last_alert_time >= ALERT_COOLDOWN_SECONDS
+
+def persist_stage(item):
+    """Handle confirmed count events: alerts, CSV writes, graph data and Socket.IO broadcast."""
+    global last_alert_time, alert_pending
+
+    current_time, received_at, events, counts, missing = item
+    for event in events:
+        socketio.emit(event["type"], event)
+
+    # Track alerts with cooldown logic
+    # An alert is sent only if:
+    # 1. A stock-out was confirmed (and a flavor is still missing)
+    # 2. Cooldown period has passed since last alert
+    # A stock-out inside the cooldown stays pending until it expires
+    if any(event["type"] == "stock_out" for event in events):
+        alert_pending = True
+    if not missing:
+        alert_pending = False
+    if alert_pending and (current_time - last_alert_time >= ALERT_COOLDOWN_SECONDS):
+        timestamp = received_at
+        timestamp_str = timestamp.strftime('%Y-%m-%d %H:%M:%S')
+
+        # Write the pre-alert frames in the background
+        evidence = evidence_recorder.capture(f"alert_{timestamp.strftime('%Y%m%d_%H%M%S')}") or ''
+
+        # Save alert to CSV
+        save_alert_to_csv(timestamp_str, missing, evidence)
+
+        # Add to in-memory alerts history
+        with alerts_lock:
+            category_names = {
+                "whole": "Whole Milk",
+                "1pct": "1% Milk",
+                "2pct": "2% Milk"
+            }
+            missing_names = [category_names.get(m, m) for m in missing]
+            alert = {
                 "timestamp": timestamp_str,
                 "missing_categories": ", ".join(missing_names)
-            })
-
-            # Update last alert time
-            last_alert_time = current_time
-
-        # Save data every 5 seconds
-        current_time = time.time()
-        if current_time - last_save_time >= 5:
-            timestamp = datetime.now()
-
-            # Save to CSV
-            save_counts_to_csv(timestamp.strftime('%Y-%m-%d %H:%M:%S'), counts)
-
-            # Update in-memory data for plotting
-            with data_lock:
-                timestamps.append(timestamp)
+            }
+            if evidence:
+                alert["evidence"] = f"/evidence/{evidence}"
+            alerts_history.append(alert)
+            # Keep only last 100 alerts in memory
+            if len(alerts_history) > 100:
+                alerts_history.pop(0)
+        alerts_payload.rebuild()
+
+        # Emit alert update to all connected clients
+        socketio.emit('alert_update', alert)
+
+        # Update last alert time
+        last_alert_time = current_time
+        alert_pending = False
+
+    # Record counts whenever a confirmed count changes
+    if any(event["type"] == "count_changed" for event in events):
+        timestamp = received_at
+
+        # Save to CSV
+        save_counts_to_csv(timestamp.strftime('%Y-%m-%d %H:%M:%S'), counts)
+
+        # Update in-memory data for plotting
+        with data_lock:
+            timestamps.append(timestamp)
+            for flavor in ["whole", "1pct", "2pct"]:
+                data_history[flavor].append(counts.get(flavor, 0))
+
+            # Remove data older than 1 hour, keeping the sample in effect at the cutoff
+            one_hour_ago = datetime.now() - timedelta(hours=1)
+            while len(timestamps) > 1 and timestamps[1] < one_hour_ago:
+                timestamps.pop(0)
                 for flavor in ["whole", "1pct", "2pct"]:
-                    data_history[flavor].append(counts.get(flavor, 0))
+                    if data_history[flavor]:
+                        data_history[flavor].pop(0)
+
+        # Emit graph update to all connected clients (serialized once for all)
+        socketio.emit('graph_update', graph_payload.rebuild())
+
+        # Removals, restocks and time-to-empty; low_stock warns before the shelf is empty
+        forecast_events = []
+        for event in events:
+            if event["type"] == "count_changed":
+                forecast_events += forecaster.update(event["flavor"], event["count"], event["time"])
+        emit_forecast(forecast_events, current_time)
+
+    # Changes are infrequent, so snapshot each one for a crash-safe warm start
+    save_history()
+
+def emit_forecast(forecast_events, now):
+    """Broadcast removal/restock/low_stock events and the current forecast."""
+    for forecast_event in forecast_events:
+        socketio.emit(forecast_event["type"], forecast_event)
+        if forecast_event["type"] == "low_stock":
+            print(f"⚠ Low stock: {forecast_event['flavor']} forecast to run out in "
+                  f"{forecast_event['minutes_to_empty']:.0f} min")
+    socketio.emit('forecast_update', {"forecast": forecaster.forecast(now)})
+
+def refresh_forecast():
+    """Move time to empty on with the clock, so it counts down and warns between count changes."""
+    while True:
+        time.sleep(FORECAST_REFRESH_SECONDS)
+        now = time.time()
+        emit_forecast(forecaster.refresh(now), now)
+
+def overlay_stage(item):
+    """Draw the count and alert overlays and encode the JPEG served by /video_feed."""
+    import cv2
+    image, counts, missing = item
+    display_image = image.copy()
+
+    # Draw count box in top-left corner
+    box_x, box_y = 10, 10
+    box_width = 250
+    line_height = 35
+    padding = 15
+
+    # Calculate box height based on number of categories
+    num_lines = 3  # whole, 1pct, 2pct
+    box_height = padding * 2 + line_height * num_lines
+
+    # Draw semi-transparent background for counts
+    overlay = display_image.copy()
+    cv2.rectangle(overlay, (box_x, box_y), (box_x + box_width, box_y + box_height), (0, 0, 0), -1)
+    cv2.addWeighted(overlay, 0.7, display_image, 0.3, 0, display_image)
+
+    # Draw border
+    cv2.rectangle(display_image, (box_x, box_y), (box_x + box_width, box_y + box_height), (255, 255, 255), 2)
+
+    # Display counts
+    y_offset = box_y + padding + 25
+    categories = [
+        ("whole", "Whole Milk"),
+        ("1pct", "1% Milk"),
+        ("2pct", "2% Milk")
+    ]
+
+    for key, label in categories:
+        count = counts.get(key, 0)
+        text = f"{label}: {count}"
+        cv2.putText(display_image, text, (box_x + padding, y_offset),
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+        y_offset += line_height
+
+    # Display missing categories alert if any
+    if missing:
+        img_height = display_image.shape[0]
+        alert_height = 80
+        alert_y = img_height - alert_height - 20
+        alert_x = 10
+        alert_width = display_image.shape[1] - 20
+
+        # Draw red alert box
+        overlay = display_image.copy()
+        cv2.rectangle(overlay, (alert_x, alert_y), (alert_x + alert_width, alert_y + alert_height), (0, 0, 200), -1)
+        cv2.addWeighted(overlay, 0.8, display_image, 0.2, 0, display_image)
 
-                # Remove data older than 1 hour
-                one_hour_ago = datetime.now() - timedelta(hours=1)
-                while timestamps and timestamps[0] < one_hour_ago:
-                    timestamps.pop(0)
-                    for flavor in ["whole", "1pct", "2pct"]:
-                        if data_history[flavor]:
-                            data_history[flavor].pop(0)
+        # Draw border
+        cv2.rectangle(display_image, (alert_x, alert_y), (alert_x + alert_width, alert_y + alert_height), (0, 0, 255), 3)
 
-            # Emit graph update to all connected clients
-            socketio.emit('graph_update', get_graph_data())
+        # Format missing categories
+        category_names = {
+            "whole": "Whole Milk",
+            "1pct": "1% Milk",
+            "2pct": "2% Milk"
+        }
+        missing_names = [category_names.get(m, m) for m in missing]
+        missing_text = ", ".join(missing_names)
 
-            last_save_time = current_time
+        # Draw "MISSING:" label
+        cv2.putText(display_image, "MISSING:", (alert_x + 20, alert_y + 35),
+                   cv2.FONT_HERSHEY_SIMPLEX, 1.2, (255, 255, 255), 3)
 
-        # Draw count box in top-left corner
-        box_x, box_y = 10, 10
-        box_width = 250
-        line_height = 35
-        padding = 15
+        # Draw missing category names
+        cv2.putText(display_image, missing_text, (alert_x + 20, alert_y + 65),
+                   cv2.FONT_HERSHEY_SIMPLEX, 1.0, (255, 255, 255), 2)
 
-        # Calculate box height based on number of categories
-        num_lines = 3  # whole, 1pct, 2pct
-        box_height = padding * 2 + line_height * num_lines
+    # Encode once here so stream clients only copy bytes
+    ret, buffer = cv2.imencode('.jpg', display_image)
+    if ret:
+        frame = buffer.tobytes()
+        stream.publish(display_image, frame)
+        evidence_recorder.add_jpeg(frame)
 
-        # Draw semi-transparent background for counts
-        overlay = display_image.copy()
-        cv2.rectangle(overlay, (box_x, box_y), (box_x + box_width, box_y + box_height), (0, 0, 0), -1)
-        cv2.addWeighted(overlay, 0.7, display_image, 0.3, 0, display_image)
+# Last few seconds of stream frames, written out as an image strip per alert
+evidence_recorder = EvidenceRecorder(pack_frames=EVIDENCE_PACK)
 
-        # Draw border
-        cv2.rectangle(display_image, (box_x, box_y), (box_x + box_width, box_y + box_height), (255, 255, 255), 2)
-
-        # Display counts
-        y_offset = box_y + padding + 25
-        categories = [
-            ("whole", "Whole Milk"),
-            ("1pct", "1% Milk"),
-            ("2pct", "2% Milk")
-        ]
-
-        for key, label in categories:
-            count = counts.get(key, 0)
-            text = f"{label}: {count}"
-            cv2.putText(display_image, text, (box_x + padding, y_offset),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-            y_offset += line_height
-
-        # Display missing categories alert if any
-        if missing:
-            img_height = display_image.shape[0]
-            alert_height = 80
-            alert_y = img_height - alert_height - 20
-            alert_x = 10
-            alert_width = display_image.shape[1] - 20
-
-            # Draw red alert box
-            overlay = display_image.copy()
-            cv2.rectangle(overlay, (alert_x, alert_y), (alert_x + alert_width, alert_y + alert_height), (0, 0, 200), -1)
-            cv2.addWeighted(overlay, 0.8, display_image, 0.2, 0, display_image)
-
-            # Draw border
-            cv2.rectangle(display_image, (alert_x, alert_y), (alert_x + alert_width, alert_y + alert_height), (0, 0, 255), 3)
-
-            # Format missing categories
-            category_names = {
-                "whole": "Whole Milk",
-                "1pct": "1% Milk",
-                "2pct": "2% Milk"
-            }
-            missing_names = [category_names.get(m, m) for m in missing]
-            missing_text = ", ".join(missing_names)
-
-            # Draw "MISSING:" label
-            cv2.putText(display_image, "MISSING:", (alert_x + 20, alert_y + 35),
-                       cv2.FONT_HERSHEY_SIMPLEX, 1.2, (255, 255, 255), 3)
-
-            # Draw missing category names
-            cv2.putText(display_image, missing_text, (alert_x + 20, alert_y + 65),
-                       cv2.FONT_HERSHEY_SIMPLEX, 1.0, (255, 255, 255), 2)
-
-        # Store frame for web streaming
-        with frame_lock:
-            last_frame = display_image.copy()
+# Sink stages: the overlay keeps only the newest frame; confirmed count events are
+# rare and never dropped (unbounded queue), so bursts do not lose alerts or CSV rows
+sink_stages = StagePipeline()
+sink_stages.add('overlay', overlay_stage, maxsize=2)
+sink_stages.add('persist', persist_stage, maxsize=0)
 
-def generate_frames():
-    """Generator function to stream video frames."""
-    while True:
-        with frame_lock:
-            if last_frame is not None:
-                # Encode frame as JPEG
-                ret, buffer = cv2.imencode('.jpg', last_frame)
-                if ret:
-                    frame = buffer.tobytes()
-                    yield (b'--frame\r\n'
-                           b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
-        time.sleep(0.033)  # ~30 FPS
+# Pipeline startup state, pushed to the dashboard as it changes
+readiness = Readiness("main", STARTED_AT, on_change=lambda status: socketio.emit('readiness', status))
 
 @app.route('/')
 def index():
@@ -281,55 +421,124 @@ def index():
 
 @app.route('/video_feed')
 def video_feed():
-    """Video streaming route."""
-    return Response(generate_frames(),
+    """Video streaming route (optional ?fps=&width=&quality= for a lighter stream)."""
+    return Response(stream.generate(request.args.get('fps', type=int),
+                                    request.args.get('width', type=int),
+                                    request.args.get('quality', type=int)),
                     mimetype='multipart/x-mixed-replace; boundary=frame')
 
 @app.route('/graph_data')
+@app.route('/api/data')
 def graph_data():
     """API endpoint for graph data."""
-    return jsonify(get_graph_data())
+    return graph_payload.response()
 
 @app.route('/alerts')
+@app.route('/api/alerts')
 def alerts():
     """API endpoint for alerts data."""
-    return jsonify(get_recent_alerts())
+    return alerts_payload.response()
+
+@app.route('/evidence/<path:filename>')
+def alert_evidence(filename):
+    """Serve an alert evidence image strip."""
+    return send_from_directory(EVIDENCE_DIR, filename)
+
+@app.route('/api/pipeline_stats')
+def pipeline_stats():
+    """API endpoint for per-stage queue depth metrics."""
+    return jsonify(dict(sink_stages.stats(), evidence=evidence_recorder.stats(), stream=stream.stats()))
+
+@app.route('/api/status')
+def status():
+    """API endpoint for pipeline readiness and startup timings."""
+    return jsonify(readiness.status())
+
+@app.route('/api/outages')
+def outages():
+    """API endpoint for pipeline outage history and mean time to recovery."""
+    return jsonify(dict(supervisor.status(), recent=supervisor.recent_outages()))
+
+@app.route('/admin/profile')
+def admin_profile():
+    """Sample every thread's stack for ?seconds=N (admin only): collapsed stacks, or ?format=json."""
+    if not is_admin(request, ADMIN_TOKEN):
+        abort(404)
+    return profile_response(request.args)
+
+@app.route('/api/forecast')
+def forecast():
+    """API endpoint for consumption rates and time-to-empty per flavor."""
+    return jsonify(forecaster.forecast(time.time()))
 
 @socketio.on('connect')
 def handle_connect():
     """Handle client connection."""
     print('Client connected')
     # Send initial graph data
-    emit('graph_update', get_graph_data())
+    emit('graph_update', graph_payload.text)
     # Send initial alerts data
-    emit('alerts_initial', get_recent_alerts())
+    emit('alerts_initial', alerts_payload.text)
+    # Tell the page whether the pipeline is still warming up
+    emit('readiness', readiness.status())
+    emit('forecast_update', {"forecast": forecaster.forecast(time.time())})
 
 @socketio.on('disconnect')
 def handle_disconnect():
     """Handle client disconnection."""
     print('Client disconnected')
 
-def start_pipeline():
-    """Start the Roboflow inference pipeline."""
+def build_pipeline():
+    """Create (but do not start) the Roboflow inference pipeline."""
+    global capture_process
     os.environ["LOCAL_INFERENCE_API_URL"] = "http://localhost:9001"
 
+    if not supervisor.restarts:
+        readiness.set("loading", "Loading inference")
+    from inference import InferencePipeline
+
+    video_reference = 0
+    if USE_SHARED_FRAME_RING:
+        # A single capture process owns the camera; inference reads copies of its frames
+        from shm_frame_ring import start_capture_process, make_frame_producer
+        if capture_process is None or capture_process.poll() is not None:
+            capture_process = start_capture_process(FRAME_RING_NAME, camera_index=0)
+        video_reference = make_frame_producer(FRAME_RING_NAME)
+
+    readiness.set("connecting", "Loading workflow and opening camera")
+    # Cached definition from workflow_cache/, so startup needs no network
+    workflow_specification, readiness.info = load_workflow(os.environ.get("ROBOFLOW_API_KEY"))
     pipeline = InferencePipeline.init_with_workflow(
         api_key=os.environ.get("ROBOFLOW_API_KEY"),
-        workspace_name="edss",
-        workflow_id="count-milk-alerts",
-        video_reference=0,
+        workflow_specification=workflow_specification,
+        video_reference=video_reference,
         max_fps=10,
         on_prediction=my_sink
     )
+    readiness.set("warming", "Waiting for the first result")
+    return pipeline
+
+# Restarts a stalled pipeline with backoff and records outages
+supervisor = PipelineSupervisor("main", build_pipeline, readiness)
 
-    pipeline.start()
-    pipeline.join()
+def start_pipeline():
+    """Run the Roboflow inference pipeline, restarting it if it stalls."""
+    supervisor.run()
+
+def handle_sigterm(signum, frame):
+    # Exit normally so atexit saves the snapshot
+    sys.exit(0)
 
 if __name__ == '__main__':
+    # Save history on shutdown so the next start shows it at once
+    atexit.register(save_history)
+    signal.signal(signal.SIGTERM, handle_sigterm)
+
     # Start inference pipeline in a separate thread
     from threading import Thread
     pipeline_thread = Thread(target=start_pipeline, daemon=True)
     pipeline_thread.start()
+    Thread(target=refresh_forecast, name="forecast-refresh", daemon=True).start()
 
     # Start Flask-SocketIO server
     print("=" * 60)
@@ -337,5 +546,6 @@ if __name__ == '__main__':
     print("Access the application at:")
     print("  - http://localhost:5050")
     print("  - http://127.0.0.1:5050")
+    print(f"✓ Dashboard up in {time.time() - STARTED_AT:.2f}s (pipeline warming up in the background)")
     print("=" * 60)
     socketio.run(app, host='0.0.0.0', port=5050, debug=False, allow_unsafe_werkzeug=True)
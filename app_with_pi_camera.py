@@ -2,201 +2,404 @@
 Flask web application for monitoring milk bottle counts in real-time.
 This version uses a camera connected to Raspberry Pi but runs inference on Mac.
 Camera streaming from Pi, all processing on Mac.
+
+Several cameras (one per fridge) can be monitored at once: each runs its own
+inference pipeline with its own state, CSV files and stream route, and the
+dashboard aggregates counts and alerts across all of them.
+
+The inference stack and OpenCV are imported lazily, so the dashboard (with
+history restored from each camera's warm-start snapshot) is served while the
+pipelines are still loading and connecting to the Pis.
 """
 
+import time
+STARTED_AT = time.time()  # Startup timings are measured from here
+
 import os
-from flask import Flask, render_template, Response, jsonify
+import sys
+import atexit
+import signal
+from flask import Flask, render_template, Response, jsonify, abort, send_from_directory, request
 from flask_socketio import SocketIO, emit
 from dotenv import load_dotenv
-import cv2
-import time
 from datetime import datetime, timedelta
 import csv
-from threading import Lock
-from inference import InferencePipeline
+from threading import Lock, Thread
 import requests
+from payload_cache import PayloadCache
+from stage_pipeline import StagePipeline
+from evidence_recorder import EvidenceRecorder, EVIDENCE_DIR
+from stream_variants import StreamVariants
+from mjpeg_source import make_stream_producer, trace_for
+from latency_tracker import LatencyTracker
+from warm_start import save_snapshot, load_snapshot, Readiness
+from workflow_cache import load_workflow
+from pipeline_supervisor import PipelineSupervisor
+from count_smoother import CountSmoother
+from consumption_forecast import ConsumptionForecaster
+from csv_log import RotatingCsvLog
+from sampling_profiler import is_admin, profile_response
 
 # Load environment variables
 load_dotenv("config.env")
 
 # Configuration
 PI_CAMERA_URL = os.environ.get("PI_CAMERA_URL", "http://100.108.134.110:8888/video_feed")
+# Optional list of cameras: "fridge1=http://pi1:8888/video_feed,fridge2=http://pi2:8888/video_feed"
+PI_CAMERA_URLS = os.environ.get("PI_CAMERA_URLS", "")
+# Also keep full-size pre-alert frames in a daily frame pack (see frame_pack.py)
+EVIDENCE_PACK = os.environ.get("EVIDENCE_PACK", "0").lower() in ("1", "true", "yes")
+# Draw the stream's latency on the video feed (also toggled from the dashboard)
+LATENCY_OVERLAY = os.environ.get("LATENCY_OVERLAY", "0").lower() in ("1", "true", "yes")
+# Keep a second 1 FPS connection to each Pi open for instant failover
+STANDBY_STREAM = os.environ.get("STANDBY_STREAM", "1").lower() in ("1", "true", "yes")
+# Enables /admin/profile for requests that send this token (unset: disabled)
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
 
 # Initialize Flask app
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'milk-bottle-monitoring-secret'
 socketio = SocketIO(app, cors_allowed_origins="*")
 
-# Global variables
-csv_file_path = "milk_bottle_counts.csv"
-alerts_csv_path = "milk_bottle_alerts.csv"
-last_save_time = 0
-last_frame = None
-frame_lock = Lock()
-
 # Alert cooldown period (in seconds)
 ALERT_COOLDOWN_SECONDS = 10
-
-# FPS tracking
-frame_count = 0
-fps_start_time = time.time()
-last_fps_print = time.time()
-
-# Data storage for plotting (in-memory for past hour)
-data_history = {
-    "whole": [],
-    "1pct": [],
-    "2pct": []
+# Latency summaries are pushed to the dashboard at most this often
+LATENCY_EMIT_SECONDS = 1.0
+# Time to empty is re-checked this often between count changes
+FORECAST_REFRESH_SECONDS = 60
+latency_overlay = LATENCY_OVERLAY
+
+FLAVORS = ["whole", "1pct", "2pct"]
+CATEGORY_NAMES = {
+    "whole": "Whole Milk",
+    "1pct": "1% Milk",
+    "2pct": "2% Milk"
 }
-timestamps = []
-data_lock = Lock()
-
-# Alerts tracking
-alerts_history = []
-alerts_lock = Lock()
-last_alert_time = 0
-
-# Initialize CSV files if they don't exist
-def init_csv_files():
-    """Create CSV files with headers if they don't exist."""
-    if not os.path.exists(csv_file_path):
-        with open(csv_file_path, mode='w', newline='') as file:
-            writer = csv.writer(file)
-            writer.writerow(['timestamp', 'whole', '1pct', '2pct'])
-
-    if not os.path.exists(alerts_csv_path):
-        with open(alerts_csv_path, mode='w', newline='') as file:
-            writer = csv.writer(file)
-            writer.writerow(['timestamp', 'missing_categories'])
 
-init_csv_files()
-
-def save_counts_to_csv(timestamp, counts):
-    """Save bottle counts to CSV file."""
-    with open(csv_file_path, mode='a', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerow([
+def parse_camera_sources():
+    """Return an ordered {camera_id: url} mapping from the environment."""
+    if not PI_CAMERA_URLS.strip():
+        return {"main": PI_CAMERA_URL}
+
+    sources = {}
+    for i, entry in enumerate(e.strip() for e in PI_CAMERA_URLS.split(",")):
+        if not entry:
+            continue
+        camera_id, sep, url = entry.partition("=")
+        if not sep or "://" in camera_id:
+            camera_id, url = f"cam{i + 1}", entry
+        sources[camera_id.strip()] = url.strip()
+    return sources
+
+class CameraMonitor:
+    """Inference pipeline, in-memory state and storage for one camera."""
+
+    def __init__(self, camera_id, url, partitioned):
+        self.camera_id = camera_id
+        self.url = url
+
+        # Each camera writes its own CSV files; a single camera keeps the original names
+        suffix = f"_{camera_id}" if partitioned else ""
+        self.csv_file_path = f"milk_bottle_counts{suffix}.csv"
+        self.alerts_csv_path = f"milk_bottle_alerts{suffix}.csv"
+        self.evidence_prefix = f"{camera_id}/" if partitioned else ""
+        self.snapshot_path = f"dashboard_snapshot{suffix}.json"
+
+        # Filters flapping per-frame results into confirmed count_changed/stock_out events
+        self.smoother = CountSmoother(FLAVORS)
+        # Consumption rates and time-to-empty, updated from each confirmed count change
+        self.forecaster = ConsumptionForecaster(FLAVORS)
+        # Newest annotated frame and its per-client encodings for /video_feed
+        self.stream = StreamVariants()
+
+        # FPS tracking
+        self.frame_count = 0
+        self.fps_start_time = time.time()
+        self.last_fps_print = time.time()
+        self.fps = 0.0
+        self.last_result_time = 0
+
+        # Capture-to-dashboard latency per stage, from the Pi's frame headers
+        self.latency = LatencyTracker()
+        self.latency_summary = {}
+        self.last_latency_emit = 0
+
+        # Data storage for plotting (in-memory for past hour)
+        self.data_history = {flavor: [] for flavor in FLAVORS}
+        self.timestamps = []
+        self.data_lock = Lock()
+
+        # Alerts tracking
+        self.alerts_history = []
+        self.alerts_lock = Lock()
+        self.last_alert_time = 0
+        self.alert_pending = False  # A stock-out held back by the cooldown, raised once it expires
+
+        # Last few seconds of stream frames, written out as an image strip per alert
+        self.evidence = EvidenceRecorder(os.path.join(EVIDENCE_DIR, self.evidence_prefix),
+                                         pack_frames=EVIDENCE_PACK)
+
+        self.init_csv_files()
+        self.restore_history()
+
+        # Pipeline startup state, pushed to the dashboard as it changes
+        self.readiness = Readiness(camera_id, STARTED_AT,
+                                   on_change=lambda status: socketio.emit('readiness', status))
+        # Restarts a stalled pipeline with backoff and records outages
+        self.supervisor = PipelineSupervisor(camera_id, self.build_pipeline, self.readiness)
+
+        self.graph_payload = PayloadCache(f'graph-{camera_id}', self.get_graph_data)
+        self.graph_payload.rebuild()
+
+        # Sink stages: the overlay keeps only the newest frame. Confirmed count events are
+        # rare and never dropped (unbounded queue), so bursts do not lose alerts or CSV rows;
+        # latency samples of results without events may be dropped under load
+        self.stages = StagePipeline(prefix=camera_id)
+        self.stages.add('overlay', self.overlay_stage, maxsize=2)
+        self.stages.add('persist', self.persist_stage, maxsize=0)
+        self.stages.add('latency', self.record_latency, maxsize=100)
+
+    def init_csv_files(self):
+        """Create CSV files with headers if they don't exist."""
+        # Counts CSV holds the current day; older days are gzipped under csv_archive/ (see csv_log.py)
+        self.counts_log = RotatingCsvLog(self.csv_file_path, ['timestamp', 'whole', '1pct', '2pct'])
+
+        if not os.path.exists(self.alerts_csv_path):
+            with open(self.alerts_csv_path, mode='w', newline='') as file:
+                writer = csv.writer(file)
+                writer.writerow(['timestamp', 'missing_categories', 'evidence'])
+
+    def save_counts_to_csv(self, timestamp, counts):
+        """Save bottle counts to CSV file."""
+        self.counts_log.append([[
             timestamp,
             counts.get('whole', 0),
             counts.get('1pct', 0),
             counts.get('2pct', 0)
-        ])
-
-def save_alert_to_csv(timestamp, missing_categories):
-    """Save alert for missing categories to CSV file."""
-    with open(alerts_csv_path, mode='a', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerow([timestamp, ', '.join(missing_categories)])
+        ]])
 
-def get_recent_alerts():
-    """Get recent alerts from memory."""
-    with alerts_lock:
-        return alerts_history[-20:]  # Last 20 alerts
+    def save_alert_to_csv(self, timestamp, missing_categories, evidence=''):
+        """Save alert for missing categories to CSV file."""
+        with open(self.alerts_csv_path, mode='a', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow([timestamp, ', '.join(missing_categories), evidence])
+
+    def restore_history(self):
+        """Seed in-memory history and alerts from the warm-start snapshot."""
+        snapshot = load_snapshot(self.snapshot_path)
+        if snapshot is None:
+            return
+        self.timestamps.extend(snapshot["timestamps"])
+        for flavor in FLAVORS:
+            self.data_history[flavor].extend(snapshot["data"].get(flavor, []))
+        self.alerts_history.extend(snapshot["alerts"])
+        self.last_alert_time = snapshot.get("last_alert_time", 0)
+        self.forecaster.restore(snapshot.get("forecast"))
+        print(f"✓ [{self.camera_id}] Restored {len(self.timestamps)} samples and "
+              f"{len(self.alerts_history)} alerts from {self.snapshot_path}")
+
+    def save_history(self):
+        """Write the warm-start snapshot."""
+        with self.data_lock:
+            history = (list(self.timestamps), {flavor: list(values) for flavor, values in self.data_history.items()})
+        with self.alerts_lock:
+            alerts = list(self.alerts_history)
+        save_snapshot(self.snapshot_path, *history, alerts, last_alert_time=self.last_alert_time,
+                      forecast=self.forecaster.state())
+
+    def get_recent_alerts(self):
+        """Get recent alerts from memory."""
+        with self.alerts_lock:
+            return self.alerts_history[-20:]  # Last 20 alerts
+
+    def get_graph_data(self):
+        """Get graph data for the past hour."""
+        with self.data_lock:
+            one_hour_ago = datetime.now() - timedelta(hours=1)
+
+            graph_data = {
+                "timestamps": [],
+                "whole": [],
+                "1pct": [],
+                "2pct": []
+            }
 
-def get_graph_data():
-    """Get graph data for the past hour."""
-    with data_lock:
-        one_hour_ago = datetime.now() - timedelta(hours=1)
-
-        graph_data = {
-            "timestamps": [],
-            "whole": [],
-            "1pct": [],
-            "2pct": []
+            for i, ts in enumerate(self.timestamps):
+                # Samples are only taken on changes, so the newest older one gives the starting value
+                if ts >= one_hour_ago or i + 1 == len(self.timestamps) or self.timestamps[i + 1] > one_hour_ago:
+                    graph_data["timestamps"].append(max(ts, one_hour_ago).strftime('%Y-%m-%d %H:%M:%S'))
+                    for flavor in FLAVORS:
+                        if i < len(self.data_history[flavor]):
+                            graph_data[flavor].append(self.data_history[flavor][i])
+                        else:
+                            graph_data[flavor].append(0)
+
+            return graph_data
+
+    def status(self):
+        """Liveness summary for /api/cameras."""
+        age = time.time() - self.last_result_time if self.last_result_time else None
+        return {
+            "id": self.camera_id,
+            "url": self.url,
+            "fps": round(self.fps, 2),
+            "last_result_age": round(age, 1) if age is not None else None,
+            "streaming": self.stream.seq > 0,
+            "latency_ms": self.latency_summary.get("total", {}).get("p50"),
+            "readiness": self.readiness.status(),
+            "supervisor": self.supervisor.status(),
         }
 
-        for i, ts in enumerate(timestamps):
-            if ts >= one_hour_ago:
-                graph_data["timestamps"].append(ts.strftime('%Y-%m-%d %H:%M:%S'))
-                for flavor in ["whole", "1pct", "2pct"]:
-                    if i < len(data_history[flavor]):
-                        graph_data[flavor].append(data_history[flavor][i])
-                    else:
-                        graph_data[flavor].append(0)
-
-        return graph_data
-
-def my_sink(result, video_frame):
-    """Process predictions from Roboflow workflow."""
-    global last_save_time, last_frame, timestamps, last_alert_time, frame_count, fps_start_time, last_fps_print
-
-    # Track FPS
-    frame_count += 1
-    current_time = time.time()
-    if current_time - last_fps_print >= 5.0:  # Print FPS every 5 seconds
-        elapsed = current_time - fps_start_time
-        fps = frame_count / elapsed
-        print(f"Processing FPS: {fps:.2f} ({frame_count} frames in {elapsed:.1f}s)", flush=True)
-        last_fps_print = current_time
-
-    if result.get("annotated_image"):
-        # Get the annotated image
-        display_image = result["annotated_image"].numpy_image.copy()
-
-        # Get counts and missing categories
-        counts = result.get("counts", {})
-        missing = result.get("missing", [])
-
-        # Track alerts with cooldown logic
+    def sink(self, result, video_frame):
+        """Process predictions from Roboflow workflow.
+
+        Runs on the inference callback thread, so it only hands results to the
+        stage pipeline; overlay, persistence and broadcast run on their own threads.
+        """
+        if not self.readiness.ready:
+            self.readiness.set("ready")
+
+        # Track FPS
+        self.frame_count += 1
         current_time = time.time()
-        if missing and (current_time - last_alert_time >= ALERT_COOLDOWN_SECONDS):
-            timestamp = datetime.now()
+        self.last_result_time = current_time
+        self.supervisor.result_received(current_time)
+        if current_time - self.last_fps_print >= 5.0:  # Print FPS every 5 seconds
+            elapsed = current_time - self.fps_start_time
+            self.fps = self.frame_count / elapsed
+            print(f"[{self.camera_id}] Processing FPS: {self.fps:.2f} ({self.frame_count} frames in {elapsed:.1f}s)", flush=True)
+            self.last_fps_print = current_time
+
+        # Stamps from the Pi and the stream reader; copied since both stages add to it
+        trace = dict(trace_for(video_frame.image) or {}, inferred=current_time)
+
+        if result.get("annotated_image"):
+            events = self.smoother.update(result.get("counts", {}), result.get("missing", []), current_time)
+            # Only a confirmed stock-out raises the banner
+            missing = self.smoother.missing
+            self.stages.submit('overlay', (result["annotated_image"].numpy_image, missing, dict(trace)))
+            if events or self.alert_due(current_time):
+                self.stages.submit('persist', (current_time, datetime.now(), events, self.smoother.counts, missing,
+                                               trace))
+            else:
+                # Still measure the emit latency of results that change nothing
+                self.stages.submit('latency', trace)
+
+    def alert_due(self, now):
+        """True when a stock-out held back by the cooldown can be raised."""
+        return self.alert_pending and now - self.last_alert_time >= ALERT_COOLDOWN_SECONDS
+
+    def persist_stage(self, item):
+        """Handle confirmed count events: alerts, CSV writes, graph data and Socket.IO broadcast."""
+        current_time, received_at, events, counts, missing, trace = item
+        for event in events:
+            socketio.emit(event["type"], dict(event, camera=self.camera_id))
+
+        # Track alerts with cooldown logic; a stock-out inside the cooldown stays
+        # pending and is raised once it expires if a flavor is still missing
+        if any(event["type"] == "stock_out" for event in events):
+            self.alert_pending = True
+        if not missing:
+            self.alert_pending = False
+        if self.alert_pending and (current_time - self.last_alert_time >= ALERT_COOLDOWN_SECONDS):
+            timestamp = received_at
             timestamp_str = timestamp.strftime('%Y-%m-%d %H:%M:%S')
 
+            # Write the pre-alert frames in the background
+            evidence = self.evidence.capture(f"alert_{timestamp.strftime('%Y%m%d_%H%M%S')}")
+            evidence = self.evidence_prefix + evidence if evidence else ''
+
             # Save alert to CSV
-            save_alert_to_csv(timestamp_str, missing)
+            self.save_alert_to_csv(timestamp_str, missing, evidence)
 
             # Add to in-memory alerts history
-            with alerts_lock:
-                category_names = {
-                    "whole": "Whole Milk",
-                    "1pct": "1% Milk",
-                    "2pct": "2% Milk"
-                }
-                missing_names = [category_names.get(m, m) for m in missing]
-                alerts_history.append({
-                    "timestamp": timestamp_str,
-                    "missing_categories": ", ".join(missing_names)
-                })
+            missing_names = [CATEGORY_NAMES.get(m, m) for m in missing]
+            alert = {
+                "timestamp": timestamp_str,
+                "missing_categories": ", ".join(missing_names),
+                "camera": self.camera_id
+            }
+            if evidence:
+                alert["evidence"] = f"/evidence/{evidence}"
+            with self.alerts_lock:
+                self.alerts_history.append(alert)
                 # Keep only last 100 alerts in memory
-                if len(alerts_history) > 100:
-                    alerts_history.pop(0)
+                if len(self.alerts_history) > 100:
+                    self.alerts_history.pop(0)
+            alerts_payload.rebuild()
 
             # Emit alert update to all connected clients
-            socketio.emit('alert_update', {
-                "timestamp": timestamp_str,
-                "missing_categories": ", ".join(missing_names)
-            })
+            socketio.emit('alert_update', alert)
 
             # Update last alert time
-            last_alert_time = current_time
+            self.last_alert_time = current_time
+            self.alert_pending = False
 
-        # Save data every 5 seconds
-        current_time = time.time()
-        if current_time - last_save_time >= 5:
-            timestamp = datetime.now()
+        # Record counts whenever a confirmed count changes
+        if any(event["type"] == "count_changed" for event in events):
+            timestamp = received_at
 
             # Save to CSV
-            save_counts_to_csv(timestamp.strftime('%Y-%m-%d %H:%M:%S'), counts)
+            self.save_counts_to_csv(timestamp.strftime('%Y-%m-%d %H:%M:%S'), counts)
 
             # Update in-memory data for plotting
-            with data_lock:
-                timestamps.append(timestamp)
-                for flavor in ["whole", "1pct", "2pct"]:
-                    data_history[flavor].append(counts.get(flavor, 0))
+            with self.data_lock:
+                self.timestamps.append(timestamp)
+                for flavor in FLAVORS:
+                    self.data_history[flavor].append(counts.get(flavor, 0))
 
-                # Remove data older than 1 hour
+                # Remove data older than 1 hour, keeping the sample in effect at the cutoff
                 one_hour_ago = datetime.now() - timedelta(hours=1)
-                while timestamps and timestamps[0] < one_hour_ago:
-                    timestamps.pop(0)
-                    for flavor in ["whole", "1pct", "2pct"]:
-                        if data_history[flavor]:
-                            data_history[flavor].pop(0)
-
-            # Emit graph update to all connected clients
-            socketio.emit('graph_update', get_graph_data())
-
-            last_save_time = current_time
+                while len(self.timestamps) > 1 and self.timestamps[1] < one_hour_ago:
+                    self.timestamps.pop(0)
+                    for flavor in FLAVORS:
+                        if self.data_history[flavor]:
+                            self.data_history[flavor].pop(0)
+
+            self.graph_payload.rebuild()
+
+            # Emit aggregated graph update to all connected clients (serialized once for all)
+            socketio.emit('graph_update', graph_payload.rebuild())
+
+            # Removals, restocks and time-to-empty; low_stock warns before the shelf is empty
+            forecast_events = []
+            for event in events:
+                if event["type"] == "count_changed":
+                    forecast_events += self.forecaster.update(event["flavor"], event["count"], event["time"])
+            self.emit_forecast(forecast_events, current_time)
+
+        # Changes are infrequent, so snapshot each one for a crash-safe warm start
+        self.save_history()
+        self.record_latency(trace)
+
+    def emit_forecast(self, forecast_events, now):
+        """Broadcast removal/restock/low_stock events and the current forecast."""
+        for forecast_event in forecast_events:
+            socketio.emit(forecast_event["type"], dict(forecast_event, camera=self.camera_id))
+            if forecast_event["type"] == "low_stock":
+                print(f"⚠ [{self.camera_id}] {CATEGORY_NAMES[forecast_event['flavor']]} forecast to run out in "
+                      f"{forecast_event['minutes_to_empty']:.0f} min", flush=True)
+        socketio.emit('forecast_update', {"camera": self.camera_id, "forecast": self.forecaster.forecast(now)})
+
+    def record_latency(self, trace):
+        """Stamp a result as handled and record its per-stage latency."""
+        trace["emitted"] = time.time()
+        self.latency.record(trace, "network", "decode", "inference", "emit", "total")
+        if trace["emitted"] - self.last_latency_emit >= LATENCY_EMIT_SECONDS:
+            self.latency_summary = self.latency.summary()
+            socketio.emit('latency_update', {"camera": self.camera_id, "stages": self.latency_summary,
+                                             "overlay": latency_overlay})
+            self.last_latency_emit = trace["emitted"]
+
+    def overlay_stage(self, item):
+        """Draw the alert overlay and encode the JPEG served by /video_feed."""
+        import cv2
+        image, missing, trace = item
+        # Only copy when something is drawn on the frame
+        display_image = image.copy() if missing or latency_overlay else image
+
+        if latency_overlay:
+            self.draw_latency(display_image, trace)
 
         # Display missing categories alert if any
         if missing:
@@ -215,12 +418,7 @@ def my_sink(result, video_frame):
             cv2.rectangle(display_image, (alert_x, alert_y), (alert_x + alert_width, alert_y + alert_height), (0, 0, 255), 3)
 
             # Format missing categories
-            category_names = {
-                "whole": "Whole Milk",
-                "1pct": "1% Milk",
-                "2pct": "2% Milk"
-            }
-            missing_names = [category_names.get(m, m) for m in missing]
+            missing_names = [CATEGORY_NAMES.get(m, m) for m in missing]
             missing_text = ", ".join(missing_names)
 
             # Draw "MISSING:" label
@@ -231,119 +429,293 @@ def my_sink(result, video_frame):
             cv2.putText(display_image, missing_text, (alert_x + 20, alert_y + 65),
                        cv2.FONT_HERSHEY_SIMPLEX, 1.0, (255, 255, 255), 2)
 
-        # Update last frame for MJPEG stream
-        with frame_lock:
-            last_frame = display_image
+        # Encode once here so stream clients only copy bytes
+        ret, buffer = cv2.imencode('.jpg', display_image)
+        if ret:
+            frame_bytes = buffer.tobytes()
+            self.stream.publish(display_image, frame_bytes)
+            self.evidence.add_jpeg(frame_bytes)
+            trace["published"] = time.time()
+            self.latency.record(trace, "overlay")
+
+    def draw_latency(self, image, trace):
+        """Draw this frame's age and the recent glass-to-glass percentiles in the top right."""
+        import cv2
+        lines = []
+        if "captured" in trace:
+            lines.append(f"frame {trace.get('frame_id', '?')}: {(trace['inferred'] - trace['captured']) * 1000:.0f} ms old")
+        total = self.latency_summary.get("total")
+        if total:
+            lines.append(f"total p50 {total['p50']:.0f} / p90 {total['p90']:.0f} ms")
+        for i, line in enumerate(lines):
+            (width, _), _ = cv2.getTextSize(line, cv2.FONT_HERSHEY_SIMPLEX, 0.7, 2)
+            origin = (image.shape[1] - width - 15, 35 + i * 30)
+            cv2.putText(image, line, origin, cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 0), 4)
+            cv2.putText(image, line, origin, cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+
+    def check_camera(self):
+        """Check the Pi camera server answers on /health. Returns True if reachable."""
+        try:
+            response = requests.get(self.url.replace('/video_feed', '/health'), timeout=5)
+            if response.status_code == 200:
+                print(f"✓ [{self.camera_id}] Pi camera accessible at {self.url}")
+            else:
+                print(f"⚠ [{self.camera_id}] Pi responded but camera may not be ready")
+            return True
+        except Exception as e:
+            print(f"✗ [{self.camera_id}] Cannot connect to Pi camera at {self.url}")
+            print(f"  Error: {e}")
+            print("  Make sure camera_server_pi.py is running on the Pi:")
+            print("    ssh edss@edsspi3.local")
+            print("    cd ~/milk-bottles")
+            print("    source venv/bin/activate")
+            print("    python camera_server_pi.py")
+            return False
+
+    def build_pipeline(self):
+        """Create (but do not start) the Roboflow inference pipeline for this camera."""
+        if not self.supervisor.restarts:
+            self.readiness.set("loading", "Loading inference")
+        from inference import InferencePipeline
+
+        self.readiness.set("connecting", f"Loading workflow and connecting to {self.url}")
+        if not self.check_camera():
+            self.readiness.set("connecting", f"Pi camera at {self.url} is not reachable; retrying")
+        # Cached definition from workflow_cache/, so startup needs no network
+        workflow_specification, self.readiness.info = load_workflow(os.environ.get("ROBOFLOW_API_KEY"))
+        pipeline = InferencePipeline.init_with_workflow(
+            api_key=os.environ.get("ROBOFLOW_API_KEY"),
+            workflow_specification=workflow_specification,
+            # Stream from Pi; the reader keeps each frame's capture timestamp and
+            # fails over to a standby connection when the stream stalls
+            video_reference=make_stream_producer(self.url, monitor=self.supervisor, standby=STANDBY_STREAM),
+            max_fps=10,  # Full FPS on Mac
+            on_prediction=self.sink
+        )
+        print(f"[{self.camera_id}] Pipeline initialized. Starting video stream from Pi...")
+        self.readiness.set("warming", "Waiting for the first result")
+        return pipeline
+
+    def start_pipeline(self):
+        """Run the Roboflow inference pipeline for this camera, restarting it if it stalls."""
+        print(f"[{self.camera_id}] Camera: Raspberry Pi at {self.url}")
+        self.supervisor.run()
+
+CAMERA_SOURCES = parse_camera_sources()
+cameras = {
+    camera_id: CameraMonitor(camera_id, url, partitioned=len(CAMERA_SOURCES) > 1)
+    for camera_id, url in CAMERA_SOURCES.items()
+}
+default_camera = next(iter(cameras.values()))
 
-def generate_frames():
-    """Generate frames for MJPEG streaming."""
-    while True:
-        with frame_lock:
-            if last_frame is not None:
-                # Encode frame as JPEG
-                ret, buffer = cv2.imencode('.jpg', last_frame)
-                if ret:
-                    frame_bytes = buffer.tobytes()
-                    yield (b'--frame\r\n'
-                           b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-        time.sleep(0.033)  # ~30 FPS
+def get_recent_alerts():
+    """Get recent alerts across all cameras, oldest first."""
+    alerts = []
+    for camera in cameras.values():
+        alerts.extend(camera.get_recent_alerts())
+    alerts.sort(key=lambda alert: alert["timestamp"])
+    return alerts[-20:]  # Last 20 alerts
+
+def get_graph_data():
+    """Get graph data for the past hour, with counts summed across cameras."""
+    series = {camera_id: camera.get_graph_data() for camera_id, camera in cameras.items()}
+    if len(series) == 1:
+        return next(iter(series.values()))
+
+    # Cameras sample independently, so hold each camera's latest counts and
+    # emit the running total at every sample time
+    events = []
+    for index, data in enumerate(series.values()):
+        for i, ts in enumerate(data["timestamps"]):
+            events.append((ts, index, [data[flavor][i] for flavor in FLAVORS]))
+    events.sort(key=lambda event: event[0])
+
+    latest = [[0] * len(FLAVORS) for _ in series]
+    graph_data = {"timestamps": [], "whole": [], "1pct": [], "2pct": []}
+    for ts, index, values in events:
+        latest[index] = values
+        if graph_data["timestamps"] and graph_data["timestamps"][-1] == ts:
+            for flavor in FLAVORS:
+                graph_data[flavor].pop()
+        else:
+            graph_data["timestamps"].append(ts)
+        for f, flavor in enumerate(FLAVORS):
+            graph_data[flavor].append(sum(values_[f] for values_ in latest))
+
+    graph_data["cameras"] = series
+    return graph_data
+
+# Pre-serialized payloads, rebuilt by the sinks whenever the data changes
+graph_payload = PayloadCache('graph', get_graph_data)
+alerts_payload = PayloadCache('alerts', get_recent_alerts)
+graph_payload.rebuild()
+alerts_payload.rebuild()
+
+def get_camera(camera_id):
+    camera = cameras.get(camera_id)
+    if camera is None:
+        abort(404)
+    return camera
 
 @app.route('/')
 def index():
     """Serve the main dashboard page."""
-    return render_template('index.html')
+    return render_template('index.html', cameras=list(cameras))
 
 @app.route('/video_feed')
-def video_feed():
-    """Video streaming route."""
-    return Response(generate_frames(),
+@app.route('/video_feed/<camera_id>')
+def video_feed(camera_id=None):
+    """Video streaming route (optional ?fps=&width=&quality= for a lighter stream)."""
+    camera = get_camera(camera_id) if camera_id else default_camera
+    return Response(camera.stream.generate(request.args.get('fps', type=int),
+                                           request.args.get('width', type=int),
+                                           request.args.get('quality', type=int)),
                     mimetype='multipart/x-mixed-replace; boundary=frame')
 
 @app.route('/api/data')
 def get_data():
-    """API endpoint to get current counts data."""
-    return jsonify(get_graph_data())
+    """API endpoint to get current counts data (summed across cameras)."""
+    return graph_payload.response()
 
 @app.route('/api/alerts')
 def get_alerts():
     """API endpoint to get recent alerts."""
-    return jsonify(get_recent_alerts())
+    return alerts_payload.response()
+
+@app.route('/evidence/<path:filename>')
+def get_evidence(filename):
+    """Serve an alert evidence image strip."""
+    return send_from_directory(EVIDENCE_DIR, filename)
+
+@app.route('/api/cameras')
+def get_cameras():
+    """API endpoint listing cameras and their liveness."""
+    return jsonify([camera.status() for camera in cameras.values()])
+
+@app.route('/api/cameras/<camera_id>/data')
+def get_camera_data(camera_id):
+    """API endpoint to get counts data for one camera."""
+    return get_camera(camera_id).graph_payload.response()
+
+@app.route('/api/pipeline_stats')
+def get_pipeline_stats():
+    """API endpoint for per-camera, per-stage queue depth metrics."""
+    return jsonify({
+        camera_id: dict(camera.stages.stats(), evidence=camera.evidence.stats(), stream=camera.stream.stats())
+        for camera_id, camera in cameras.items()
+    })
+
+@app.route('/api/status')
+def get_status():
+    """API endpoint for per-camera pipeline readiness and startup timings."""
+    return jsonify({
+        "ready": all(camera.readiness.ready for camera in cameras.values()),
+        "cameras": {camera_id: camera.readiness.status() for camera_id, camera in cameras.items()},
+    })
+
+@app.route('/api/outages')
+def get_outages():
+    """API endpoint for per-camera outage history and mean time to recovery."""
+    return jsonify({
+        camera_id: dict(camera.supervisor.status(), recent=camera.supervisor.recent_outages())
+        for camera_id, camera in cameras.items()
+    })
+
+@app.route('/api/forecast')
+def get_forecast():
+    """API endpoint for per-camera consumption rates and time-to-empty per flavor."""
+    now = time.time()
+    return jsonify({camera_id: camera.forecaster.forecast(now) for camera_id, camera in cameras.items()})
+
+@app.route('/admin/profile')
+def admin_profile():
+    """Sample every thread's stack for ?seconds=N (admin only): collapsed stacks, or ?format=json."""
+    if not is_admin(request, ADMIN_TOKEN):
+        abort(404)
+    return profile_response(request.args)
+
+@app.route('/api/latency')
+def get_latency():
+    """API endpoint for per-camera, per-stage latency percentiles (milliseconds)."""
+    return jsonify({
+        "overlay": latency_overlay,
+        "cameras": {camera_id: camera.latency.summary() for camera_id, camera in cameras.items()},
+    })
+
+@app.route('/api/latency/overlay', methods=['POST'])
+def set_latency_overlay():
+    """Turn the latency overlay on the video feed on or off."""
+    global latency_overlay
+    latency_overlay = bool((request.get_json(silent=True) or {}).get("enabled"))
+    return jsonify({"overlay": latency_overlay})
 
 @socketio.on('connect')
 def handle_connect():
     """Handle client connection."""
     print('Client connected')
     # Send initial graph data
-    emit('graph_update', get_graph_data())
+    emit('graph_update', graph_payload.text)
     # Send initial alerts data
-    emit('alerts_initial', get_recent_alerts())
+    emit('alerts_initial', alerts_payload.text)
+    # Tell the page which pipelines are still warming up
+    for camera in cameras.values():
+        emit('readiness', camera.readiness.status())
+        emit('forecast_update', {"camera": camera.camera_id, "forecast": camera.forecaster.forecast(time.time())})
 
 @socketio.on('disconnect')
 def handle_disconnect():
     """Handle client disconnection."""
     print('Client disconnected')
 
-def start_pipeline():
-    """Start the Roboflow inference pipeline using camera from Pi."""
+def start_pipelines():
+    """Start one Roboflow inference pipeline per camera, each on its own thread."""
     # Remove any local inference environment variable if set
     if "LOCAL_INFERENCE_API_URL" in os.environ:
         del os.environ["LOCAL_INFERENCE_API_URL"]
 
-    print("Initializing pipeline with Roboflow cloud inference...")
-    print(f"Camera: Raspberry Pi at {PI_CAMERA_URL}")
+    print("Initializing pipelines with Roboflow cloud inference...")
     print("Inference: Roboflow serverless cloud (running on Mac)")
 
-    pipeline = InferencePipeline.init_with_workflow(
-        api_key=os.environ.get("ROBOFLOW_API_KEY"),
-        workspace_name="edss",
-        workflow_id="count-milk-alerts",
-        video_reference=PI_CAMERA_URL,  # Stream from Pi
-        max_fps=10,  # Full FPS on Mac
-        on_prediction=my_sink
-    )
+    for camera in cameras.values():
+        Thread(target=camera.start_pipeline, name=f"pipeline-{camera.camera_id}", daemon=True).start()
+    Thread(target=refresh_forecasts, name="forecast-refresh", daemon=True).start()
+
+def refresh_forecasts():
+    """Move time to empty on with the clock, so it counts down and warns between count changes."""
+    while True:
+        time.sleep(FORECAST_REFRESH_SECONDS)
+        now = time.time()
+        for camera in cameras.values():
+            camera.emit_forecast(camera.forecaster.refresh(now), now)
+
+def save_all_history():
+    for camera in cameras.values():
+        camera.save_history()
 
-    print("Pipeline initialized. Starting video stream from Pi...")
-    pipeline.start()
-    pipeline.join()
+def handle_sigterm(signum, frame):
+    # Exit normally so atexit saves the snapshots
+    sys.exit(0)
 
 if __name__ == '__main__':
-    # Check if Pi camera is accessible
     print("=" * 60)
     print("Milk Bottle Monitoring System (Mac + Pi Camera)")
     print("=" * 60)
     print("")
-    print("Testing connection to Pi camera...")
 
-    try:
-        response = requests.get(PI_CAMERA_URL.replace('/video_feed', '/health'), timeout=5)
-        if response.status_code == 200:
-            print(f"✓ Pi camera accessible at {PI_CAMERA_URL}")
-        else:
-            print(f"⚠ Pi responded but camera may not be ready")
-    except Exception as e:
-        print(f"✗ ERROR: Cannot connect to Pi camera at {PI_CAMERA_URL}")
-        print(f"  Error: {e}")
-        print("")
-        print("Make sure camera_server_pi.py is running on your Pi:")
-        print("  ssh edss@edsspi3.local")
-        print("  cd ~/milk-bottles")
-        print("  source venv/bin/activate")
-        print("  python camera_server_pi.py")
-        print("")
-        exit(1)
-
-    print("")
+    # Save history on shutdown so the next start shows it at once
+    atexit.register(save_all_history)
+    signal.signal(signal.SIGTERM, handle_sigterm)
 
-    # Start inference pipeline in a separate thread
-    from threading import Thread
-    pipeline_thread = Thread(target=start_pipeline, daemon=True)
-    pipeline_thread.start()
+    # Start inference pipelines, one thread per camera. Each checks its Pi and
+    # reports progress through its readiness state while the server is up.
+    start_pipelines()
 
     # Start Flask-SocketIO server
     print("Flask server starting...")
     print("Access the application at:")
     print("  - http://localhost:5050")
     print("  - http://127.0.0.1:5050")
+    print(f"✓ Dashboard up in {time.time() - STARTED_AT:.2f}s (pipelines warming up in the background)")
     print("=" * 60)
 
     socketio.run(app, host='0.0.0.0', port=5050, debug=False, allow_unsafe_werkzeug=True)
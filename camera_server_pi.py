@@ -2,11 +2,23 @@
 Simple camera server for Raspberry Pi.
 Captures video from webcam and streams it over HTTP.
 Run this on the Pi, and have your Mac connect to it.
+Optionally records the stream to rotating segments on disk (--record).
 """
 
-from flask import Flask, Response
+from flask import Flask, Response, jsonify, abort, send_from_directory, request
 import cv2
 import os
+import sys
+import time
+import queue
+import atexit
+import signal
+import socket
+import argparse
+import threading
+from itertools import count
+from datetime import datetime
+from sampling_profiler import is_admin, profile_response
 
 app = Flask(__name__)
 
@@ -15,9 +27,66 @@ CAMERA_INDEX = 0  # Change if using different camera
 FRAME_WIDTH = 1280
 FRAME_HEIGHT = 720
 FPS = 30
+JPEG_QUALITY = 85
 
-def generate_frames():
-    """Capture frames from camera and yield as MJPEG stream."""
+# Encoding variants shared between clients: requested widths and qualities are
+# snapped to these, and each variant is encoded at most once per camera frame
+STREAM_WIDTHS = (320, 480, 640, 960, 1280)
+STREAM_QUALITIES = (45, 55, 65, 75, 85)
+
+# Adaptive streaming: each client steps down this ladder of (JPEG quality,
+# width, FPS) when it can't receive frames as fast as they are sent, and back
+# up when the link has headroom. The MIN_* bounds cut the ladder short.
+ADAPTIVE_STREAMING = True
+ADAPT_LEVELS = [
+    (85, 1280, 30),
+    (75, 1280, 30),
+    (65, 1280, 20),
+    (65, 960, 20),
+    (55, 960, 15),
+    (55, 640, 15),
+    (45, 640, 10),
+    (45, 480, 5),
+]
+ADAPT_MIN_QUALITY = 45
+ADAPT_MIN_WIDTH = 480
+ADAPT_MIN_FPS = 5
+ADAPT_WINDOW_SECONDS = 1.0  # Throughput is measured over windows of this length
+ADAPT_DOWN_UTILIZATION = 0.7  # Blocked sending for 70% of a window: step down
+ADAPT_UP_UTILIZATION = 0.2  # Blocked under 20%: try one step up
+ADAPT_HOLD_SECONDS = 5  # Minimum time at a level before stepping up (doubles after a failed step up)
+ADAPT_MAX_HOLD_SECONDS = 60
+ADAPT_SEND_BUFFER = 128 * 1024  # Small socket buffer so a slow link blocks sends instead of queueing seconds of video
+
+# Recorder defaults
+RECORDINGS_DIR = "recordings"
+RECORD_QUEUE_SIZE = 30  # Raw frames waiting to be encoded before the oldest is dropped
+
+# Enables /admin/profile for requests that send this token (unset: disabled)
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+
+# Global variables
+camera = None
+latest_frame = None
+latest_frame_time = 0
+latest_frame_seq = 0
+frame_lock = threading.Lock()
+frame_ready = threading.Condition(frame_lock)
+recorder = None
+
+# Connected stream clients by id, for /health
+stream_clients = {}
+clients_lock = threading.Lock()
+client_ids = count(1)
+
+# Newest encoded frame per (width, quality) as (frame seq, capture time, JPEG bytes)
+variant_cache = {}
+variant_locks = {}
+variant_encodes = {}
+
+def init_camera():
+    """Open the camera once for every client and the recorder."""
+    global camera
     camera = cv2.VideoCapture(CAMERA_INDEX)
 
     # Set camera properties
@@ -26,36 +95,341 @@ def generate_frames():
     camera.set(cv2.CAP_PROP_FPS, FPS)
 
     if not camera.isOpened():
-        print("✗ ERROR: Could not open camera")
-        return
+        return False
 
     print(f"✓ Camera opened successfully")
     print(f"  Resolution: {FRAME_WIDTH}x{FRAME_HEIGHT}")
     print(f"  FPS: {FPS}")
+    return True
+
+def camera_loop():
+    """Continuously capture frames. This is the only thread that reads the camera."""
+    global latest_frame, latest_frame_time, latest_frame_seq
+    while True:
+        success, frame = camera.read()
+        if not success:
+            print("✗ Failed to read frame")
+            time.sleep(0.1)
+            continue
+        captured_at = time.time()
+        with frame_ready:
+            latest_frame = frame
+            latest_frame_time = captured_at
+            latest_frame_seq += 1
+            frame_ready.notify_all()
+        if recorder is not None:
+            recorder.offer(frame, captured_at)
+
+class StreamClient:
+    """Stream settings for one viewer, adapted to how fast it receives frames.
+
+    Sending a part blocks once the socket buffer is full, so the share of
+    time spent blocked in sends shows whether the link keeps up.
+    """
+
+    def __init__(self, address, adaptive=True, max_quality=JPEG_QUALITY, max_width=FRAME_WIDTH, max_fps=FPS):
+        self.id = next(client_ids)
+        self.address = address
+        self.adaptive = adaptive
+        # The client's requested settings cap the ladder and are its top level
+        levels = [(max_quality, max_width, max_fps)]
+        for quality, width, fps in ADAPT_LEVELS:
+            if quality >= ADAPT_MIN_QUALITY and width >= ADAPT_MIN_WIDTH and fps >= ADAPT_MIN_FPS:
+                level = (min(quality, max_quality), min(width, max_width), min(fps, max_fps))
+                if level != levels[-1]:
+                    levels.append(level)
+        self.levels = levels
+        self.level = 0
+        self.utilization = 0.0
+        self.throughput = 0.0
+        self.frames_sent = 0
+        self.connected_at = time.time()
+        self.last_change = self.connected_at
+        self.hold = ADAPT_HOLD_SECONDS
+        self.stepped_up = False
+        self.window_start = self.connected_at
+        self.window_bytes = 0
+        self.window_blocked = 0.0
+
+    @property
+    def quality(self):
+        return self.levels[self.level][0]
 
+    @property
+    def width(self):
+        return self.levels[self.level][1]
+
+    @property
+    def fps(self):
+        return self.levels[self.level][2]
+
+    def record_send(self, size, seconds):
+        """Account for one sent frame; at the end of each window, adapt the level."""
+        self.frames_sent += 1
+        self.window_bytes += size
+        self.window_blocked += seconds
+        now = time.time()
+        elapsed = now - self.window_start
+        if elapsed < ADAPT_WINDOW_SECONDS:
+            return
+        self.utilization = self.window_blocked / elapsed
+        self.throughput = self.window_bytes / elapsed
+        self.window_start, self.window_bytes, self.window_blocked = now, 0, 0.0
+        if not self.adaptive:
+            return
+
+        if self.utilization > ADAPT_DOWN_UTILIZATION and self.level < len(self.levels) - 1:
+            # Backing off straight after probing up: wait longer before the next probe
+            if self.stepped_up and now - self.last_change < self.hold:
+                self.hold = min(self.hold * 2, ADAPT_MAX_HOLD_SECONDS)
+            self.set_level(self.level + 1, now, stepped_up=False)
+        elif self.utilization < ADAPT_UP_UTILIZATION and self.level > 0 and now - self.last_change > self.hold:
+            self.set_level(self.level - 1, now, stepped_up=True)
+
+    def set_level(self, level, now, stepped_up):
+        self.level = level
+        self.last_change = now
+        self.stepped_up = stepped_up
+        print(f"Client {self.id} ({self.address}): quality {self.quality}, width {self.width}, {self.fps} FPS")
+
+    def status(self):
+        return {
+            'address': self.address,
+            'adaptive': self.adaptive,
+            'quality': self.quality,
+            'width': self.width,
+            'fps': self.fps,
+            'utilization': round(self.utilization, 2),
+            'throughput_kbps': round(self.throughput * 8 / 1000),
+            'frames_sent': self.frames_sent,
+            'connected_seconds': round(time.time() - self.connected_at),
+        }
+
+def snap(value, choices):
+    """Snap a requested value to the nearest shared choice at or above it."""
+    for choice in choices:
+        if value <= choice:
+            return choice
+    return choices[-1]
+
+def get_variant_jpeg(width, quality):
+    """Return (seq, capture time, JPEG bytes) of the newest frame at a width and quality.
+
+    Each camera frame is resized and encoded at most once per variant, however
+    many clients are receiving it.
+    """
+    with frame_lock:
+        frame, seq, captured_at = latest_frame, latest_frame_seq, latest_frame_time
+    if frame is None:
+        return None
+    key = (width, quality)
+    with variant_locks.setdefault(key, threading.Lock()):
+        cached = variant_cache.get(key)
+        if cached is not None and cached[0] >= seq:
+            return cached
+        if width < frame.shape[1]:
+            height = round(frame.shape[0] * width / frame.shape[1])
+            frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+        ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if not ret:
+            return None
+        cached = (seq, captured_at, buffer.tobytes())
+        variant_cache[key] = cached
+        variant_encodes[key] = variant_encodes.get(key, 0) + 1
+        return cached
+
+def generate_frames(client):
+    """Yield new camera frames as an MJPEG stream paced and sized for one client."""
+    with clients_lock:
+        stream_clients[client.id] = client
+    last_seq = 0
     try:
         while True:
-            success, frame = camera.read()
+            with frame_ready:
+                if not frame_ready.wait_for(lambda: latest_frame_seq > last_seq, timeout=5.0):
+                    print("✗ No frames from camera")
+                    return
+                seq = latest_frame_seq
 
-            if not success:
-                print("✗ Failed to read frame")
-                break
+            entry = get_variant_jpeg(client.width, client.quality)
+            if entry is None or entry[0] == last_seq:
+                # Encode failed: skip this frame rather than retrying it in a busy loop
+                last_seq = seq
+                continue
+            last_seq, captured_at, frame_bytes = entry
 
-            # Encode frame as JPEG
-            ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
+            # Yield frame in MJPEG format. Each part carries its frame ID and
+            # capture time (for latency tracing) and the settings it was encoded with
+            sending = time.perf_counter()
+            yield (b'--frame\r\n'
+                   b'Content-Type: image/jpeg\r\n'
+                   + f'Content-Length: {len(frame_bytes)}\r\n'
+                     f'X-Frame-Id: {last_seq}\r\n'
+                     f'X-Capture-Timestamp: {captured_at:.6f}\r\n'
+                     f'X-Stream-Quality: {client.quality}\r\n'
+                     f'X-Stream-Width: {client.width}\r\n'
+                     f'X-Stream-FPS: {client.fps}\r\n\r\n'.encode()
+                   + frame_bytes + b'\r\n')
+            client.record_send(len(frame_bytes), time.perf_counter() - sending)
 
-            if not ret:
+            # Pace to the client's frame rate on a shared clock, so clients at
+            # the same rate pick the same frames and share their encodings
+            interval = 1.0 / client.fps
+            time.sleep(interval - time.time() % interval)
+    finally:
+        with clients_lock:
+            stream_clients.pop(client.id, None)
+
+class SegmentRecorder:
+    """Writes sampled camera frames to fixed-duration segment files.
+
+    The camera loop only offers frames; encoding and disk writes happen on a
+    background thread behind a bounded queue, so a slow SD card drops recorded
+    frames instead of slowing the live stream. Segments rotate by time, and the
+    oldest are deleted once the directory exceeds its size cap.
+    """
+
+    def __init__(self, directory=RECORDINGS_DIR, segment_seconds=300, fps=5,
+                 max_bytes=8 * 1024 ** 3, output_format="pack", quality=80):
+        self.directory = directory
+        self.segment_seconds = segment_seconds
+        self.interval = 1.0 / fps
+        self.fps = fps
+        self.max_bytes = max_bytes
+        self.output_format = output_format
+        self.quality = quality
+
+        self.queue = queue.Queue(maxsize=RECORD_QUEUE_SIZE)
+        self.thread = None
+        self.next_due = 0
+        self.writer = None
+        self.segment_path = None
+        self.segment_started = 0
+        self.stats = {"frames": 0, "dropped": 0, "segments": 0, "evicted": 0, "errors": 0}
+        os.makedirs(directory, exist_ok=True)
+
+    def start(self):
+        self.enforce_retention()
+        self.thread = threading.Thread(target=self._run, name="recorder", daemon=True)
+        self.thread.start()
+        print(f"✓ Recording {self.fps} FPS to {self.directory}/ "
+              f"({self.segment_seconds}s {self.output_format} segments, "
+              f"max {self.max_bytes / 1024 ** 3:.1f} GB)")
+
+    def offer(self, frame, captured_at):
+        """Called from the camera loop: queue a frame if the recording interval has passed."""
+        if captured_at < self.next_due:
+            return
+        # Schedule from the due time, not the arrival time, so the rate doesn't drift
+        self.next_due = max(self.next_due + self.interval, captured_at)
+        try:
+            self.queue.put_nowait((frame, captured_at))
+        except queue.Full:
+            self.stats["dropped"] += 1
+
+    def segments(self):
+        """Return finished and current segments as (name, size), oldest first."""
+        entries = []
+        for name in sorted(os.listdir(self.directory)):
+            if name.startswith("segment_"):
+                entries.append((name, os.path.getsize(os.path.join(self.directory, name))))
+        return entries
+
+    def enforce_retention(self):
+        """Delete the oldest segments until the total fits within max_bytes."""
+        entries = self.segments()
+        total = sum(size for _, size in entries)
+        for name, size in entries:
+            if total <= self.max_bytes:
+                break
+            path = os.path.join(self.directory, name)
+            if path == self.segment_path:
                 continue
+            os.remove(path)
+            total -= size
+            self.stats["evicted"] += 1
+            print(f"Recorder: evicted {name}")
 
-            frame_bytes = buffer.tobytes()
+    def stop(self, timeout=10):
+        """Finish the current segment (an .avi that is never closed has no index).
 
-            # Yield frame in MJPEG format
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+        The writer belongs to the recorder thread, so the segment is closed
+        there: a None sentinel is queued behind the pending frames and the
+        thread is joined.
+        """
+        if self.thread is None:
+            self._close_segment()
+            return
+        try:
+            self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            print("⚠ Recorder stuck; current segment left open")
+            return
+        self.thread.join(timeout)
+        if self.thread.is_alive():
+            print("⚠ Recorder did not finish the current segment in time")
 
-    finally:
-        camera.release()
-        print("Camera released")
+    def _open_segment(self, frame, captured_at):
+        stamp = datetime.fromtimestamp(captured_at).strftime('%Y%m%d_%H%M%S')
+        if self.output_format == "avi":
+            self.segment_path = os.path.join(self.directory, f"segment_{stamp}.avi")
+            self.writer = cv2.VideoWriter(self.segment_path, cv2.VideoWriter_fourcc(*'MJPG'), self.fps,
+                                          (frame.shape[1], frame.shape[0]))
+        else:
+            from frame_pack import FramePackWriter
+            self.segment_path = os.path.join(self.directory, f"segment_{stamp}.pack")
+            self.writer = FramePackWriter(self.segment_path,
+                                          capacity=int(self.segment_seconds * self.fps * 1.5) + 16)
+        self.segment_started = captured_at
+        self.stats["segments"] += 1
+
+    def _close_segment(self):
+        if self.writer is None:
+            return
+        if self.output_format == "avi":
+            self.writer.release()
+        else:
+            self.writer.close()
+        self.writer = None
+        self.segment_path = None
+        self.enforce_retention()
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self._close_segment()
+                return
+            frame, captured_at = item
+            try:
+                # A clock set back also starts a new segment, keeping each pack in capture order
+                if self.writer is not None and not 0 <= captured_at - self.segment_started < self.segment_seconds:
+                    self._close_segment()
+                if self.writer is None:
+                    self._open_segment(frame, captured_at)
+                if self.output_format == "avi":
+                    self.writer.write(frame)
+                else:
+                    ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+                    if not ret or self.writer.full:
+                        self.stats["dropped"] += 1
+                        continue
+                    self.writer.append(buffer, captured_at)
+                self.stats["frames"] += 1
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"✗ Recorder error: {e}")
+
+    def status(self):
+        entries = self.segments()
+        return {
+            **self.stats,
+            "pending": self.queue.qsize(),
+            "current_segment": os.path.basename(self.segment_path) if self.segment_path else None,
+            "stored_segments": len(entries),
+            "stored_bytes": sum(size for _, size in entries),
+            "max_bytes": self.max_bytes,
+        }
 
 @app.route('/')
 def index():
@@ -79,20 +453,102 @@ def index():
 
 @app.route('/video_feed')
 def video_feed():
-    """Video streaming route."""
-    return Response(generate_frames(),
-                    mimetype='multipart/x-mixed-replace; boundary=frame')
+    """Video streaming route.
+
+    Optional ?fps=&width=&quality= set the client's top settings (snapped to
+    the shared variants); ?adaptive=0 holds them fixed.
+    """
+    adaptive = ADAPTIVE_STREAMING and request.args.get('adaptive', '1') != '0'
+    client = StreamClient(
+        request.remote_addr, adaptive,
+        max_quality=snap(request.args.get('quality', JPEG_QUALITY, type=int), STREAM_QUALITIES),
+        max_width=snap(request.args.get('width', FRAME_WIDTH, type=int), STREAM_WIDTHS),
+        max_fps=max(1, min(request.args.get('fps', FPS, type=int), FPS))
+    )
+    connection = request.environ.get('werkzeug.socket')
+    if adaptive and connection is not None:
+        connection.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, ADAPT_SEND_BUFFER)
+    return Response(generate_frames(client),
+                    mimetype='multipart/x-mixed-replace; boundary=frame',
+                    headers={'X-Stream-Adaptive': '1' if adaptive else '0'})
 
 @app.route('/health')
 def health():
     """Health check endpoint."""
-    return {'status': 'ok', 'camera': 'active'}
+    status = {'status': 'ok', 'camera': 'active',
+              'last_frame_age': round(time.time() - latest_frame_time, 2) if latest_frame_time else None}
+    with clients_lock:
+        status['clients'] = {client_id: client.status() for client_id, client in stream_clients.items()}
+    status['variants'] = {f'{width}w_q{quality}': encodes for (width, quality), encodes in variant_encodes.items()}
+    if recorder is not None:
+        status['recorder'] = recorder.status()
+    return status
+
+@app.route('/recordings')
+def recordings():
+    """List recorded segments, oldest first."""
+    if recorder is None:
+        return jsonify({'enabled': False, 'segments': []})
+    return jsonify({
+        'enabled': True,
+        'segments': [{'name': name, 'size': size, 'url': f'/recordings/{name}'}
+                     for name, size in recorder.segments()]
+    })
+
+@app.route('/recordings/<filename>')
+def download_recording(filename):
+    """Download one recorded segment."""
+    return send_from_directory(os.path.abspath(recorder.directory if recorder else RECORDINGS_DIR), filename)
+
+@app.route('/admin/profile')
+def admin_profile():
+    """Sample every thread's stack for ?seconds=N (admin only): collapsed stacks, or ?format=json."""
+    if not is_admin(request, ADMIN_TOKEN):
+        abort(404)
+    return profile_response(request.args)
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Pi camera streaming server")
+    parser.add_argument("--no-adaptive", action="store_true",
+                        help="Always stream at full quality, resolution and FPS")
+    parser.add_argument("--min-quality", type=int, default=ADAPT_MIN_QUALITY, help="Lowest adaptive JPEG quality")
+    parser.add_argument("--min-width", type=int, default=ADAPT_MIN_WIDTH, help="Narrowest adaptive frame width")
+    parser.add_argument("--min-fps", type=int, default=ADAPT_MIN_FPS, help="Lowest adaptive frame rate")
+    parser.add_argument("--record", action="store_true", help="Record the stream to rotating segments")
+    parser.add_argument("--record-dir", default=RECORDINGS_DIR, help="Directory for recorded segments")
+    parser.add_argument("--record-format", choices=["pack", "avi"], default="pack",
+                        help="JPEG frame pack (needs frame_pack.py) or MJPG .avi video")
+    parser.add_argument("--record-fps", type=float, default=5, help="Frames per second to record")
+    parser.add_argument("--segment-seconds", type=int, default=300, help="Length of each segment file")
+    parser.add_argument("--record-max-gb", type=float, default=8, help="Delete oldest segments beyond this size")
+    parser.add_argument("--record-quality", type=int, default=80, help="JPEG quality of recorded frames")
+    parser.add_argument("--admin-token", default=ADMIN_TOKEN,
+                        help="Token that enables /admin/profile (default: $ADMIN_TOKEN; unset disables it)")
+    args = parser.parse_args()
+    ADMIN_TOKEN = args.admin_token
+    ADAPTIVE_STREAMING = not args.no_adaptive
+    ADAPT_MIN_QUALITY, ADAPT_MIN_WIDTH, ADAPT_MIN_FPS = args.min_quality, args.min_width, args.min_fps
+
     print("=" * 60)
     print("Raspberry Pi Camera Server")
     print("=" * 60)
     print("")
+
+    if not init_camera():
+        print("✗ ERROR: Could not open camera")
+        exit(1)
+
+    if args.record:
+        recorder = SegmentRecorder(args.record_dir, args.segment_seconds, args.record_fps,
+                                   int(args.record_max_gb * 1024 ** 3), args.record_format, args.record_quality)
+        recorder.start()
+        atexit.register(recorder.stop)
+        # pkill sends SIGTERM: exit normally so the current segment is finished
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+    # Start the capture loop shared by every stream client and the recorder
+    threading.Thread(target=camera_loop, daemon=True).start()
+    print("")
     print("Starting server on port 8888...")
     print("This will stream camera feed to your Mac")
     print("(Port 8080 is used by Viam)")
@@ -100,7 +556,6 @@ if __name__ == '__main__':
     print("Access from your Mac at:")
 
     # Get Pi's IP address
-    import socket
     hostname = socket.gethostname()
     try:
         ip = socket.gethostbyname(hostname)
@@ -18,6 +18,10 @@ import numpy as np
 PI_CAMERA_URL = "http://192.168.1.130:8888/video_feed"  # Update with your Pi's IP
 SNAPSHOTS_DIR = "training_snapshots"
 
+# Set to read from a local shared-memory frame ring (see shm_frame_ring.py)
+# instead of the Pi stream, e.g. FRAME_RING_NAME=milk_frames
+FRAME_RING_NAME = os.environ.get("FRAME_RING_NAME")
+
 # Expected stream parameters (should match camera_server_pi.py)
 EXPECTED_WIDTH = 1280
 EXPECTED_HEIGHT = 720
@@ -51,12 +55,29 @@ def decode_mjpeg_stream(url):
             if frame is not None:
                 yield frame
 
+def read_frame_ring(name):
+    """
+    Generator that yields frames from a local shared-memory frame ring.
+    Each frame is copied out of its slot; frames the writer overwrote during
+    the copy are skipped.
+    """
+    from shm_frame_ring import FrameRing
+
+    ring = FrameRing.attach(name)
+    try:
+        for seq, _, _ in ring.frames_iter():
+            entry = ring.copy(seq)
+            if entry is not None:
+                yield entry[1]
+    finally:
+        ring.close()
+
 def main():
     """Main snapshot capture loop."""
     print("=" * 60)
     print("Pi Camera Snapshot Capture Tool")
     print("=" * 60)
-    print(f"Camera URL: {PI_CAMERA_URL}")
+    print(f"Camera URL: {PI_CAMERA_URL if not FRAME_RING_NAME else 'shared memory ' + FRAME_RING_NAME}")
     print(f"Expected Resolution: {EXPECTED_WIDTH}x{EXPECTED_HEIGHT}")
     print(f"Expected Quality: {EXPECTED_QUALITY}%")
     print("")
@@ -72,11 +93,16 @@ def main():
     # Test connection
     print("Connecting to Pi camera...")
     try:
-        response = requests.get(PI_CAMERA_URL.replace('/video_feed', '/health'), timeout=5)
-        if response.status_code == 200:
-            print("✓ Connected to Pi camera")
+        if FRAME_RING_NAME:
+            from shm_frame_ring import FrameRing
+            FrameRing.attach(FRAME_RING_NAME).close()
+            print(f"✓ Attached to frame ring '{FRAME_RING_NAME}'")
         else:
-            print("⚠ Pi responded but camera may not be ready")
+            response = requests.get(PI_CAMERA_URL.replace('/video_feed', '/health'), timeout=5)
+            if response.status_code == 200:
+                print("✓ Connected to Pi camera")
+            else:
+                print("⚠ Pi responded but camera may not be ready")
     except Exception as e:
         print(f"✗ ERROR: Cannot connect to Pi camera")
         print(f"  Error: {e}")
@@ -97,8 +123,9 @@ def main():
         cv2.resizeWindow('Pi Camera - Press SPACEBAR to capture', 800, 600)
 
         # Stream frames
-        for frame in decode_mjpeg_stream(PI_CAMERA_URL):
-            # Keep a clean copy for saving
+        frames = read_frame_ring(FRAME_RING_NAME) if FRAME_RING_NAME else decode_mjpeg_stream(PI_CAMERA_URL)
+        for frame in frames:
+            # Keep a copy of the clean frame for saving; the overlay is drawn on frame
             clean_frame = frame.copy()
 
             # Verify resolution on first frame
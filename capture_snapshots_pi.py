@@ -1,14 +1,21 @@
 """
 High-resolution snapshot capture tool that runs on the Raspberry Pi.
-Saves full-resolution images directly on the Pi when triggered via web interface.
+Saves full-resolution images directly on the Pi when triggered via web interface,
+or unattended on a schedule / when the scene changes (--auto).
 """
 
-from flask import Flask, render_template_string, jsonify, send_from_directory
+from flask import Flask, render_template_string, jsonify, send_from_directory, request, Response, abort
+from werkzeug.security import safe_join
 import cv2
 import os
 from datetime import datetime
 import threading
+import argparse
+import queue
 import time
+import tarfile
+import zipfile
+from collections import deque
 
 app = Flask(__name__)
 
@@ -17,12 +24,49 @@ CAMERA_INDEX = 0
 SNAPSHOTS_DIR = "training_snapshots"
 FRAME_WIDTH = 1920  # Full HD width
 FRAME_HEIGHT = 1080  # Full HD height
+JPEG_QUALITY = 95
+MAX_BURST = 30  # Frames per burst request
+WRITE_QUEUE_SIZE = 32  # Full-resolution frames waiting to be encoded (~6 MB each)
+PREVIEW_WIDTHS = (320, 480, 640, 960, 1280)  # Preview sizes shared between viewers
+PREVIEW_QUALITY = 70
+PREVIEW_MAX_FPS = 30
+
+# Unattended capture defaults
+AUTO_CHECK_INTERVAL = 0.5  # Seconds between scene checks
+AUTO_THUMB_SIZE = (64, 36)  # Grayscale thumbnail used to compare frames
+AUTO_HISTORY = 200  # Saved thumbnails remembered for similarity checks
+
+# Snapshot gallery and bulk download
+THUMBS_DIR = "snapshot_thumbs"
+THUMB_WIDTH = 320
+THUMB_QUALITY = 75
+GALLERY_PAGE_SIZE = 60
+GALLERY_MAX_PAGE_SIZE = 500
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
 
 # Global variables
 camera = None
 snapshot_count = 0
 latest_frame = None
+latest_frame_time = 0
+latest_frame_seq = 0
 frame_lock = threading.Lock()
+frame_ready = threading.Condition(frame_lock)
+
+# Write-behind queue: JPEG encoding and disk writes happen off the request thread
+write_queue = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
+# Optional frame pack (--pack) that every saved snapshot is also appended to
+snapshot_pack = None
+
+# Newest encoded preview per width as (frame seq, JPEG bytes), shared by all viewers
+preview_cache = {}
+preview_locks = {width: threading.Lock() for width in PREVIEW_WIDTHS}
+
+# Snapshot listing cached until the directory changes: (directory mtime, entries)
+snapshot_listing = (None, [])
+listing_lock = threading.Lock()
+# Limit concurrent thumbnail generation so a gallery page can't starve the camera loop
+thumb_slots = threading.Semaphore(2)
 
 def init_camera():
     """Initialize camera with high resolution."""
@@ -46,14 +90,349 @@ def create_snapshots_directory():
         print(f"Created directory: {SNAPSHOTS_DIR}")
 
 def camera_loop():
-    """Continuously capture frames for preview."""
-    global latest_frame
+    """Continuously capture frames. This is the only thread that reads the camera."""
+    global latest_frame, latest_frame_time, latest_frame_seq
     while True:
+        # read() blocks until the next frame, so no sleep is needed to pace the loop
         ret, frame = camera.read()
         if ret:
-            with frame_lock:
+            captured_at = time.time()
+            with frame_ready:
                 latest_frame = frame
-        time.sleep(0.033)  # ~30 FPS
+                latest_frame_time = captured_at
+                latest_frame_seq += 1
+                frame_ready.notify_all()
+        else:
+            time.sleep(0.01)
+
+def snapshot_writer():
+    """Encode and save queued snapshots at full quality."""
+    global snapshot_count
+    while True:
+        filepath, frame, captured_at = write_queue.get()
+        try:
+            ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+            if ok:
+                with open(filepath, 'wb') as f:
+                    f.write(buffer)
+                # The pack needs capture order; after a clock step back only the JPEG is kept
+                if snapshot_pack is not None and not snapshot_pack.full and \
+                        (snapshot_pack.last_timestamp is None or captured_at >= snapshot_pack.last_timestamp):
+                    snapshot_pack.append(buffer, captured_at)
+                snapshot_count += 1
+                print(f"✓ Saved: {os.path.basename(filepath)}")
+            else:
+                print(f"✗ Failed to save: {os.path.basename(filepath)}")
+        except OSError as e:
+            print(f"✗ Failed to save {os.path.basename(filepath)}: {e}")
+        finally:
+            write_queue.task_done()
+
+def next_frames(count, timeout=2.0):
+    """Return up to count consecutive new frames as (frame, capture time) pairs."""
+    frames = []
+    with frame_ready:
+        seq = latest_frame_seq
+        # The newest buffered frame is taken as-is for single captures
+        if count == 1 and latest_frame is not None:
+            return [(latest_frame, latest_frame_time)]
+        while len(frames) < count:
+            if not frame_ready.wait_for(lambda: latest_frame_seq > seq, timeout=timeout):
+                break
+            seq = latest_frame_seq
+            frames.append((latest_frame, latest_frame_time))
+    return frames
+
+def preview_width(requested):
+    """Snap a requested preview width to the nearest shared size at or above it."""
+    for width in PREVIEW_WIDTHS:
+        if requested <= width:
+            return width
+    return PREVIEW_WIDTHS[-1]
+
+def get_preview_jpeg(width):
+    """Return (seq, JPEG bytes) of the newest frame at a preview width.
+
+    Each camera frame is resized and encoded at most once per width, however
+    many viewers are watching.
+    """
+    with frame_lock:
+        frame, seq = latest_frame, latest_frame_seq
+    if frame is None:
+        return None
+    with preview_locks[width]:
+        cached = preview_cache.get(width)
+        if cached is not None and cached[0] >= seq:
+            return cached
+        height = round(frame.shape[0] * width / frame.shape[1])
+        preview_frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+        _, buffer = cv2.imencode('.jpg', preview_frame, [cv2.IMWRITE_JPEG_QUALITY, PREVIEW_QUALITY])
+        cached = (seq, buffer.tobytes())
+        preview_cache[width] = cached
+        return cached
+
+def generate_preview(width, fps):
+    """Yield the preview as an MJPEG stream, one part per new camera frame."""
+    interval = 1.0 / fps
+    last_seq = 0
+    while True:
+        started = time.time()
+        with frame_ready:
+            frame_ready.wait_for(lambda: latest_frame_seq > last_seq, timeout=2.0)
+        entry = get_preview_jpeg(width)
+        if entry is not None and entry[0] != last_seq:
+            last_seq = entry[0]
+            yield (b'--frame\r\n'
+                   b'Content-Type: image/jpeg\r\n\r\n' + entry[1] + b'\r\n')
+        time.sleep(max(0.0, interval - (time.time() - started)))
+
+def queue_snapshot(frame, captured_at):
+    """Queue a frame for writing. Returns the filename, or None if the queue is full."""
+    timestamp = datetime.fromtimestamp(captured_at).strftime('%Y%m%d_%H%M%S_%f')[:-3]
+    filename = f"snapshot_{timestamp}.jpg"
+    try:
+        write_queue.put_nowait((os.path.join(SNAPSHOTS_DIR, filename), frame, captured_at))
+    except queue.Full:
+        return None
+    return filename
+
+class AutoCapture:
+    """Unattended capture on a schedule or on scene change, for dataset building.
+
+    Frames are compared as small blurred grayscale thumbnails (mean absolute
+    difference, 0-255). Interval mode triggers on a timer; change mode triggers
+    when the scene differs from the last saved frame by change_threshold.
+    A frame is saved when its trigger fires, it differs by
+    at least min_difference from every recently saved frame, and the rolling
+    per-hour budget allows it. Writes go through the shared write-behind queue.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.thread = None
+        # Each run gets its own stop event, so a thread from an earlier run can never resume
+        self.stop_event = None
+        self.mode = "interval"
+        self.interval = 60.0
+        self.change_threshold = 12.0
+        self.min_difference = 6.0
+        self.per_hour = 120
+        self.saved_thumbs = deque(maxlen=AUTO_HISTORY)
+        self.saved_times = deque()
+        self.last_trigger = 0
+        self.stats = {"saved": 0, "skipped_similar": 0, "skipped_budget": 0, "skipped_busy": 0}
+
+    def configure(self, mode=None, interval=None, change_threshold=None, min_difference=None, per_hour=None):
+        with self.lock:
+            if mode in ("interval", "change"):
+                self.mode = mode
+            if interval is not None:
+                self.interval = max(1.0, interval)
+            if change_threshold is not None:
+                self.change_threshold = max(1.0, change_threshold)
+            if min_difference is not None:
+                self.min_difference = max(0.0, min_difference)
+            if per_hour is not None:
+                self.per_hour = max(1, per_hour)
+
+    @property
+    def running(self):
+        return self.stop_event is not None and not self.stop_event.is_set()
+
+    def start(self):
+        with self.lock:
+            if self.running:
+                return
+            self.stop_event = threading.Event()
+            self.thread = threading.Thread(target=self._run, args=(self.stop_event,), name="auto-capture",
+                                           daemon=True)
+            self.thread.start()
+        print(f"✓ Auto capture started ({self.mode} mode)")
+
+    def stop(self):
+        with self.lock:
+            thread = self.thread
+            if self.stop_event is not None:
+                self.stop_event.set()
+        # Outside the lock: the thread takes it in _check()
+        if thread is not None:
+            thread.join()
+        print("Auto capture stopped")
+
+    def status(self):
+        with self.lock:
+            hour_ago = time.time() - 3600
+            return dict(self.stats, running=self.running, mode=self.mode, interval=self.interval,
+                        change_threshold=self.change_threshold, min_difference=self.min_difference,
+                        per_hour=self.per_hour,
+                        saved_last_hour=sum(1 for t in self.saved_times if t >= hour_ago))
+
+    @staticmethod
+    def thumbnail(frame):
+        small = cv2.resize(frame, AUTO_THUMB_SIZE, interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(gray, (3, 3), 0)
+
+    @staticmethod
+    def difference(a, b):
+        return cv2.mean(cv2.absdiff(a, b))[0]
+
+    def _run(self, stop_event):
+        while not stop_event.wait(AUTO_CHECK_INTERVAL):
+            with frame_lock:
+                frame, captured_at = latest_frame, latest_frame_time
+            if frame is not None:
+                self._check(frame, captured_at)
+
+    def _check(self, frame, captured_at):
+        thumb = self.thumbnail(frame)
+        now = time.time()
+        with self.lock:
+            if self.mode == "interval":
+                triggered = now - self.last_trigger >= self.interval
+            else:
+                last_saved = self.saved_thumbs[-1] if self.saved_thumbs else None
+                triggered = last_saved is None or self.difference(thumb, last_saved) >= self.change_threshold
+            if not triggered:
+                return
+            self.last_trigger = now
+
+            # Rolling one-hour budget
+            while self.saved_times and self.saved_times[0] < now - 3600:
+                self.saved_times.popleft()
+            if len(self.saved_times) >= self.per_hour:
+                self.stats["skipped_budget"] += 1
+                return
+
+            # Skip frames too similar to anything saved recently
+            if any(self.difference(thumb, saved) < self.min_difference for saved in self.saved_thumbs):
+                self.stats["skipped_similar"] += 1
+                return
+
+            if queue_snapshot(frame, captured_at) is None:
+                self.stats["skipped_busy"] += 1
+                return
+            self.saved_thumbs.append(thumb)
+            self.saved_times.append(now)
+            self.stats["saved"] += 1
+
+auto_capture = AutoCapture()
+
+def list_snapshots():
+    """Return snapshots as (filename, mtime, size), newest first.
+
+    The scan is cached and only repeated when the directory's mtime changes
+    (a file was added, removed or renamed).
+    """
+    global snapshot_listing
+    dir_mtime = os.stat(SNAPSHOTS_DIR).st_mtime_ns
+    with listing_lock:
+        if snapshot_listing[0] != dir_mtime:
+            entries = []
+            with os.scandir(SNAPSHOTS_DIR) as it:
+                for entry in it:
+                    if entry.is_file() and entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                        stat = entry.stat()
+                        entries.append((entry.name, stat.st_mtime, stat.st_size))
+            entries.sort(key=lambda e: (e[1], e[0]), reverse=True)
+            snapshot_listing = (dir_mtime, entries)
+        return snapshot_listing[1]
+
+def parse_since(value):
+    """Parse ?since= as a Unix timestamp or an ISO date/time. Returns None if absent."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+def snapshot_path(filename):
+    """Full path of an existing snapshot, or abort with 404."""
+    path = safe_join(SNAPSHOTS_DIR, filename)
+    if path is None or not filename.lower().endswith(IMAGE_EXTENSIONS) or not os.path.isfile(path):
+        abort(404)
+    return path
+
+def get_thumbnail(filename):
+    """Return the filename of a cached thumbnail, generating it if missing or stale.
+
+    Thumbnails carry the source file's mtime, so a re-saved snapshot gets a
+    fresh thumbnail on its next request.
+    """
+    source = snapshot_path(filename)
+    source_mtime = os.stat(source).st_mtime
+    # Keep the source extension so foo.png and foo.jpg get separate thumbnails
+    thumb_name = filename + '.jpg'
+    thumb = os.path.join(THUMBS_DIR, thumb_name)
+    try:
+        if os.stat(thumb).st_mtime == source_mtime:
+            return thumb_name
+    except FileNotFoundError:
+        pass
+
+    with thumb_slots:
+        # Reduced decode: 1/4 resolution straight out of the JPEG decoder
+        image = cv2.imread(source, cv2.IMREAD_REDUCED_COLOR_4)
+        if image is None:
+            abort(404)
+        if image.shape[1] > THUMB_WIDTH:
+            height = round(image.shape[0] * THUMB_WIDTH / image.shape[1])
+            image = cv2.resize(image, (THUMB_WIDTH, height), interpolation=cv2.INTER_AREA)
+        ok, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, THUMB_QUALITY])
+        if not ok:
+            abort(500)
+
+    os.makedirs(THUMBS_DIR, exist_ok=True)
+    # Write then rename so a concurrent request never serves a partial file
+    tmp_path = f"{thumb}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(buffer.tobytes())
+    os.utime(tmp_path, (source_mtime, source_mtime))
+    os.replace(tmp_path, thumb)
+    return thumb_name
+
+class StreamBuffer:
+    """Write-only file object whose contents are drained by a streaming response."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+def generate_archive(entries, archive_format):
+    """Yield a zip or tar of the given snapshots as it is built, never staged on disk.
+
+    JPEGs are already compressed, so the zip stores them as-is.
+    """
+    buffer = StreamBuffer()
+    if archive_format == 'tar':
+        archive = tarfile.open(fileobj=buffer, mode='w|')
+        add = lambda path, name: archive.add(path, arcname=name)
+    else:
+        archive = zipfile.ZipFile(buffer, mode='w', compression=zipfile.ZIP_STORED)
+        add = lambda path, name: archive.write(path, arcname=name)
+
+    for filename, _, _ in entries:
+        try:
+            add(os.path.join(SNAPSHOTS_DIR, filename), filename)
+        except FileNotFoundError:
+            continue
+        data = buffer.drain()
+        if data:
+            yield data
+    archive.close()
+    yield buffer.drain()
 
 HTML_TEMPLATE = """
 <!DOCTYPE html>
@@ -103,6 +482,11 @@ HTML_TEMPLATE = """
             border-radius: 10px;
             box-shadow: 0 4px 15px rgba(0,0,0,0.2);
         }
+        .preview-options {
+            margin-top: 10px;
+            color: #666;
+            font-size: 0.9em;
+        }
         .controls {
             text-align: center;
             margin: 30px 0;
@@ -147,6 +531,40 @@ HTML_TEMPLATE = """
             font-size: 2.5em;
             font-weight: bold;
         }
+        .auto-panel {
+            background: #f9f9f9;
+            padding: 20px;
+            border-radius: 10px;
+            text-align: center;
+        }
+        .auto-panel h3 {
+            color: #667eea;
+            margin-bottom: 10px;
+        }
+        .auto-status {
+            margin-top: 10px;
+            color: #666;
+            font-size: 0.9em;
+        }
+        .gallery {
+            background: #f9f9f9;
+            padding: 20px;
+            border-radius: 10px;
+            margin-top: 20px;
+        }
+        .gallery h3 {
+            color: #667eea;
+            margin-bottom: 10px;
+        }
+        .gallery-grid {
+            display: grid;
+            grid-template-columns: repeat(auto-fill, minmax(160px, 1fr));
+            gap: 10px;
+        }
+        .gallery-grid img {
+            width: 100%;
+            border-radius: 5px;
+        }
         .instructions {
             background: #f9f9f9;
             padding: 20px;
@@ -189,13 +607,38 @@ HTML_TEMPLATE = """
         </header>
         <div class="content">
             <div class="preview">
-                <img id="preview" src="/preview" alt="Camera preview">
+                <img id="preview" alt="Camera preview">
+                <div class="preview-options">
+                    Preview rate:
+                    <select id="previewFps" onchange="startPreview()">
+                        <option value="5">5 FPS</option>
+                        <option value="10" selected>10 FPS</option>
+                        <option value="15">15 FPS</option>
+                        <option value="30">30 FPS</option>
+                    </select>
+                </div>
             </div>
 
             <div class="controls">
                 <button class="btn" onclick="captureSnapshot()" id="captureBtn">
                     📷 CAPTURE (Spacebar)
                 </button>
+                <button class="btn" onclick="captureSnapshot(10)" id="burstBtn">
+                    🎞️ BURST x10 (B)
+                </button>
+            </div>
+
+            <div class="auto-panel">
+                <h3>Unattended Capture</h3>
+                <select id="autoMode">
+                    <option value="interval">Every</option>
+                    <option value="change">On scene change</option>
+                </select>
+                <input id="autoInterval" type="number" min="1" value="60" style="width: 70px;"> s
+                &nbsp; max <input id="autoPerHour" type="number" min="1" value="120" style="width: 70px;"> / hour
+                <button onclick="setAuto('start')">Start</button>
+                <button onclick="setAuto('stop')">Stop</button>
+                <div id="autoStatus" class="auto-status">Stopped</div>
             </div>
 
             <div class="stats">
@@ -213,11 +656,20 @@ HTML_TEMPLATE = """
                 </div>
             </div>
 
+            <div class="gallery">
+                <h3>Recent Snapshots</h3>
+                <div class="gallery-grid" id="gallery"></div>
+                <div class="auto-status">
+                    <a href="/snapshots/archive">⬇ Download all (zip)</a>
+                </div>
+            </div>
+
             <div class="instructions">
                 <h3>Instructions</h3>
                 <ul>
                     <li><strong>Press SPACEBAR</strong> on your keyboard to capture</li>
                     <li><strong>Click the button</strong> to capture with mouse</li>
+                    <li><strong>Press B</strong> to capture a burst of 10 consecutive frames</li>
                     <li>Images are saved at full resolution ({{ width }}x{{ height }})</li>
                     <li>Access this page from your Mac: <strong>http://edsspi3.local:9000</strong></li>
                     <li>Snapshots are saved on the Pi in: <strong>~/milk-bottles/{{ snapshots_dir }}/</strong></li>
@@ -229,18 +681,28 @@ HTML_TEMPLATE = """
     <script>
         let snapshotCount = 0;
 
-        // Update preview image every 100ms
-        setInterval(() => {
-            document.getElementById('preview').src = '/preview?' + new Date().getTime();
-        }, 100);
+        // Single pushed preview stream sized to the displayed image
+        function startPreview() {
+            const img = document.getElementById('preview');
+            const fps = document.getElementById('previewFps').value;
+            const width = Math.round(img.parentElement.clientWidth * (window.devicePixelRatio || 1));
+            img.src = `/preview_stream?width=${width}&fps=${fps}`;
+        }
+
+        let resizeTimer = null;
+        window.addEventListener('resize', () => {
+            clearTimeout(resizeTimer);
+            resizeTimer = setTimeout(startPreview, 500);
+        });
+        startPreview();
 
         // Capture snapshot
-        function captureSnapshot() {
-            fetch('/capture')
+        function captureSnapshot(burst = 1) {
+            fetch('/capture?burst=' + burst)
                 .then(response => response.json())
                 .then(data => {
                     if (data.success) {
-                        snapshotCount++;
+                        snapshotCount = data.count;
                         document.getElementById('count').textContent = snapshotCount;
 
                         // Flash effect
@@ -248,7 +710,7 @@ HTML_TEMPLATE = """
                         flash.classList.add('active');
                         setTimeout(() => flash.classList.remove('active'), 100);
 
-                        console.log('Captured:', data.filename);
+                        console.log('Captured:', data.filenames);
                     }
                 })
                 .catch(error => console.error('Error:', error));
@@ -259,9 +721,56 @@ HTML_TEMPLATE = """
             if (event.code === 'Space') {
                 event.preventDefault();
                 captureSnapshot();
+            } else if (event.code === 'KeyB') {
+                event.preventDefault();
+                captureSnapshot(10);
             }
         });
 
+        // Unattended capture
+        function showAutoStatus(status) {
+            document.getElementById('autoStatus').textContent = status.running
+                ? `Running (${status.mode}) - ${status.saved} saved, ${status.saved_last_hour}/${status.per_hour} this hour, ` +
+                  `${status.skipped_similar} skipped as similar`
+                : `Stopped - ${status.saved} saved`;
+        }
+
+        function setAuto(action) {
+            fetch('/auto', {
+                method: 'POST',
+                headers: {'Content-Type': 'application/json'},
+                body: JSON.stringify({
+                    action: action,
+                    mode: document.getElementById('autoMode').value,
+                    interval: document.getElementById('autoInterval').value,
+                    per_hour: document.getElementById('autoPerHour').value
+                })
+            })
+                .then(response => response.json())
+                .then(showAutoStatus);
+        }
+
+        // Recent snapshots, as cached thumbnails linking to the full image
+        function loadGallery() {
+            fetch('/snapshots?per_page=12')
+                .then(response => response.json())
+                .then(data => {
+                    document.getElementById('gallery').innerHTML = data.snapshots.map(s =>
+                        `<a href="${s.url}" target="_blank"><img src="${s.thumbnail}" title="${s.filename}" loading="lazy"></a>`
+                    ).join('');
+                });
+        }
+        loadGallery();
+
+        setInterval(() => {
+            loadGallery();
+            fetch('/auto').then(response => response.json()).then(showAutoStatus);
+            fetch('/count').then(response => response.json()).then(data => {
+                snapshotCount = data.count;
+                document.getElementById('count').textContent = snapshotCount;
+            });
+        }, 5000);
+
         // Get initial count
         fetch('/count')
             .then(response => response.json())
@@ -286,54 +795,154 @@ def index():
 
 @app.route('/preview')
 def preview():
-    """Serve preview image (low quality for fast updates)."""
-    global latest_frame
-    with frame_lock:
-        if latest_frame is not None:
-            # Resize for preview
-            preview_frame = cv2.resize(latest_frame, (640, 360))
-            _, buffer = cv2.imencode('.jpg', preview_frame, [cv2.IMWRITE_JPEG_QUALITY, 70])
-            return buffer.tobytes(), 200, {'Content-Type': 'image/jpeg'}
+    """Serve a single preview image (low quality for fast updates)."""
+    entry = get_preview_jpeg(preview_width(request.args.get('width', 640, type=int)))
+    if entry is not None:
+        return entry[1], 200, {'Content-Type': 'image/jpeg'}
     return '', 204
 
+@app.route('/preview_stream')
+def preview_stream():
+    """Push the preview as MJPEG at the size and rate the browser asks for."""
+    width = preview_width(request.args.get('width', 640, type=int))
+    fps = max(1, min(request.args.get('fps', 10, type=int), PREVIEW_MAX_FPS))
+    return Response(generate_preview(width, fps),
+                    mimetype='multipart/x-mixed-replace; boundary=frame')
+
 @app.route('/capture')
 def capture():
-    """Capture and save a high-resolution snapshot."""
-    global snapshot_count
-
-    # Capture frame at full resolution
-    ret, frame = camera.read()
-    if not ret:
-        return jsonify({'success': False, 'error': 'Failed to capture frame'})
+    """Capture high-resolution snapshots (?burst=N for N consecutive frames)."""
+    burst = max(1, min(request.args.get('burst', 1, type=int), MAX_BURST))
 
-    # Generate filename
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')[:-3]
-    filename = f"snapshot_{timestamp}.jpg"
-    filepath = os.path.join(SNAPSHOTS_DIR, filename)
+    # Take frames from the capture thread instead of reading the camera here
+    frames = next_frames(burst)
+    if not frames:
+        return jsonify({'success': False, 'error': 'No frame available from camera'})
 
-    # Save at maximum quality
-    cv2.imwrite(filepath, frame, [cv2.IMWRITE_JPEG_QUALITY, 95])
-    snapshot_count += 1
+    filenames = []
+    for frame, captured_at in frames:
+        filename = queue_snapshot(frame, captured_at)
+        if filename is None:
+            break
+        filenames.append(filename)
 
-    print(f"✓ Saved: {filename}")
+    if not filenames:
+        return jsonify({'success': False, 'error': 'Snapshot writer is busy, try again'})
 
     return jsonify({
         'success': True,
-        'filename': filename,
-        'count': snapshot_count
+        'filename': filenames[0],
+        'filenames': filenames,
+        'captured_at': frames[0][1],
+        'count': snapshot_count + write_queue.qsize(),
+        'pending': write_queue.qsize()
     })
 
+@app.route('/auto', methods=['GET', 'POST'])
+def auto():
+    """Get or change unattended capture settings (POST action=start|stop)."""
+    if request.method == 'POST':
+        args = request.get_json(silent=True) or request.form
+        try:
+            auto_capture.configure(
+                mode=args.get('mode'),
+                interval=float(args['interval']) if args.get('interval') else None,
+                change_threshold=float(args['threshold']) if args.get('threshold') else None,
+                min_difference=float(args['min_difference']) if args.get('min_difference') else None,
+                per_hour=int(args['per_hour']) if args.get('per_hour') else None
+            )
+        except (TypeError, ValueError):
+            abort(400)
+        if args.get('action') == 'start':
+            auto_capture.start()
+        elif args.get('action') == 'stop':
+            auto_capture.stop()
+    return jsonify(auto_capture.status())
+
 @app.route('/count')
 def get_count():
     """Get current snapshot count."""
     return jsonify({'count': snapshot_count})
 
+@app.route('/snapshots')
+def snapshots():
+    """Paginated snapshot listing, newest first (?page=&per_page=&since=)."""
+    entries = list_snapshots()
+    try:
+        since = parse_since(request.args.get('since'))
+    except ValueError:
+        abort(400)
+    if since is not None:
+        entries = [e for e in entries if e[1] > since]
+
+    per_page = max(1, min(request.args.get('per_page', GALLERY_PAGE_SIZE, type=int), GALLERY_MAX_PAGE_SIZE))
+    pages = max(1, -(-len(entries) // per_page))
+    page = max(1, min(request.args.get('page', 1, type=int), pages))
+    start = (page - 1) * per_page
+
+    return jsonify({
+        'total': len(entries),
+        'page': page,
+        'pages': pages,
+        'per_page': per_page,
+        'snapshots': [{
+            'filename': filename,
+            'mtime': mtime,
+            'size': size,
+            'url': f'/snapshots/{filename}',
+            'thumbnail': f'/snapshots/thumbs/{filename}'
+        } for filename, mtime, size in entries[start:start + per_page]]
+    })
+
+@app.route('/snapshots/thumbs/<filename>')
+def snapshot_thumbnail(filename):
+    """Serve a cached thumbnail, generated on first request."""
+    response = send_from_directory(THUMBS_DIR, get_thumbnail(filename), mimetype='image/jpeg')
+    response.headers['Cache-Control'] = 'max-age=3600'
+    return response
+
+@app.route('/snapshots/archive')
+def snapshots_archive():
+    """Stream snapshots newer than ?since= as a zip (default) or ?format=tar."""
+    archive_format = request.args.get('format', 'zip')
+    if archive_format not in ('zip', 'tar'):
+        abort(400)
+    try:
+        since = parse_since(request.args.get('since'))
+    except ValueError:
+        abort(400)
+
+    # Oldest first so an interrupted download still has a contiguous range
+    entries = [e for e in reversed(list_snapshots()) if since is None or e[1] > since]
+    name = f"snapshots_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{archive_format}"
+    return Response(generate_archive(entries, archive_format),
+                    mimetype='application/zip' if archive_format == 'zip' else 'application/x-tar',
+                    headers={
+                        'Content-Disposition': f'attachment; filename={name}',
+                        'X-Snapshot-Count': str(len(entries)),
+                        'X-Snapshot-Latest': str(entries[-1][1]) if entries else ''
+                    })
+
 @app.route('/snapshots/<filename>')
 def download_snapshot(filename):
     """Download a specific snapshot."""
     return send_from_directory(SNAPSHOTS_DIR, filename)
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Pi camera snapshot capture tool")
+    parser.add_argument("--auto", choices=["interval", "change"],
+                        help="Start unattended capture in this mode")
+    parser.add_argument("--interval", type=float, default=60.0,
+                        help="Seconds between captures in interval mode")
+    parser.add_argument("--threshold", type=float, default=12.0,
+                        help="Scene change (0-255 mean difference) that triggers a capture in change mode")
+    parser.add_argument("--min-difference", type=float, default=6.0,
+                        help="Skip frames closer than this to a recently saved one")
+    parser.add_argument("--per-hour", type=int, default=120,
+                        help="Maximum snapshots saved per rolling hour")
+    parser.add_argument("--pack", help="Also append every snapshot to this frame pack (needs frame_pack.py)")
+    args = parser.parse_args()
+
     print("=" * 60)
     print("Pi Camera High-Resolution Snapshot Capture Tool")
     print("=" * 60)
@@ -351,9 +960,23 @@ if __name__ == '__main__':
     print("✓ Camera initialized")
     print("")
 
-    # Start camera loop in background
+    if args.pack:
+        from frame_pack import FramePackWriter
+        snapshot_pack = FramePackWriter(args.pack)
+        print(f"✓ Appending snapshots to {args.pack} ({snapshot_pack.count} frames so far)")
+        print("")
+
+    # Start camera loop and snapshot writer in background
     camera_thread = threading.Thread(target=camera_loop, daemon=True)
     camera_thread.start()
+    writer_thread = threading.Thread(target=snapshot_writer, daemon=True)
+    writer_thread.start()
+
+    auto_capture.configure(mode=args.auto, interval=args.interval, change_threshold=args.threshold,
+                           min_difference=args.min_difference, per_hour=args.per_hour)
+    if args.auto:
+        auto_capture.start()
+        print("")
 
     print("Starting web server...")
     print("Access from your Mac:")
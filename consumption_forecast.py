@@ -0,0 +1,192 @@
+"""
+Consumption rates and time-to-empty forecasts from confirmed count changes.
+The count history used to be plotted and nothing more. ConsumptionForecaster
+is fed each confirmed count change and updates a handful of running
+statistics in constant time, so nothing is ever rescanned:
+
+    removals and restocks   a count going down or up, per flavor
+    hourly rates            bottles taken per hour, per hour of the day,
+                            smoothed across days
+    recent rate             exponentially decaying rate for flavors or hours
+                            without a profile yet
+
+The forecast walks the hourly profile forward from the current count until
+it runs out, so a quiet evening is not extrapolated from a busy lunchtime.
+refresh() re-checks it as the clock moves on between count changes.
+The state is small and JSON-serializable for the warm-start snapshot.
+"""
+
+import copy
+import math
+import threading
+from datetime import datetime
+
+HOURLY_ALPHA = 0.3  # Weight of the newest day in each hour-of-day rate
+RECENT_HALF_LIFE_SECONDS = 1800  # The recent rate forgets removals with this half-life
+LOW_STOCK_MINUTES = 30  # Warn when a flavor is forecast to run out this soon
+HORIZON_HOURS = 48  # Forecasts further out than this are reported as None
+MAX_IDLE_HOURS = 24  # Hours without a change are folded in as zero consumption, up to this many
+
+
+def hour_of_day(hour_key):
+    return datetime.fromtimestamp(hour_key * 3600).hour
+
+
+class ConsumptionForecaster:
+    """Running consumption statistics and stock-out forecasts for one camera's flavors."""
+
+    def __init__(self, flavors, low_stock_minutes=LOW_STOCK_MINUTES):
+        self.flavors = list(flavors)
+        self.low_stock_minutes = low_stock_minutes
+        self.count = {flavor: None for flavor in self.flavors}
+        self.updated = {flavor: None for flavor in self.flavors}
+        # Bottles per hour for each hour of the day (None until that hour has been seen)
+        self.hourly = {flavor: [None] * 24 for flavor in self.flavors}
+        # [hour since the epoch, bottles removed in it] for the clock hour in progress
+        self.bucket = {flavor: [None, 0] for flavor in self.flavors}
+        # Exponentially decayed bottles removed, as of updated[flavor]
+        self.recent = {flavor: 0.0 for flavor in self.flavors}
+        self.removed = {flavor: 0 for flavor in self.flavors}
+        self.restocked = {flavor: 0 for flavor in self.flavors}
+        self.last_restock = {flavor: None for flavor in self.flavors}
+        self.low_stock = set()
+        self.lock = threading.Lock()
+
+    def update(self, flavor, count, now):
+        """Record a confirmed count. Returns a list of removal/restock/low_stock events."""
+        with self.lock:
+            return self._update(flavor, count, now)
+
+    def _update(self, flavor, count, now):
+        previous, last = self.count[flavor], self.updated[flavor]
+        self.count[flavor], self.updated[flavor] = count, now
+        delta = 0 if previous is None else count - previous
+
+        # Close finished clock hours into the hour-of-day profile
+        hour_key = int(now // 3600)
+        bucket = self.bucket[flavor]
+        if bucket[0] is None:
+            bucket[0] = hour_key
+        elif hour_key > bucket[0]:
+            self._fold(flavor, bucket[0], bucket[1])
+            for idle_key in range(max(bucket[0] + 1, hour_key - MAX_IDLE_HOURS), hour_key):
+                self._fold(flavor, idle_key, 0)
+            bucket[0], bucket[1] = hour_key, 0
+
+        if last is not None:
+            self.recent[flavor] *= 0.5 ** ((now - last) / RECENT_HALF_LIFE_SECONDS)
+
+        events = []
+        if delta < 0:
+            bucket[1] -= delta
+            self.recent[flavor] -= delta
+            self.removed[flavor] -= delta
+            events.append({"type": "removal", "flavor": flavor, "bottles": -delta, "count": count, "time": now})
+        elif delta > 0:
+            self.restocked[flavor] += delta
+            self.last_restock[flavor] = now
+            self.low_stock.discard(flavor)
+            events.append({"type": "restock", "flavor": flavor, "bottles": delta, "count": count, "time": now})
+
+        low_stock = self._check_low_stock(flavor, now)
+        if low_stock:
+            events.append(low_stock)
+        return events
+
+    def refresh(self, now):
+        """Re-check time to empty as the clock moves on without count changes. Returns new low_stock events."""
+        with self.lock:
+            return [event for event in (self._check_low_stock(flavor, now) for flavor in self.flavors) if event]
+
+    def _check_low_stock(self, flavor, now):
+        count = self.count[flavor]
+        minutes = self.minutes_to_empty(flavor, now)
+        if count and minutes is not None and minutes <= self.low_stock_minutes and flavor not in self.low_stock:
+            self.low_stock.add(flavor)
+            return {"type": "low_stock", "flavor": flavor, "count": count,
+                    "minutes_to_empty": round(minutes, 1), "time": now}
+        return None
+
+    def _fold(self, flavor, hour_key, removed):
+        hour = hour_of_day(hour_key)
+        rate = self.hourly[flavor][hour]
+        self.hourly[flavor][hour] = removed if rate is None else HOURLY_ALPHA * removed + (1 - HOURLY_ALPHA) * rate
+
+    def recent_rate(self, flavor, now):
+        """Bottles per hour over roughly the last half-life."""
+        if self.updated[flavor] is None:
+            return 0.0
+        decayed = self.recent[flavor] * 0.5 ** ((now - self.updated[flavor]) / RECENT_HALF_LIFE_SECONDS)
+        return decayed * math.log(2) / RECENT_HALF_LIFE_SECONDS * 3600
+
+    def rate(self, flavor, hour, now):
+        """Expected bottles per hour at an hour of the day; the recent rate where there is no profile."""
+        rate = self.hourly[flavor][hour]
+        return self.recent_rate(flavor, now) if rate is None else rate
+
+    def minutes_to_empty(self, flavor, now):
+        """Minutes until the forecast reaches zero, or None beyond the horizon or without any rate."""
+        remaining = self.count[flavor]
+        if remaining is None:
+            return None
+        if remaining <= 0:
+            return 0.0
+        t = now
+        for _ in range(HORIZON_HOURS + 1):
+            hour_end = (int(t // 3600) + 1) * 3600
+            rate = self.rate(flavor, datetime.fromtimestamp(t).hour, now)
+            expected = rate * (hour_end - t) / 3600
+            if rate > 0 and expected >= remaining:
+                return (t + remaining / rate * 3600 - now) / 60
+            remaining -= expected
+            t = hour_end
+        return None
+
+    def forecast(self, now):
+        """{flavor: count, rates, time to empty and counters} as of now."""
+        forecast = {}
+        hour = datetime.fromtimestamp(now).hour
+        with self.lock:
+            for flavor in self.flavors:
+                forecast[flavor] = self._forecast_flavor(flavor, hour, now)
+        return forecast
+
+    def _forecast_flavor(self, flavor, hour, now):
+        minutes = self.minutes_to_empty(flavor, now)
+        last_restock = self.last_restock[flavor]
+        return {
+            "count": self.count[flavor],
+            "rate_per_hour": round(self.rate(flavor, hour, now), 2),
+            "recent_rate_per_hour": round(self.recent_rate(flavor, now), 2),
+            "minutes_to_empty": None if minutes is None else round(minutes, 1),
+            "empty_at": None if minutes is None else
+            datetime.fromtimestamp(now + minutes * 60).strftime('%Y-%m-%d %H:%M:%S'),
+            "low_stock": flavor in self.low_stock,
+            "removed": self.removed[flavor],
+            "restocked": self.restocked[flavor],
+            "last_restock": None if last_restock is None else
+            datetime.fromtimestamp(last_restock).strftime('%Y-%m-%d %H:%M:%S'),
+            "hourly_profile": [None if rate is None else round(rate, 2) for rate in self.hourly[flavor]],
+        }
+
+    def state(self):
+        """JSON-serializable state for the warm-start snapshot."""
+        with self.lock:
+            return copy.deepcopy({
+                "count": self.count, "updated": self.updated, "hourly": self.hourly, "bucket": self.bucket,
+                "recent": self.recent, "removed": self.removed, "restocked": self.restocked,
+                "last_restock": self.last_restock, "low_stock": sorted(self.low_stock),
+            })
+
+    def restore(self, state):
+        """Load state saved by state(); flavors missing from it keep their defaults."""
+        if not state:
+            return
+        with self.lock:
+            self._restore(state)
+
+    def _restore(self, state):
+        for name in ("count", "updated", "hourly", "bucket", "recent", "removed", "restocked", "last_restock"):
+            values = getattr(self, name)
+            values.update({flavor: value for flavor, value in state.get(name, {}).items() if flavor in values})
+        self.low_stock = set(state.get("low_stock", [])) & set(self.flavors)
@@ -0,0 +1,92 @@
+"""
+Temporal smoothing of per-frame results into confirmed count events.
+Single inference results flap whenever someone reaches into the fridge or a
+bottle is briefly hidden. CountSmoother keeps the last N results in a ring
+buffer, takes every flavor's median count (and majority missing flag) in one
+vectorized step, and only accepts a new value once the filtered value has
+differed from the confirmed one for a hold period. Confirmed transitions are
+returned as events:
+
+    count_changed  a flavor's confirmed count changed
+    stock_out      the workflow reports a flavor missing, confirmed
+    restocked      a confirmed-missing flavor is back
+"""
+
+import numpy as np
+
+WINDOW = 15  # Results in the filter window (1.5s at 10 FPS)
+HOLD_SECONDS = 2.0  # A filtered value must differ from the confirmed one this long to be accepted
+
+
+class CountSmoother:
+    """Median/majority filter plus hold-time hysteresis over one camera's results."""
+
+    def __init__(self, flavors, window=WINDOW, hold_seconds=HOLD_SECONDS):
+        self.flavors = list(flavors)
+        self.hold_seconds = hold_seconds
+        # Rows are results, columns are flavors; column F.. holds the missing flags
+        self.window = np.zeros((window, 2 * len(self.flavors)), dtype=np.int32)
+        self.filled = 0
+        self.next = 0
+        self.started = None
+        self.confirmed = None
+        # When each column's filtered value started to differ from the confirmed one (nan: it does not)
+        self.differs_since = np.full(2 * len(self.flavors), np.nan)
+
+    def update(self, counts, missing, now):
+        """Add one result. Returns a list of confirmed transition events (possibly empty)."""
+        self.window[self.next] = ([counts.get(flavor, 0) for flavor in self.flavors] +
+                                  [flavor in missing for flavor in self.flavors])
+        self.next = (self.next + 1) % len(self.window)
+        self.filled = min(self.filled + 1, len(self.window))
+        # Lower median of counts; for 0/1 missing flags the same row is the majority vote
+        filtered = np.sort(self.window[:self.filled], axis=0)[(self.filled - 1) // 2]
+
+        if self.confirmed is None:
+            # Let the window cover the hold period before reporting a first state
+            self.started = self.started or now
+            if now - self.started < self.hold_seconds:
+                return []
+            self.confirmed = filtered.copy()
+            return self._events(np.ones(len(filtered), dtype=bool), None, now)
+
+        differs = filtered != self.confirmed
+        self.differs_since[~differs] = np.nan
+        self.differs_since[differs & np.isnan(self.differs_since)] = now
+        accept = differs & (now - self.differs_since >= self.hold_seconds)
+        if not accept.any():
+            return []
+        previous = self.confirmed.copy()
+        self.confirmed[accept] = filtered[accept]
+        self.differs_since[accept] = np.nan
+        return self._events(accept, previous, now)
+
+    def _events(self, accepted, previous, now):
+        events = []
+        count_columns = len(self.flavors)
+        for column in np.flatnonzero(accepted):
+            flavor = self.flavors[column % count_columns]
+            value = int(self.confirmed[column])
+            if column < count_columns:
+                events.append({"type": "count_changed", "flavor": flavor, "count": value, "time": now,
+                               "previous": None if previous is None else int(previous[column])})
+            elif value:
+                events.append({"type": "stock_out", "flavor": flavor, "time": now})
+            elif previous is not None:
+                events.append({"type": "restocked", "flavor": flavor, "time": now})
+        return events
+
+    @property
+    def counts(self):
+        """Confirmed counts per flavor (empty until the first state is confirmed)."""
+        if self.confirmed is None:
+            return {}
+        return {flavor: int(self.confirmed[i]) for i, flavor in enumerate(self.flavors)}
+
+    @property
+    def missing(self):
+        """Flavors confirmed missing."""
+        if self.confirmed is None:
+            return []
+        offset = len(self.flavors)
+        return [flavor for i, flavor in enumerate(self.flavors) if self.confirmed[offset + i]]
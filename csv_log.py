@@ -0,0 +1,256 @@
+"""
+Daily rotation, compression and range reads for the count CSV logs.
+milk_bottle_counts.csv used to grow forever (about 17k rows a day in app.py's
+long format) and every analysis read it from the top. RotatingCsvLog keeps
+only the current day in the CSV the apps always wrote. When the first row of
+a new day arrives, the finished file is moved aside and, in the background,
+split by day and gzipped into csv_archive/<log name>/<day>.csv.gz. A sidecar
+index.json records the first and last timestamp and row count of every
+archive. read_rows() opens only the files that overlap a requested range and
+yields rows one at a time, so a query over months costs the days it covers,
+not the whole history, and never holds more than one row in memory.
+
+Usage:
+    python csv_log.py read milk_bottle_counts.csv --start 2026-09-01 --end 2026-10-01 > september.csv
+    python csv_log.py index milk_bottle_counts.csv            # list archives
+    python csv_log.py index milk_bottle_counts.csv --rebuild  # rescan archives after manual changes
+"""
+
+import os
+import sys
+import csv
+import glob
+import gzip
+import json
+import argparse
+import threading
+from datetime import datetime
+
+ARCHIVE_ROOT = "csv_archive"
+INDEX_NAME = "index.json"
+PENDING_PREFIX = "pending-"  # Rotated files waiting to be split and compressed
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def archive_dir(path, archive_root=ARCHIVE_ROOT):
+    return os.path.join(archive_root, os.path.splitext(os.path.basename(path))[0])
+
+
+def as_timestamp(value):
+    """Timestamps compare as strings; accepts None, a datetime or a (possibly partial) timestamp string."""
+    if isinstance(value, datetime):
+        return value.strftime(TIME_FORMAT)
+    return value
+
+
+def first_timestamp(path):
+    """Timestamp of the first data row of a CSV log, or None if it has none."""
+    with open(path, newline='') as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        row = next(reader, None)
+    return row[0] if row else None
+
+
+def load_index(directory):
+    """Archive entries ({file, first, last, rows}) ordered by first timestamp."""
+    try:
+        with open(os.path.join(directory, INDEX_NAME)) as f:
+            return json.load(f)["files"]
+    except FileNotFoundError:
+        return rebuild_index(directory) if glob.glob(os.path.join(directory, "*.csv.gz")) else []
+
+
+def save_index(directory, entries):
+    entries = sorted(entries, key=lambda entry: (entry["first"], entry["file"]))
+    path = os.path.join(directory, INDEX_NAME)
+    with open(path + ".tmp", "w") as f:
+        json.dump({"files": entries}, f, indent=1)
+    os.replace(path + ".tmp", path)
+    return entries
+
+
+def rebuild_index(directory):
+    """Scan every archive in directory and rewrite its index."""
+    entries = []
+    for archive in sorted(glob.glob(os.path.join(directory, "*.csv.gz"))):
+        entry = {"file": os.path.basename(archive), "first": None, "last": None, "rows": 0}
+        with gzip.open(archive, "rt", newline='') as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            for row in reader:
+                if row:
+                    entry["first"] = entry["first"] or row[0]
+                    entry["last"] = row[0]
+                    entry["rows"] += 1
+        if entry["rows"]:
+            entries.append(entry)
+    return save_index(directory, entries)
+
+
+def read_file(path, start=None, end=None):
+    """Yield rows of one log file (plain or gzipped) with start <= timestamp < end."""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", newline='') as f:
+        reader = csv.DictReader(f)
+        key = reader.fieldnames[0] if reader.fieldnames else None
+        for row in reader:
+            timestamp = row[key]
+            if start and timestamp < start:
+                continue
+            # Rows within a file are in time order
+            if end and timestamp >= end:
+                break
+            yield row
+
+
+def read_rows(path, start=None, end=None, archive_root=ARCHIVE_ROOT):
+    """Yield the rows of a rotated log with start <= timestamp < end, oldest first.
+
+    start and end may be datetimes or timestamp strings such as '2026-09-01';
+    either may be None for an open range. Only archives whose index range
+    overlaps are opened.
+    """
+    start, end = as_timestamp(start), as_timestamp(end)
+    directory = archive_dir(path, archive_root)
+    files = [os.path.join(directory, entry["file"]) for entry in load_index(directory)
+             if (not start or entry["last"] >= start) and (not end or entry["first"] < end)]
+    # Then days still being archived, then today's file
+    files += sorted(glob.glob(os.path.join(directory, PENDING_PREFIX + "*.csv")))
+    files.append(path)
+    for file in files:
+        try:
+            yield from read_file(file, start, end)
+        except FileNotFoundError:
+            continue  # Archived while we were reading earlier files
+
+
+class RotatingCsvLog:
+    """Append-only CSV log holding the current day, with older days archived by day and gzipped."""
+
+    def __init__(self, path, header, archive_root=ARCHIVE_ROOT):
+        self.path = path
+        self.header = list(header)
+        self.archive_dir = archive_dir(path, archive_root)
+        # Serializes archiving and index updates
+        self.lock = threading.Lock()
+
+        if os.path.exists(path):
+            first = first_timestamp(path)
+            self.day = first[:10] if first else None
+        else:
+            self.start_file()
+            self.day = None
+
+        # Finish archives interrupted by a restart
+        for pending in sorted(glob.glob(os.path.join(self.archive_dir, PENDING_PREFIX + "*.csv"))):
+            self.archive_in_background(pending)
+
+    def start_file(self):
+        with open(self.path, 'w', newline='') as f:
+            csv.writer(f).writerow(self.header)
+
+    def append(self, rows):
+        """Append rows (lists whose first item is a '%Y-%m-%d %H:%M:%S' timestamp)."""
+        day = rows[0][0][:10]
+        if self.day is not None and day != self.day:
+            self.rotate()
+        self.day = day
+        with open(self.path, 'a', newline='') as f:
+            csv.writer(f).writerows(rows)
+
+    def rotate(self):
+        """Move the finished file aside and start a new one; archiving happens in the background."""
+        os.makedirs(self.archive_dir, exist_ok=True)
+        pending = os.path.join(self.archive_dir, f"{PENDING_PREFIX}{self.day}-{datetime.now():%H%M%S}.csv")
+        os.replace(self.path, pending)
+        self.start_file()
+        self.archive_in_background(pending)
+
+    def archive_in_background(self, pending):
+        threading.Thread(target=self.archive, args=(pending,), name=f"archive-{os.path.basename(self.path)}",
+                         daemon=True).start()
+
+    def archive(self, pending):
+        """Split a rotated file by day into gzipped archives and index them."""
+        with self.lock:
+            entries = load_index(self.archive_dir)
+            taken = {entry["file"] for entry in entries}
+            written = []
+            out = writer = entry = None
+            with open(pending, newline='') as f:
+                reader = csv.reader(f)
+                header = next(reader, None) or self.header
+                for row in reader:
+                    if not row:
+                        continue
+                    if entry is None or row[0][:10] != entry["first"][:10]:
+                        if out:
+                            out.close()
+                        entry = {"file": self.archive_name(row[0][:10], taken), "first": row[0], "last": row[0],
+                                 "rows": 0}
+                        taken.add(entry["file"])
+                        written.append(entry)
+                        # Written under a temporary name; a crash before the index update redoes the file
+                        out = gzip.open(os.path.join(self.archive_dir, entry["file"] + ".tmp"), "wt", newline='')
+                        writer = csv.writer(out)
+                        writer.writerow(header)
+                    writer.writerow(row)
+                    entry["last"] = row[0]
+                    entry["rows"] += 1
+            if out:
+                out.close()
+
+            for entry in written:
+                file = os.path.join(self.archive_dir, entry["file"])
+                os.replace(file + ".tmp", file)
+            save_index(self.archive_dir, entries + written)
+            os.remove(pending)
+
+        rows = sum(entry["rows"] for entry in written)
+        print(f"✓ Archived {rows} rows of {os.path.basename(self.path)} into {len(written)} daily file(s) "
+              f"in {self.archive_dir}", flush=True)
+
+    def archive_name(self, day, taken):
+        name, n = f"{day}.csv.gz", 1
+        while name in taken:
+            # A day seen again, e.g. after the clock was set back
+            name, n = f"{day}.{n}.csv.gz", n + 1
+        return name
+
+    def read_rows(self, start=None, end=None):
+        return read_rows(self.path, start, end, os.path.dirname(self.archive_dir))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Read and manage rotated CSV count logs")
+    commands = parser.add_subparsers(dest="command", required=True)
+    read_cmd = commands.add_parser("read", help="Write the rows in a time range to stdout as CSV")
+    read_cmd.add_argument("path", help="The log the app writes, e.g. milk_bottle_counts.csv")
+    read_cmd.add_argument("--start", help="First timestamp, e.g. 2026-09-01 or '2026-09-01 08:00:00'")
+    read_cmd.add_argument("--end", help="End timestamp (exclusive)")
+    index_cmd = commands.add_parser("index", help="List the archives of a log")
+    index_cmd.add_argument("path")
+    index_cmd.add_argument("--rebuild", action="store_true", help="Rescan the archives and rewrite the index")
+    parser.add_argument("--archive-root", default=ARCHIVE_ROOT)
+    args = parser.parse_args()
+
+    if args.command == "read":
+        writer = None
+        for row in read_rows(args.path, args.start, args.end, args.archive_root):
+            if writer is None:
+                writer = csv.DictWriter(sys.stdout, fieldnames=list(row))
+                writer.writeheader()
+            writer.writerow(row)
+    else:
+        directory = archive_dir(args.path, args.archive_root)
+        entries = rebuild_index(directory) if args.rebuild else load_index(directory)
+        if not entries:
+            print(f"No archives in {directory}")
+        for entry in entries:
+            print(f"{entry['file']:<20} {entry['first']} .. {entry['last']}  {entry['rows']:>7} rows")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,170 @@
+"""
+Perceptual-hash index and near-duplicate finder for training snapshot folders.
+Hashes every snapshot in parallel with a process pool, caches the results in an
+index file keyed by path and mtime (so re-runs only process new or changed
+files), clusters near-identical frames and writes a deduplicated manifest.
+
+Usage:
+    python dedupe_snapshots.py training_snapshots_old training_snapshots_rate
+    python dedupe_snapshots.py training_snapshots_water --threshold 2 --manifest water_manifest.json
+"""
+
+import os
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+INDEX_PATH = "snapshot_index.json"
+MANIFEST_PATH = "dedup_manifest.json"
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+# Number of set bits for every byte value, for vectorized Hamming distances
+POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def phash(gray):
+    """64-bit DCT perceptual hash of a grayscale image."""
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:8, :8].flatten()
+    # Compare against the median of the low frequencies, skipping the DC term
+    bits = low > np.median(low[1:])
+    return int("".join("1" if b else "0" for b in bits), 2)
+
+
+def hash_file(path):
+    """Worker: return (path, hash, sharpness) or (path, None, None) if unreadable."""
+    # Reduced decode is much faster and plenty for a 32x32 hash
+    gray = cv2.imread(path, cv2.IMREAD_REDUCED_GRAYSCALE_4)
+    if gray is None:
+        return path, None, None
+    sharpness = float(cv2.Laplacian(gray, cv2.CV_64F).var())
+    return path, phash(gray), sharpness
+
+
+def find_snapshots(directories):
+    paths = []
+    for directory in directories:
+        for root, _, files in os.walk(directory):
+            paths.extend(os.path.join(root, f) for f in files if f.lower().endswith(IMAGE_EXTENSIONS))
+    return sorted(paths)
+
+
+def load_index(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_index(index, path):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(index, f)
+    os.replace(tmp_path, path)
+
+
+def update_index(paths, index, workers=None):
+    """Hash new or modified files. Returns (index, number of files hashed)."""
+    current = {}
+    stale = []
+    for path in paths:
+        stat = os.stat(path)
+        entry = index.get(path)
+        if entry and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+            current[path] = entry
+        else:
+            stale.append((path, stat))
+
+    if stale:
+        stats = dict(stale)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for path, hash_value, sharpness in pool.map(hash_file, list(stats), chunksize=16):
+                if hash_value is None:
+                    print(f"⚠ Could not read {path}")
+                    continue
+                current[path] = {
+                    "mtime": stats[path].st_mtime,
+                    "size": stats[path].st_size,
+                    "hash": format(hash_value, "016x"),
+                    "sharpness": round(sharpness, 2),
+                }
+    return current, len(stale)
+
+
+def cluster_duplicates(paths, index, threshold):
+    """Group paths whose hashes are within threshold bits of a cluster's first member.
+
+    Leader clustering rather than transitive linking: a slow drift of small
+    changes (a bottle removed every few seconds) never chains into one cluster.
+    """
+    hashes = np.array([int(index[p]["hash"], 16) for p in paths], dtype=np.uint64)
+    leaders = np.empty(len(paths), dtype=np.uint64)
+    clusters = []
+    for i, path in enumerate(paths):
+        if clusters:
+            distances = POPCOUNT[(leaders[:len(clusters)] ^ hashes[i]).view(np.uint8)].reshape(-1, 8).sum(axis=1)
+            nearest = int(np.argmin(distances))
+            if distances[nearest] <= threshold:
+                clusters[nearest].append(path)
+                continue
+        leaders[len(clusters)] = hashes[i]
+        clusters.append([path])
+    return clusters
+
+
+def build_manifest(clusters, index, threshold):
+    """Keep the sharpest frame of each cluster."""
+    manifest = {"threshold": threshold, "total": 0, "kept": [], "duplicates": {}}
+    for members in clusters:
+        keep = max(members, key=lambda p: index[p]["sharpness"])
+        manifest["kept"].append(keep)
+        manifest["total"] += len(members)
+        if len(members) > 1:
+            manifest["duplicates"][keep] = sorted(p for p in members if p != keep)
+    manifest["kept"].sort()
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find near-duplicate training snapshots")
+    parser.add_argument("directories", nargs="+", help="Snapshot folders to scan")
+    # Shelf scenes differ by a bottle or two, so keep this tight
+    parser.add_argument("--threshold", type=int, default=4,
+                        help="Maximum Hamming distance (of 64 bits) to count as a duplicate")
+    parser.add_argument("--index", default=INDEX_PATH, help="Hash cache file")
+    parser.add_argument("--manifest", default=MANIFEST_PATH, help="Deduplicated manifest output")
+    parser.add_argument("--workers", type=int, default=None, help="Hashing processes (default: all cores)")
+    args = parser.parse_args()
+
+    started = time.time()
+    paths = find_snapshots(args.directories)
+    print(f"Found {len(paths)} snapshots in {', '.join(args.directories)}")
+
+    index = load_index(args.index)
+    scanned, hashed = update_index(paths, index, args.workers)
+    # Keep entries for folders outside this run so one index can serve several datasets
+    index.update(scanned)
+    for path in [p for p in index if not os.path.exists(p)]:
+        del index[path]
+    save_index(index, args.index)
+    print(f"✓ Hashed {hashed} new or changed files ({len(scanned) - hashed} cached) in {time.time() - started:.1f}s")
+
+    indexed = [p for p in paths if p in scanned]
+    clusters = cluster_duplicates(indexed, index, args.threshold)
+    manifest = build_manifest(clusters, index, args.threshold)
+    with open(args.manifest, "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    removed = manifest["total"] - len(manifest["kept"])
+    print(f"✓ Kept {len(manifest['kept'])} of {manifest['total']} snapshots "
+          f"({removed} near-duplicates in {len(manifest['duplicates'])} clusters)")
+    print(f"  Manifest: {args.manifest}")
+
+
+if __name__ == '__main__':
+    main()
@@ -13,7 +13,7 @@ echo "======================================================"
 echo ""
 
 echo "Step 1: Copying script to Pi..."
-scp capture_snapshots_pi.py ${PI_HOST}:~/${REPO_DIR}/
+scp capture_snapshots_pi.py frame_pack.py ${PI_HOST}:~/${REPO_DIR}/
 
 echo ""
 echo "Step 2: Starting capture tool on Pi..."
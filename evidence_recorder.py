@@ -0,0 +1,140 @@
+"""
+Pre-alert evidence recorder.
+Keeps the last few seconds of already-encoded JPEG frames in a bounded
+in-memory ring (at a reduced rate) and, when an alert fires, writes an image
+strip of those frames on a background thread so the sink never waits on disk.
+"""
+
+import os
+import time
+import queue
+import threading
+from collections import deque
+
+import numpy as np
+
+from frame_pack import FramePackWriter, PackFullError
+
+EVIDENCE_DIR = "alert_evidence"
+
+
+class EvidenceRecorder:
+    """Bounded ring of recent JPEG frames plus an asynchronous strip writer."""
+
+    def __init__(self, directory=EVIDENCE_DIR, seconds=10, fps=2, max_bytes=8 * 1024 * 1024,
+                 strip_frames=8, strip_columns=4, thumb_width=320, pack_frames=False):
+        self.directory = directory
+        self.interval = 1.0 / fps
+        self.max_bytes = max_bytes
+        self.strip_frames = strip_frames
+        self.strip_columns = strip_columns
+        self.thumb_width = thumb_width
+        # Optionally keep every buffered frame, full size, in a daily frame pack
+        self.pack_frames = pack_frames
+        self.pack = None
+        self.last_packed = 0
+
+        self.frames = deque(maxlen=max(1, int(seconds * fps)))
+        self.total_bytes = 0
+        self.last_added = 0
+        self.lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        self.pending = queue.Queue(maxsize=8)
+        self.written = 0
+        self.dropped = 0
+        self.thread = threading.Thread(target=self._writer_loop, name="evidence-writer", daemon=True)
+        self.thread.start()
+
+    def add_jpeg(self, jpeg_bytes, timestamp=None):
+        """Offer an encoded frame; kept only if the sampling interval has passed."""
+        timestamp = time.time() if timestamp is None else timestamp
+        if timestamp - self.last_added < self.interval:
+            return
+        self.last_added = timestamp
+        with self.lock:
+            if len(self.frames) == self.frames.maxlen:
+                self.total_bytes -= len(self.frames[0][1])
+            self.frames.append((timestamp, jpeg_bytes))
+            self.total_bytes += len(jpeg_bytes)
+            while self.total_bytes > self.max_bytes and len(self.frames) > 1:
+                self.total_bytes -= len(self.frames.popleft()[1])
+
+    def capture(self, name):
+        """Queue an evidence strip of the buffered frames. Returns its filename or None."""
+        with self.lock:
+            frames = list(self.frames)
+        if not frames:
+            return None
+        filename = f"{name}.jpg"
+        try:
+            self.pending.put_nowait((filename, frames))
+        except queue.Full:
+            self.dropped += 1
+            return None
+        return filename
+
+    def _writer_loop(self):
+        while True:
+            filename, frames = self.pending.get()
+            try:
+                self._write_strip(os.path.join(self.directory, filename), frames)
+                self.written += 1
+                if self.pack_frames:
+                    self._append_to_pack(frames)
+            except Exception as e:
+                print(f"✗ Failed to write evidence {filename}: {e}", flush=True)
+
+    def _append_to_pack(self, frames):
+        """Append frames not already packed by an earlier, overlapping alert."""
+        name = os.path.join(self.directory, f"evidence_{time.strftime('%Y%m%d')}.pack")
+        if self.pack is None or self.pack.path != name:
+            if self.pack is not None:
+                self.pack.close()
+            self.pack = FramePackWriter(name)
+        for timestamp, jpeg_bytes in frames:
+            if timestamp <= self.last_packed:
+                continue
+            try:
+                self.pack.append(jpeg_bytes, timestamp)
+            except PackFullError:
+                return
+            self.last_packed = timestamp
+
+    def _write_strip(self, path, frames):
+        """Decode an even sample of the frames and tile them into one JPEG."""
+        import cv2
+        step = max(1, len(frames) / self.strip_frames)
+        picked = [frames[int(i * step)] for i in range(min(self.strip_frames, len(frames)))]
+
+        thumbs = []
+        height = None
+        for timestamp, jpeg_bytes in picked:
+            image = cv2.imdecode(np.frombuffer(jpeg_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if image is None:
+                continue
+            if height is None:
+                height = int(image.shape[0] * self.thumb_width / image.shape[1])
+            thumb = cv2.resize(image, (self.thumb_width, height), interpolation=cv2.INTER_AREA)
+            label = time.strftime('%H:%M:%S', time.localtime(timestamp))
+            cv2.putText(thumb, label, (8, 24), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+            thumbs.append(thumb)
+        if not thumbs:
+            return
+
+        # Pad the last row with black tiles so every row has the same width
+        columns = min(self.strip_columns, len(thumbs))
+        blank = np.zeros_like(thumbs[0])
+        while len(thumbs) % columns:
+            thumbs.append(blank)
+        rows = [cv2.hconcat(thumbs[i:i + columns]) for i in range(0, len(thumbs), columns)]
+        cv2.imwrite(path, cv2.vconcat(rows), [cv2.IMWRITE_JPEG_QUALITY, 80])
+
+    def stats(self):
+        return {
+            "buffered_frames": len(self.frames),
+            "buffered_bytes": self.total_bytes,
+            "pending": self.pending.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+        }
@@ -0,0 +1,235 @@
+"""
+Dataset export: turn full-resolution snapshots into upload-ready training images.
+Resizes or letterboxes every snapshot to one or more target sizes (optionally
+cropping to the shelf ROI first), re-encodes at a chosen JPEG quality in a
+process pool, and packs the results with a manifest into a single tar archive.
+
+Usage:
+    python export_dataset.py training_snapshots
+    python export_dataset.py training_snapshots --size 1280x720 --size 640x640 --mode letterbox
+    python export_dataset.py training_snapshots --from-manifest dedup_manifest.json --crop-roi
+"""
+
+import io
+import os
+import json
+import time
+import tarfile
+import argparse
+from datetime import datetime
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+from dotenv import load_dotenv
+
+load_dotenv("config.env")
+
+OUTPUT_PATH = "dataset_export.tar"
+DEFAULT_SIZE = "1280x720"  # Matches the inference stream (see TRAINING_DATA_CAPTURE.md)
+DEFAULT_QUALITY = 85
+LETTERBOX_COLOR = (114, 114, 114)
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+# Shelf region as fractions of the frame: "x,y,width,height", e.g. "0.1,0.2,0.8,0.6"
+SHELF_ROI = os.environ.get("SHELF_ROI", "")
+
+
+def parse_size(value):
+    """Parse 'WIDTHxHEIGHT' into (width, height)."""
+    try:
+        width, height = (int(v) for v in value.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid size '{value}', expected WIDTHxHEIGHT")
+    if width <= 0 or height <= 0:
+        raise argparse.ArgumentTypeError(f"Size '{value}' must be positive")
+    return width, height
+
+
+def parse_quality(value):
+    """Parse a JPEG quality, 1-100."""
+    try:
+        quality = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid quality '{value}', expected a number")
+    if not 1 <= quality <= 100:
+        raise argparse.ArgumentTypeError(f"Quality {quality} must be between 1 and 100")
+    return quality
+
+
+def parse_roi(value):
+    """Parse 'x,y,width,height' fractions into a tuple, checking it lies inside the frame."""
+    try:
+        x, y, w, h = (float(v) for v in value.split(","))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid ROI '{value}', expected x,y,width,height")
+    if not (0 <= x < 1 and 0 <= y < 1 and 0 < w <= 1 - x + 1e-9 and 0 < h <= 1 - y + 1e-9):
+        raise argparse.ArgumentTypeError(f"ROI '{value}' must be fractions inside the frame")
+    return x, y, w, h
+
+
+def crop_roi(image, roi):
+    """Crop to a fractional ROI. Returns (crop, (x, y) pixel offset)."""
+    height, width = image.shape[:2]
+    x0, y0 = round(roi[0] * width), round(roi[1] * height)
+    x1, y1 = round((roi[0] + roi[2]) * width), round((roi[1] + roi[3]) * height)
+    return image[y0:y1, x0:x1], (x0, y0)
+
+
+def letterbox(image, size):
+    """Scale to fit inside size keeping the aspect ratio and pad the rest.
+
+    Returns (image, scale, (pad_x, pad_y)) so labels can be mapped back.
+    """
+    width, height = size
+    scale = min(width / image.shape[1], height / image.shape[0])
+    resized_w, resized_h = round(image.shape[1] * scale), round(image.shape[0] * scale)
+    interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+    resized = cv2.resize(image, (resized_w, resized_h), interpolation=interpolation)
+    pad_x, pad_y = (width - resized_w) // 2, (height - resized_h) // 2
+    boxed = cv2.copyMakeBorder(resized, pad_y, height - resized_h - pad_y, pad_x, width - resized_w - pad_x,
+                               cv2.BORDER_CONSTANT, value=LETTERBOX_COLOR)
+    return boxed, scale, (pad_x, pad_y)
+
+
+def export_image(job):
+    """Worker: return (source, [(arcname, JPEG bytes, metadata)], error)."""
+    path, name, sizes, mode, roi, quality = job
+    image = cv2.imread(path, cv2.IMREAD_COLOR)
+    if image is None:
+        return path, [], "unreadable"
+
+    original = (image.shape[1], image.shape[0])
+    offset = (0, 0)
+    if roi is not None:
+        image, offset = crop_roi(image, roi)
+
+    outputs = []
+    for size in sizes:
+        if mode == "letterbox":
+            result, scale, pad = letterbox(image, size)
+        else:
+            interpolation = cv2.INTER_AREA if size[0] < image.shape[1] else cv2.INTER_LINEAR
+            result, scale, pad = cv2.resize(image, size, interpolation=interpolation), None, (0, 0)
+        ok, buffer = cv2.imencode(".jpg", result, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if not ok:
+            return path, [], "encode failed"
+        outputs.append((f"{size[0]}x{size[1]}/{name}", buffer.tobytes(), {
+            "size": list(size),
+            "scale": round(scale, 6) if scale is not None else None,
+            "pad": list(pad),
+        }))
+    return path, outputs, {"original": list(original), "roi_offset": list(offset)}
+
+
+def find_snapshots(directories):
+    paths = []
+    for directory in directories:
+        for root, _, files in os.walk(directory):
+            paths.extend(os.path.join(root, f) for f in files if f.lower().endswith(IMAGE_EXTENSIONS))
+    return sorted(paths)
+
+
+def archive_names(paths):
+    """Unique '<name>.jpg' per source: clashing names (same file name in two
+    folders, or snapshot.png next to snapshot.jpg) get their folder as a
+    prefix, then a counter."""
+    stems = [os.path.splitext(os.path.basename(path))[0] for path in paths]
+    clashing = {stem for stem, n in Counter(stems).items() if n > 1}
+    names, taken = [], set()
+    for path, stem in zip(paths, stems):
+        if stem in clashing:
+            folder = os.path.basename(os.path.dirname(os.path.abspath(path)))
+            stem = f"{folder}_{stem}"
+        name, n = stem, 1
+        while name in taken:
+            name, n = f"{stem}_{n}", n + 1
+        taken.add(name)
+        names.append(name + ".jpg")
+    return names
+
+
+def add_bytes(archive, arcname, data, mtime):
+    info = tarfile.TarInfo(arcname)
+    info.size = len(data)
+    info.mtime = mtime
+    archive.addfile(info, io.BytesIO(data))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export snapshots as an upload-ready training archive")
+    parser.add_argument("directories", nargs="*", help="Snapshot folders to export")
+    parser.add_argument("--from-manifest", help="Export only the 'kept' list of a dedupe_snapshots.py manifest")
+    parser.add_argument("--size", type=parse_size, action="append",
+                        help=f"Target size WIDTHxHEIGHT, repeatable (default {DEFAULT_SIZE})")
+    parser.add_argument("--mode", choices=["resize", "letterbox"], default="resize",
+                        help="Stretch to the target size, or keep the aspect ratio and pad")
+    parser.add_argument("--crop-roi", action="store_true", help="Crop to the shelf ROI before resizing")
+    parser.add_argument("--roi", type=parse_roi, help="Shelf ROI x,y,width,height as fractions (default: SHELF_ROI)")
+    parser.add_argument("--quality", type=parse_quality, default=DEFAULT_QUALITY, help="JPEG quality (1-100)")
+    parser.add_argument("--output", default=OUTPUT_PATH, help="Output tar archive")
+    parser.add_argument("--workers", type=int, default=None, help="Encoding processes (default: all cores)")
+    args = parser.parse_args()
+
+    sizes = args.size or [parse_size(DEFAULT_SIZE)]
+    roi = None
+    if args.crop_roi:
+        if args.roi is None and not SHELF_ROI:
+            parser.error("--crop-roi needs --roi or SHELF_ROI in config.env")
+        roi = args.roi or parse_roi(SHELF_ROI)
+
+    if args.from_manifest:
+        with open(args.from_manifest) as f:
+            paths = json.load(f)["kept"]
+    elif args.directories:
+        paths = find_snapshots(args.directories)
+    else:
+        parser.error("give snapshot folders or --from-manifest")
+    print(f"Exporting {len(paths)} snapshots to {', '.join(f'{w}x{h}' for w, h in sizes)} ({args.mode})")
+
+    manifest = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "mode": args.mode,
+        "sizes": [list(s) for s in sizes],
+        "roi": list(roi) if roi else None,
+        "quality": args.quality,
+        "images": [],
+        "failed": [],
+    }
+    jobs = [(path, name, sizes, args.mode, roi, args.quality) for path, name in zip(paths, archive_names(paths))]
+
+    started = time.time()
+    now = int(started)
+    tmp_path = args.output + ".tmp"
+    # Workers decode, resize and encode; only this process touches the archive
+    with tarfile.open(tmp_path, "w") as archive, ProcessPoolExecutor(max_workers=args.workers) as pool:
+        for done, (path, outputs, info) in enumerate(pool.map(export_image, jobs, chunksize=8), 1):
+            if not outputs:
+                print(f"⚠ Skipped {path}: {info}")
+                manifest["failed"].append(path)
+                continue
+            for arcname, data, meta in outputs:
+                add_bytes(archive, arcname, data, now)
+            manifest["images"].append({
+                "source": path,
+                "files": {arcname: meta for arcname, _, meta in outputs},
+                **info,
+            })
+            if done % 100 == 0:
+                print(f"  {done}/{len(jobs)} ({done / (time.time() - started):.1f} images/sec)", flush=True)
+
+        elapsed = time.time() - started
+        manifest["seconds"] = round(elapsed, 2)
+        manifest["images_per_sec"] = round(len(manifest["images"]) / elapsed, 1) if elapsed else None
+        add_bytes(archive, "manifest.json", json.dumps(manifest, indent=2).encode(), now)
+    os.replace(tmp_path, args.output)
+
+    print(f"✓ Exported {len(manifest['images'])} images in {elapsed:.1f}s "
+          f"({manifest['images_per_sec']} images/sec)")
+    if manifest["failed"]:
+        print(f"⚠ {len(manifest['failed'])} snapshots could not be read")
+    print(f"  Archive: {args.output} ({os.path.getsize(args.output) / 1e6:.1f} MB)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,331 @@
+"""
+Append-only packed frame archive.
+Stores many JPEG frames in one file: a fixed header, an index of (offset,
+size, timestamp) entries and the encoded frames themselves. Readers
+memory-map the pack and hand cv2.imdecode zero-copy slices, so replay and
+training tools get random access without opening thousands of small files.
+
+Layout:
+    header  magic, version, capacity, count          (64 bytes)
+    index   capacity x (offset, size, flags, timestamp)
+    data    JPEG frames, appended in capture order
+
+Usage:
+    python frame_pack.py pack training_snapshots snapshots.pack
+    python frame_pack.py info snapshots.pack
+    python frame_pack.py unpack snapshots.pack exported_frames/
+    python frame_pack.py bench snapshots.pack --compare training_snapshots
+"""
+
+import os
+import sys
+import mmap
+import time
+import random
+import argparse
+import threading
+from datetime import datetime
+
+import numpy as np
+
+PACK_MAGIC = b"MILKPACK"
+PACK_VERSION = 1
+DEFAULT_CAPACITY = 16384  # Frames per pack (~384 KB of index)
+HEADER_SIZE = 64
+HEADER_DTYPE = np.dtype([("magic", "S8"), ("version", "<u4"), ("capacity", "<u4"), ("count", "<u8")])
+INDEX_DTYPE = np.dtype([("offset", "<u8"), ("size", "<u4"), ("flags", "<u4"), ("timestamp", "<f8")])
+IMAGE_EXTENSIONS = (".jpg", ".jpeg")
+
+
+def _data_start(capacity):
+    # Page-align the data region so frames never share a page with the index
+    end = HEADER_SIZE + capacity * INDEX_DTYPE.itemsize
+    return (end + mmap.PAGESIZE - 1) // mmap.PAGESIZE * mmap.PAGESIZE
+
+
+class PackFullError(Exception):
+    """Raised when a pack's index has no free entries."""
+
+
+class PackOrderError(Exception):
+    """Raised when a frame is older than the pack's last frame (lookups need capture order)."""
+
+
+class FramePackWriter:
+    """Appends encoded frames to a pack. One writer per pack; safe across threads."""
+
+    def __init__(self, path, capacity=DEFAULT_CAPACITY):
+        self.path = path
+        self.lock = threading.Lock()
+        if os.path.exists(path) and os.path.getsize(path) >= HEADER_SIZE:
+            self.file = open(path, "r+b")
+            header = np.frombuffer(self.file.read(HEADER_DTYPE.itemsize), dtype=HEADER_DTYPE)[0]
+            if header["magic"] != PACK_MAGIC:
+                raise ValueError(f"{path} is not a frame pack")
+            self.capacity = int(header["capacity"])
+            self.count = int(header["count"])
+            self.end = _data_start(self.capacity)
+            self.last_timestamp = None
+            if self.count:
+                self.file.seek(HEADER_SIZE + (self.count - 1) * INDEX_DTYPE.itemsize)
+                last = np.frombuffer(self.file.read(INDEX_DTYPE.itemsize), dtype=INDEX_DTYPE)[0]
+                self.end = int(last["offset"]) + int(last["size"])
+                self.last_timestamp = float(last["timestamp"])
+            # Drop any frame bytes written after the last committed entry (crash mid-append)
+            self.file.truncate(self.end)
+        else:
+            self.file = open(path, "w+b")
+            self.capacity = capacity
+            self.count = 0
+            self.end = _data_start(capacity)
+            self.last_timestamp = None
+            header = np.zeros(1, dtype=HEADER_DTYPE)
+            header[0] = (PACK_MAGIC, PACK_VERSION, capacity, 0)
+            self.file.write(header.tobytes())
+            # Sparse until written: the index costs no disk space up front
+            self.file.truncate(self.end)
+
+    @property
+    def full(self):
+        return self.count >= self.capacity
+
+    @property
+    def free(self):
+        return self.capacity - self.count
+
+    def append(self, jpeg_bytes, timestamp=None, flags=0):
+        """Append one encoded frame and commit it. Returns its index."""
+        with self.lock:
+            if self.full:
+                raise PackFullError(f"{self.path} holds {self.capacity} frames")
+            timestamp = time.time() if timestamp is None else timestamp
+            if self.last_timestamp is not None and timestamp < self.last_timestamp:
+                raise PackOrderError(f"{self.path}: frame at {timestamp} is older than the last frame "
+                                     f"({self.last_timestamp})")
+            index = self.count
+            entry = np.zeros(1, dtype=INDEX_DTYPE)
+            entry[0] = (self.end, len(jpeg_bytes), flags, timestamp)
+
+            # Frame first, then its index entry, then the count: readers only
+            # ever see fully written frames
+            self.file.seek(self.end)
+            self.file.write(jpeg_bytes)
+            self.file.seek(HEADER_SIZE + index * INDEX_DTYPE.itemsize)
+            self.file.write(entry.tobytes())
+            self.file.flush()
+            self.file.seek(HEADER_DTYPE.fields["count"][1])
+            self.file.write(np.uint64(index + 1).tobytes())
+            self.file.flush()
+
+            self.end += len(jpeg_bytes)
+            self.count = index + 1
+            self.last_timestamp = timestamp
+            return index
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FramePackReader:
+    """Random access to a pack through a read-only memory map."""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        self.map = None
+        self.refresh()
+
+    def refresh(self):
+        """Re-map the file to pick up frames appended since opening. Returns the frame count."""
+        self._remap()
+        count = int(self.header[0]["count"])
+        if count and self._frame_end(count - 1) > len(self.map):
+            # Frames committed after we sized the mapping: map again, then only
+            # trust the frames that lie inside it
+            self._remap()
+            while count and self._frame_end(count - 1) > len(self.map):
+                count -= 1
+        self.count = count
+        return self.count
+
+    def _frame_end(self, i):
+        entry = self.index[i]
+        return int(entry["offset"]) + int(entry["size"])
+
+    def _remap(self):
+        size = os.fstat(self.file.fileno()).st_size
+        if self.map is not None and size <= len(self.map):
+            return
+        old = self.map
+        self.map = mmap.mmap(self.file.fileno(), size, access=mmap.ACCESS_READ)
+        header = np.frombuffer(self.map, dtype=HEADER_DTYPE, count=1)[0]
+        if header["magic"] != PACK_MAGIC:
+            raise ValueError(f"{self.path} is not a frame pack")
+        self.capacity = int(header["capacity"])
+        self.header = np.frombuffer(self.map, dtype=HEADER_DTYPE, count=1)
+        self.index = np.frombuffer(self.map, dtype=INDEX_DTYPE, count=self.capacity, offset=HEADER_SIZE)
+        if old is not None:
+            try:
+                old.close()
+            except BufferError:
+                pass  # Views handed out earlier still use it; freed when they are
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        """Zero-copy uint8 view of frame i's JPEG bytes."""
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError(i)
+        entry = self.index[i]
+        return np.frombuffer(self.map, dtype=np.uint8, count=int(entry["size"]), offset=int(entry["offset"]))
+
+    @property
+    def timestamps(self):
+        return self.index["timestamp"][:self.count]
+
+    def decode(self, i, flags=None):
+        """Decode frame i straight from the mapped pack."""
+        import cv2
+        return cv2.imdecode(self[i], cv2.IMREAD_COLOR if flags is None else flags)
+
+    def find(self, timestamp):
+        """Index of the first frame at or after timestamp (frames are in capture order)."""
+        return int(np.searchsorted(self.timestamps, timestamp))
+
+    def between(self, start, end):
+        """Range of frame indices captured in [start, end)."""
+        return range(self.find(start), self.find(end))
+
+    def close(self):
+        self.index = self.header = None
+        try:
+            self.map.close()
+        except BufferError:
+            pass
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def snapshot_timestamp(path):
+    """Capture time from a snapshot_YYYYMMDD_HHMMSS_mmm.jpg name, else the file mtime."""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    try:
+        return datetime.strptime(stem.split("_", 1)[1], "%Y%m%d_%H%M%S_%f").timestamp()
+    except (IndexError, ValueError):
+        return os.path.getmtime(path)
+
+
+def pack_directory(directory, pack_path, capacity=DEFAULT_CAPACITY):
+    """Append every JPEG in a directory to a pack, oldest first. Returns (frames in the pack, skipped).
+
+    Frames not newer than the pack's last frame are skipped, since lookups
+    rely on capture order (this also makes re-packing a directory a no-op).
+    Raises PackFullError, before writing anything, if the rest do not fit.
+    """
+    paths = [os.path.join(directory, f) for f in os.listdir(directory) if f.lower().endswith(IMAGE_EXTENSIONS)]
+    frames = sorted((snapshot_timestamp(p), p) for p in paths)
+    with FramePackWriter(pack_path, capacity=max(capacity, len(frames))) as writer:
+        if writer.last_timestamp is not None:
+            frames = [(timestamp, path) for timestamp, path in frames if timestamp > writer.last_timestamp]
+        skipped = len(paths) - len(frames)
+        if len(frames) > writer.free:
+            raise PackFullError(f"{pack_path} has room for {writer.free} more frames of its {writer.capacity}, "
+                                f"but {directory} has {len(frames)} new ones; pack them into a new file")
+        for timestamp, path in frames:
+            with open(path, "rb") as f:
+                writer.append(f.read(), timestamp)
+        return writer.count, skipped
+
+
+def unpack(pack_path, directory):
+    """Write every frame of a pack back out as snapshot_<time>.jpg files."""
+    os.makedirs(directory, exist_ok=True)
+    with FramePackReader(pack_path) as reader:
+        for i, timestamp in enumerate(reader.timestamps):
+            name = datetime.fromtimestamp(timestamp).strftime('%Y%m%d_%H%M%S_%f')[:-3]
+            with open(os.path.join(directory, f"snapshot_{name}.jpg"), "wb") as f:
+                f.write(reader[i])
+        return len(reader)
+
+
+def benchmark(pack_path, compare_dir=None, samples=200):
+    """Time random-access decodes from the pack (and from loose files, if given)."""
+    import cv2
+
+    with FramePackReader(pack_path) as reader:
+        picks = [random.randrange(len(reader)) for _ in range(samples)]
+        started = time.perf_counter()
+        for i in picks:
+            reader.decode(i)
+        pack_rate = samples / (time.perf_counter() - started)
+    print(f"✓ Pack:  {pack_rate:.1f} random decodes/sec")
+
+    if compare_dir:
+        files = sorted(os.path.join(compare_dir, f) for f in os.listdir(compare_dir)
+                       if f.lower().endswith(IMAGE_EXTENSIONS))
+        started = time.perf_counter()
+        for _ in range(samples):
+            cv2.imread(random.choice(files), cv2.IMREAD_COLOR)
+        files_rate = samples / (time.perf_counter() - started)
+        print(f"✓ Files: {files_rate:.1f} random decodes/sec")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create, inspect and read packed frame archives")
+    commands = parser.add_subparsers(dest="command", required=True)
+    pack_cmd = commands.add_parser("pack", help="Append a directory of JPEGs to a pack")
+    pack_cmd.add_argument("directory")
+    pack_cmd.add_argument("pack")
+    pack_cmd.add_argument("--capacity", type=int, default=DEFAULT_CAPACITY)
+    info_cmd = commands.add_parser("info", help="Show frame count and time range")
+    info_cmd.add_argument("pack")
+    unpack_cmd = commands.add_parser("unpack", help="Write frames back out as JPEG files")
+    unpack_cmd.add_argument("pack")
+    unpack_cmd.add_argument("directory")
+    bench_cmd = commands.add_parser("bench", help="Measure random-access decode speed")
+    bench_cmd.add_argument("pack")
+    bench_cmd.add_argument("--compare", help="Directory of loose JPEGs to compare against")
+    bench_cmd.add_argument("--samples", type=int, default=200)
+    args = parser.parse_args()
+
+    if args.command == "pack":
+        started = time.time()
+        try:
+            count, skipped = pack_directory(args.directory, args.pack, args.capacity)
+        except PackFullError as e:
+            print(f"✗ ERROR: {e}")
+            return 1
+        if skipped:
+            print(f"⚠ Skipped {skipped} frames not newer than the last frame already in {args.pack}")
+        print(f"✓ {args.pack} now holds {count} frames ({time.time() - started:.1f}s)")
+    elif args.command == "info":
+        with FramePackReader(args.pack) as reader:
+            print(f"{args.pack}: {len(reader)} of {reader.capacity} frames, "
+                  f"{os.path.getsize(args.pack) / 1e6:.1f} MB")
+            if len(reader):
+                first, last = reader.timestamps[0], reader.timestamps[-1]
+                print(f"  {datetime.fromtimestamp(first)} -> {datetime.fromtimestamp(last)}")
+    elif args.command == "unpack":
+        print(f"✓ Wrote {unpack(args.pack, args.directory)} frames to {args.directory}")
+    elif args.command == "bench":
+        benchmark(args.pack, args.compare, args.samples)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
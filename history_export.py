@@ -0,0 +1,320 @@
+"""
+Columnar export of the count and alert history for analysis.
+Loading milk_bottle_counts.csv into pandas parses every row on every run,
+and the two apps write different layouts: app.py one row per flavor
+(timestamp, flavor, count), app_with_pi_camera.py one row per sample
+(timestamp, whole, 1pct, 2pct). This tool converts either layout into daily
+segments of NumPy arrays, one .npy file per column:
+
+    history_npy/milk_bottle_counts/
+        manifest.json            segments, their time ranges and the export watermark
+        2026-10-18/timestamp.npy int64 seconds since the epoch
+        2026-10-18/whole.npy     uint8 counts, one file per flavor
+        alerts/timestamp.npy     int64, one row per alert
+        alerts/missing.npy       uint8 bitmask of missing flavors (bit i = FLAVORS[i])
+
+Each run only reads rows past the watermark (the last exported timestamp and
+how many rows of that second were exported; via csv_log, so archived days are
+not reopened) and rewrites just the segments those rows fall in.
+load_counts() memory-maps the segments that overlap a range and slices them
+with a binary search, so nothing is parsed when loading.
+
+Usage:
+    python history_export.py export                                  # milk_bottle_counts.csv
+    python history_export.py export --counts milk_bottle_counts_fridge1.csv
+    python history_export.py info
+    python history_export.py rebuild                                 # drop and re-export everything
+
+    from history_export import load_counts
+    data = load_counts("milk_bottle_counts.csv", "2026-09-01", "2026-10-01")
+    data["timestamp"], data["whole"]                                 # NumPy arrays
+"""
+
+import os
+import sys
+import csv
+import json
+import time
+import shutil
+import argparse
+from datetime import datetime
+
+import numpy as np
+
+from csv_log import read_rows
+
+EXPORT_ROOT = "history_npy"
+MANIFEST_NAME = "manifest.json"
+EXPORT_FORMAT = 1
+FLAVORS = ["whole", "1pct", "2pct"]
+CATEGORY_NAMES = {"whole": "Whole Milk", "1pct": "1% Milk", "2pct": "2% Milk"}
+
+
+def export_dir(counts_path, export_root=EXPORT_ROOT):
+    return os.path.join(export_root, os.path.splitext(os.path.basename(counts_path))[0])
+
+
+def alerts_path_for(counts_path):
+    """milk_bottle_counts_fridge1.csv -> milk_bottle_alerts_fridge1.csv"""
+    return counts_path.replace("milk_bottle_counts", "milk_bottle_alerts")
+
+
+def to_epoch(timestamp):
+    return int(datetime.fromisoformat(timestamp).timestamp())
+
+
+def as_epoch(value):
+    """None, a datetime, epoch seconds or a (possibly date-only) timestamp string -> epoch seconds."""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    if isinstance(value, datetime):
+        return int(value.timestamp())
+    return to_epoch(value)
+
+
+def load_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME)) as f:
+            manifest = json.load(f)
+        if manifest.get("format") == EXPORT_FORMAT:
+            return manifest
+    except FileNotFoundError:
+        pass
+    return {"format": EXPORT_FORMAT, "flavors": FLAVORS, "segments": [], "last_exported": None,
+            "last_exported_rows": 0, "alerts_last_exported": None, "alerts_last_exported_rows": 0, "alerts_rows": 0}
+
+
+def save_manifest(directory, manifest):
+    path = os.path.join(directory, MANIFEST_NAME)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(path + ".tmp", path)
+
+
+def save_column(directory, name, values):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, name + ".npy")
+    with open(path + ".tmp", "wb") as f:
+        np.save(f, values)
+    os.replace(path + ".tmp", path)
+
+
+def load_segment(directory, columns, rows=None, mmap_mode=None):
+    """{column: array} for a segment, cut to the row count the manifest vouches for."""
+    return {name: np.load(os.path.join(directory, name + ".npy"), mmap_mode=mmap_mode)[:rows] for name in columns}
+
+
+def after_watermark(rows, watermark, exported_rows):
+    """Rows newer than the watermark, plus those in its second beyond the first exported_rows.
+
+    Timestamps have one-second resolution, so rows logged later in the
+    watermark's second are only told apart by their position. exported_rows
+    None (manifests written before it was recorded) skips the whole second.
+    """
+    for row in rows:
+        if watermark is not None and row["timestamp"] <= watermark:
+            if row["timestamp"] < watermark or exported_rows is None:
+                continue
+            if exported_rows > 0:
+                exported_rows -= 1
+                continue
+        yield row
+
+
+def wide_samples(rows, fieldnames):
+    """Yield (timestamp, [count per flavor], CSV rows used) from either CSV layout."""
+    if "flavor" not in fieldnames:
+        for row in rows:
+            yield row["timestamp"], [int(row.get(flavor) or 0) for flavor in FLAVORS], 1
+        return
+
+    # Long layout: one row per flavor, grouped by timestamp; a repeated flavor
+    # starts the next sample logged in the same second
+    current, counts, seen, used = None, None, set(), 0
+    for row in rows:
+        if row["timestamp"] != current or row["flavor"] in seen:
+            if current is not None:
+                yield current, counts, used
+            current, counts, seen, used = row["timestamp"], [0] * len(FLAVORS), set(), 0
+        if row["flavor"] in FLAVORS:
+            counts[FLAVORS.index(row["flavor"])] = int(row["count"] or 0)
+            seen.add(row["flavor"])
+        used += 1
+    # The newest group may still be being written; leave it for the next export
+    if current is not None and len(seen) == len(FLAVORS):
+        yield current, counts, used
+
+
+def export_counts(counts_path, export_root=EXPORT_ROOT):
+    """Append count rows newer than the watermark. Returns the number of samples exported."""
+    directory = export_dir(counts_path, export_root)
+    manifest = load_manifest(directory)
+    watermark = manifest["last_exported"]
+
+    rows = after_watermark(read_rows(counts_path, start=watermark), watermark, manifest.get("last_exported_rows"))
+    first_row = next(rows, None)
+    if first_row is None:
+        return 0
+
+    def chained():
+        yield first_row
+        yield from rows
+
+    # Rows arrive in time order, so each day is written once it is complete
+    segments = {segment["day"]: segment for segment in manifest["segments"]}
+    exported, day, samples = 0, None, []
+    for timestamp, counts, used in wide_samples(chained(), list(first_row)):
+        if timestamp[:10] != day:
+            exported += write_day(directory, segments, day, samples)
+            day, samples = timestamp[:10], []
+        samples.append((to_epoch(timestamp), counts))
+        advance_watermark(manifest, "last_exported", timestamp, used)
+    exported += write_day(directory, segments, day, samples)
+
+    manifest["segments"] = sorted(segments.values(), key=lambda segment: segment["day"])
+    save_manifest(directory, manifest)
+    return exported
+
+
+def advance_watermark(manifest, key, timestamp, rows):
+    """Move a watermark to timestamp, counting the CSV rows exported within that second."""
+    if manifest[key] == timestamp:
+        manifest[key + "_rows"] = (manifest.get(key + "_rows") or 0) + rows
+    else:
+        manifest[key], manifest[key + "_rows"] = timestamp, rows
+
+
+def write_day(directory, segments, day, samples):
+    """Merge new (epoch, counts) samples into a day's segment. Returns how many were written."""
+    if not samples:
+        return 0
+    timestamps = np.fromiter((epoch for epoch, _ in samples), dtype=np.int64, count=len(samples))
+    counts = np.clip(np.array([counts for _, counts in samples], dtype=np.int64), 0, 255).astype(np.uint8)
+    columns = {"timestamp": timestamps, **{flavor: counts[:, i] for i, flavor in enumerate(FLAVORS)}}
+
+    segment_dir = os.path.join(directory, day)
+    if day in segments:
+        existing = load_segment(segment_dir, columns, segments[day]["rows"])
+        columns = {name: np.concatenate([existing[name], values]) for name, values in columns.items()}
+    order = np.argsort(columns["timestamp"], kind="stable")
+    for name, values in columns.items():
+        save_column(segment_dir, name, values[order])
+
+    segments[day] = {"day": day, "first": int(columns["timestamp"][order[0]]),
+                     "last": int(columns["timestamp"][order[-1]]), "rows": len(order)}
+    return len(samples)
+
+
+def missing_mask(missing_categories):
+    """'Whole Milk, 2% Milk' -> bitmask over FLAVORS."""
+    names = {name.strip() for name in missing_categories.split(",")}
+    return sum(1 << i for i, flavor in enumerate(FLAVORS) if CATEGORY_NAMES[flavor] in names or flavor in names)
+
+
+def export_alerts(counts_path, alerts_path=None, export_root=EXPORT_ROOT):
+    """Append alerts newer than the watermark. Returns the number of alerts exported."""
+    alerts_path = alerts_path or alerts_path_for(counts_path)
+    directory = export_dir(counts_path, export_root)
+    manifest = load_manifest(directory)
+    watermark = manifest["alerts_last_exported"]
+
+    timestamps, masks = [], []
+    try:
+        with open(alerts_path, newline='') as f:
+            for row in after_watermark(csv.DictReader(f), watermark, manifest.get("alerts_last_exported_rows")):
+                timestamps.append(to_epoch(row["timestamp"]))
+                masks.append(missing_mask(row["missing_categories"]))
+                advance_watermark(manifest, "alerts_last_exported", row["timestamp"], 1)
+    except FileNotFoundError:
+        return 0
+    if not timestamps:
+        return 0
+
+    columns = {"timestamp": np.array(timestamps, dtype=np.int64), "missing": np.array(masks, dtype=np.uint8)}
+    alerts_dir = os.path.join(directory, "alerts")
+    if manifest["alerts_rows"]:
+        existing = load_segment(alerts_dir, columns, manifest["alerts_rows"])
+        columns = {name: np.concatenate([existing[name], values]) for name, values in columns.items()}
+    for name, values in columns.items():
+        save_column(alerts_dir, name, values)
+    manifest["alerts_rows"] = len(columns["timestamp"])
+    save_manifest(directory, manifest)
+    return len(timestamps)
+
+
+def slice_range(columns, start, end):
+    """Rows of a time-sorted segment with start <= timestamp < end, as views."""
+    timestamps = columns["timestamp"]
+    lo = 0 if start is None else int(np.searchsorted(timestamps, start, side="left"))
+    hi = len(timestamps) if end is None else int(np.searchsorted(timestamps, end, side="left"))
+    return {name: values[lo:hi] for name, values in columns.items()}
+
+
+def load_counts(counts_path, start=None, end=None, export_root=EXPORT_ROOT):
+    """Map the exported counts with start <= timestamp < end.
+
+    start and end may be datetimes, epoch seconds or timestamp strings such
+    as '2026-09-01'. Returns {"timestamp": int64, flavor: uint8, ...}. A range
+    within one day returns read-only views of the memory-mapped files;
+    longer ranges are concatenated.
+    """
+    start, end = as_epoch(start), as_epoch(end)
+    directory = export_dir(counts_path, export_root)
+    manifest = load_manifest(directory)
+    columns = ["timestamp"] + manifest["flavors"]
+    parts = [slice_range(load_segment(os.path.join(directory, segment["day"]), columns, segment["rows"], "r"),
+                         start, end)
+             for segment in manifest["segments"]
+             if (start is None or segment["last"] >= start) and (end is None or segment["first"] < end)]
+    if not parts:
+        return {name: np.empty(0, dtype=np.int64 if name == "timestamp" else np.uint8) for name in columns}
+    if len(parts) == 1:
+        return parts[0]
+    return {name: np.concatenate([part[name] for part in parts]) for name in columns}
+
+
+def load_alerts(counts_path, start=None, end=None, export_root=EXPORT_ROOT):
+    """Map the exported alerts with start <= timestamp < end: {"timestamp": int64, "missing": uint8 bitmask}."""
+    directory = export_dir(counts_path, export_root)
+    manifest = load_manifest(directory)
+    if not manifest["alerts_rows"]:
+        return {"timestamp": np.empty(0, dtype=np.int64), "missing": np.empty(0, dtype=np.uint8)}
+    columns = load_segment(os.path.join(directory, "alerts"), ["timestamp", "missing"], manifest["alerts_rows"], "r")
+    return slice_range(columns, as_epoch(start), as_epoch(end))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export count and alert history to memory-mappable NumPy columns")
+    parser.add_argument("command", choices=["export", "info", "rebuild"])
+    parser.add_argument("--counts", default="milk_bottle_counts.csv", help="Counts log the app writes")
+    parser.add_argument("--alerts", help="Alerts CSV (default: derived from --counts)")
+    parser.add_argument("--out", default=EXPORT_ROOT, help="Export root directory")
+    args = parser.parse_args()
+    directory = export_dir(args.counts, args.out)
+
+    if args.command == "rebuild" and os.path.isdir(directory):
+        shutil.rmtree(directory)
+        print(f"✓ Removed {directory}")
+
+    if args.command in ("export", "rebuild"):
+        started = time.time()
+        samples = export_counts(args.counts, args.out)
+        alerts = export_alerts(args.counts, args.alerts, args.out)
+        print(f"✓ Exported {samples} samples and {alerts} alerts to {directory} in {time.time() - started:.1f}s")
+        return 0
+
+    manifest = load_manifest(directory)
+    if not manifest["segments"]:
+        print(f"Nothing exported to {directory} yet; run 'export'")
+        return 0
+    rows = sum(segment["rows"] for segment in manifest["segments"])
+    size = sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(directory) for name in names)
+    print(f"{directory}: {len(manifest['segments'])} days, {rows} samples, {manifest['alerts_rows']} alerts, "
+          f"{size / 1e6:.1f} MB")
+    print(f"  {manifest['segments'][0]['day']} .. {manifest['segments'][-1]['day']}, "
+          f"exported up to {manifest['last_exported']}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
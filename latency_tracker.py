@@ -0,0 +1,72 @@
+"""
+Per-stage latency distributions for the Pi -> Mac -> dashboard path.
+Each frame's trace carries wall-clock stamps from capture on the Pi through
+receive, decode, inference, overlay and emit on the Mac; the tracker keeps the
+most recent samples of each stage and summarizes them as percentiles.
+
+Stages (all in milliseconds):
+    network    captured on the Pi -> received on the Mac (needs synced clocks)
+    decode     received -> decoded
+    inference  decoded -> result in the sink (includes queueing in the pipeline)
+    overlay    result -> annotated frame published to /video_feed
+    emit       result -> handled by the persist stage, where count events and alerts are
+               broadcast (results without events: by the latency stage)
+    total      captured -> emit (glass to glass)
+"""
+
+import threading
+from collections import deque
+
+STAGES = ("network", "decode", "inference", "overlay", "emit", "total")
+SAMPLES_PER_STAGE = 600  # About a minute of results at 10 FPS
+
+# Stage name -> (start stamp, end stamp) in a frame trace
+STAGE_SPANS = {
+    "network": ("captured", "received"),
+    "decode": ("received", "decoded"),
+    "inference": ("decoded", "inferred"),
+    "overlay": ("inferred", "published"),
+    "emit": ("inferred", "emitted"),
+    "total": ("captured", "emitted"),
+}
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+class LatencyTracker:
+    """Rolling latency samples per stage, fed from frame traces."""
+
+    def __init__(self, samples=SAMPLES_PER_STAGE):
+        self.samples = {stage: deque(maxlen=samples) for stage in STAGES}
+        self.lock = threading.Lock()
+
+    def record(self, trace, *stages):
+        """Record the given stages (default: all) whose stamps are present in the trace."""
+        with self.lock:
+            for stage in stages or STAGES:
+                start, end = STAGE_SPANS[stage]
+                if start in trace and end in trace:
+                    self.samples[stage].append((trace[end] - trace[start]) * 1000)
+
+    def summary(self):
+        """{stage: {p50, p90, p99, max, last, count}} in milliseconds."""
+        with self.lock:
+            snapshot = {stage: list(values) for stage, values in self.samples.items()}
+        summary = {}
+        for stage, values in snapshot.items():
+            if not values:
+                continue
+            ordered = sorted(values)
+            summary[stage] = {
+                "p50": round(percentile(ordered, 0.50), 1),
+                "p90": round(percentile(ordered, 0.90), 1),
+                "p99": round(percentile(ordered, 0.99), 1),
+                "max": round(ordered[-1], 1),
+                "last": round(values[-1], 1),
+                "count": len(values),
+            }
+        return summary
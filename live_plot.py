@@ -0,0 +1,166 @@
+"""
+Live count plot for BottleCountWorkflow.py, rendered in its own process.
+The plot used to be rebuilt inside the inference callback: ax.clear(), three
+fresh lines over the whole hour, tight_layout() and plt.pause() on every
+sample, which stalled inference for tens of milliseconds at a time. Now the
+sink only puts (time, counts) on a bounded queue. A separate process keeps
+one line artist per flavor and updates it with set_data().
+
+    desktop   blits only the lines onto a cached background; the axes are
+              redrawn only when the time window rolls over or the counts
+              outgrow the y range
+    headless  renders with Agg and writes a PNG every few seconds, for
+              machines without a display
+
+If the plot process falls behind or its window is closed, samples are
+dropped rather than blocking the sink.
+"""
+
+import os
+import time
+import queue
+import multiprocessing
+
+FLAVORS = ["whole", "1pct", "2pct"]
+COLORS = {"whole": "blue", "1pct": "green", "2pct": "red"}
+CATEGORY_NAMES = {"whole": "Whole Milk", "1pct": "1% Milk", "2pct": "2% Milk"}
+WINDOW_SECONDS = 3600  # Past hour, as before
+ROLL_SECONDS = 300  # Room left at the right edge; the axes are redrawn when it fills up
+REDRAW_SECONDS = 0.5  # Desktop: blit new samples at most this often
+PNG_SECONDS = 10  # Headless: write the PNG this often
+QUEUE_SIZE = 1000
+
+
+class LivePlot:
+    """Feeds count samples to the plot process without ever blocking the caller."""
+
+    def __init__(self, headless=False, png_path="milk_bottle_counts.png", png_seconds=PNG_SECONDS):
+        self.queue = multiprocessing.Queue(QUEUE_SIZE)
+        self.dropped = 0
+        self.process = multiprocessing.Process(target=run_plot, args=(self.queue, headless, png_path, png_seconds),
+                                               name="live-plot", daemon=True)
+        self.process.start()
+
+    def add(self, timestamp, counts):
+        """Queue one sample (a datetime and {flavor: count})."""
+        try:
+            self.queue.put_nowait((timestamp.timestamp(), [counts.get(flavor, 0) for flavor in FLAVORS]))
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        try:
+            self.queue.put_nowait(None)
+        except queue.Full:
+            pass
+        self.process.join(2)
+
+
+def run_plot(samples, headless, png_path, png_seconds):
+    """Plot process main loop."""
+    import matplotlib
+    if headless:
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import matplotlib.dates as mdates
+    from collections import deque
+    from datetime import datetime
+
+    fig, ax = plt.subplots(figsize=(10, 6))
+    lines = {
+        flavor: ax.plot([], [], label=CATEGORY_NAMES[flavor], color=COLORS[flavor], linewidth=2,
+                        marker='o', markersize=4, animated=not headless)[0]
+        for flavor in FLAVORS
+    }
+    ax.set_xlabel('Time')
+    ax.set_ylabel('Count')
+    ax.set_title('Milk Bottle Counts (Past Hour)')
+    ax.legend(loc='upper left')
+    ax.grid(True, alpha=0.3)
+    ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M'))
+    plt.setp(ax.get_xticklabels(), rotation=45)
+    fig.tight_layout()
+
+    times = deque()
+    counts = {flavor: deque() for flavor in FLAVORS}
+    # Blitting: the figure without the lines, captured after every full draw
+    background = None
+
+    def on_draw(event):
+        nonlocal background
+        background = fig.canvas.copy_from_bbox(fig.bbox)
+        for line in lines.values():
+            ax.draw_artist(line)
+
+    if not headless:
+        fig.canvas.mpl_connect('draw_event', on_draw)
+        plt.show(block=False)
+
+    def rescale(now):
+        """Move the time window / grow the y range if needed. Returns True if the axes changed."""
+        changed = False
+        left, right = ax.get_xlim()
+        if not times or mdates.date2num(datetime.fromtimestamp(now)) > right:
+            ax.set_xlim(datetime.fromtimestamp(now - WINDOW_SECONDS + ROLL_SECONDS),
+                        datetime.fromtimestamp(now + ROLL_SECONDS))
+            changed = True
+        top = max((max(values) for values in counts.values() if values), default=0) + 1
+        if top > ax.get_ylim()[1] or ax.get_ylim()[1] > 2 * top + 2:
+            ax.set_ylim(0, top + 1)
+            changed = True
+        return changed
+
+    last_render = 0
+    dirty = False
+    while True:
+        try:
+            sample = samples.get(timeout=0.05)
+        except queue.Empty:
+            sample = ()
+        # Drain whatever else is waiting, so a backlog costs one redraw
+        while sample:
+            timestamp, values = sample
+            times.append(mdates.date2num(datetime.fromtimestamp(timestamp)))
+            for flavor, value in zip(FLAVORS, values):
+                counts[flavor].append(value)
+            dirty = True
+            try:
+                sample = samples.get_nowait()
+            except queue.Empty:
+                sample = ()
+        # None from close() also ends the drain loop; leave through plt.close() below
+        if sample is None:
+            break
+
+        now = time.time()
+        if not headless:
+            if not plt.fignum_exists(fig.number):
+                break  # Window closed; the sink keeps running and its samples are dropped
+            fig.canvas.flush_events()
+        if not dirty or now - last_render < (png_seconds if headless else REDRAW_SECONDS):
+            continue
+
+        # Drop samples older than the window
+        cutoff = mdates.date2num(datetime.fromtimestamp(now - WINDOW_SECONDS))
+        while times and times[0] < cutoff:
+            times.popleft()
+            for values in counts.values():
+                values.popleft()
+        for flavor, line in lines.items():
+            line.set_data(times, counts[flavor])
+
+        if headless:
+            rescale(now)
+            fig.savefig(png_path + ".tmp.png")
+            os.replace(png_path + ".tmp.png", png_path)
+        elif rescale(now) or background is None:
+            fig.canvas.draw()  # on_draw recaptures the background and draws the lines
+            fig.canvas.blit(fig.bbox)
+        else:
+            fig.canvas.restore_region(background)
+            for line in lines.values():
+                ax.draw_artist(line)
+            fig.canvas.blit(ax.bbox)
+        last_render, dirty = now, False
+
+    plt.close(fig)
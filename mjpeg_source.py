@@ -0,0 +1,284 @@
+"""
+MJPEG stream reader for the Pi camera server that keeps per-frame metadata.
+OpenCV's stream reader discards multipart headers, so the Pi's frame ID and
+capture timestamp never reach the sink. This reader parses the parts itself,
+decodes only the frames InferencePipeline actually keeps, and records a trace
+for each decoded image that the sink can look up again.
+
+A second low-rate connection is kept open as a hot standby. When the main
+connection stalls, the producer switches to it at once (inference continues at
+the standby rate) and reconnects at the full rate in the background, instead
+of ending the stream and waiting for a pipeline restart.
+"""
+
+import time
+import threading
+import http.client
+from urllib.parse import urlsplit, urlencode
+from collections import OrderedDict
+
+import numpy as np
+
+MAX_TRACES = 256  # Frames in flight between decode and sink are far fewer than this
+READ_CHUNK = 64 * 1024
+STALL_SECONDS = 3.0  # A read blocked this long counts as a dropped connection
+STANDBY_FPS = 1  # The standby idles at this rate, enough to prove it is alive
+# ValueError (including UnicodeDecodeError) covers malformed part headers
+STREAM_ERRORS = (OSError, http.client.HTTPException, EOFError, ValueError)
+
+# Trace dicts keyed by id() of the decoded image. The image object travels
+# unchanged from retrieve() to the sink's video_frame.image, and while it is
+# alive no other object can share its id.
+_traces = OrderedDict()
+_traces_lock = threading.Lock()
+
+
+def trace_for(image):
+    """Return the trace recorded when this image was decoded, or None."""
+    with _traces_lock:
+        return _traces.get(id(image))
+
+
+def _record_trace(image, trace):
+    with _traces_lock:
+        _traces[id(image)] = trace
+        _traces.move_to_end(id(image))
+        while len(_traces) > MAX_TRACES:
+            _traces.popitem(last=False)
+
+
+class MjpegPartReader:
+    """Iterates (headers, JPEG bytes, received time) over a multipart MJPEG response."""
+
+    def __init__(self, url, timeout=10):
+        parts = urlsplit(url)
+        connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.connection = connection_class(parts.hostname, parts.port, timeout=timeout)
+        self.connection.request('GET', parts.path + ('?' + parts.query if parts.query else ''))
+        self.response = self.connection.getresponse()
+        if self.response.status != 200:
+            self.connection.close()
+            raise ConnectionError(f"HTTP {self.response.status} from {url}")
+        content_type = self.response.getheader('Content-Type', '')
+        boundary = content_type.split('boundary=')[-1].strip('"') if 'boundary=' in content_type else 'frame'
+        self.boundary = b'--' + boundary.encode()
+        self.buffer = bytearray()
+
+    def _fill(self):
+        # read1 returns whatever has arrived instead of waiting for a full chunk
+        chunk = self.response.read1(READ_CHUNK)
+        if not chunk:
+            raise EOFError("MJPEG stream ended")
+        self.buffer += chunk
+
+    def _read_until(self, marker, start=0):
+        while True:
+            index = self.buffer.find(marker, start)
+            if index >= 0:
+                data = bytes(self.buffer[:index])
+                del self.buffer[:index + len(marker)]
+                return data
+            start = max(0, len(self.buffer) - len(marker))
+            self._fill()
+
+    def _read_exactly(self, size):
+        while len(self.buffer) < size:
+            self._fill()
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+    def next_part(self):
+        self._read_until(self.boundary)
+        header_block = self._read_until(b'\r\n\r\n')
+        headers = {}
+        for line in header_block.split(b'\r\n'):
+            name, sep, value = line.partition(b':')
+            if sep:
+                headers[name.strip().decode().lower()] = value.strip().decode()
+        if 'content-length' in headers:
+            jpeg = self._read_exactly(int(headers['content-length']))
+        else:
+            # Older servers send no length: the part ends at the next boundary
+            jpeg = self._read_until(b'\r\n' + self.boundary)
+            self.buffer[:0] = self.boundary
+        return headers, jpeg, time.time()
+
+    def close(self):
+        self.connection.close()
+
+
+def with_params(url, **params):
+    """Append query parameters to a URL."""
+    return url + ('&' if urlsplit(url).query else '?') + urlencode(params)
+
+
+class StandbyStream:
+    """A pre-opened low-rate connection to the same stream, kept warm for failover.
+
+    A background thread (re)opens it and drains its parts, so when it is
+    promoted it is known to be alive and its latest part is current.
+    """
+
+    def __init__(self, url):
+        self.url = with_params(url, fps=STANDBY_FPS)
+        self.reader = None
+        self.latest = None
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="mjpeg-standby", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while not self.stopping.is_set():
+            try:
+                reader = MjpegPartReader(self.url, timeout=STALL_SECONDS)
+            except STREAM_ERRORS:
+                self.stopping.wait(STALL_SECONDS)
+                continue
+            try:
+                while not self.stopping.is_set():
+                    part = reader.next_part()
+                    with self.lock:
+                        self.reader, self.latest = reader, part
+            except STREAM_ERRORS:
+                with self.lock:
+                    self.reader = self.latest = None
+                reader.close()
+
+    def promote(self):
+        """Stop draining and hand over (reader, latest part), or None if the standby is down."""
+        self.stopping.set()
+        # Draining blocks for at most one standby frame interval
+        self.thread.join(timeout=STALL_SECONDS)
+        with self.lock:
+            reader, part = self.reader, self.latest
+            self.reader = self.latest = None
+        if reader is None or part is None or self.thread.is_alive():
+            return None
+        return reader, part
+
+    def close(self):
+        self.stopping.set()
+        with self.lock:
+            reader, self.reader = self.reader, None
+        if reader is not None:
+            reader.close()
+
+
+def make_stream_producer(url, monitor=None, standby=True):
+    """Return a factory for InferencePipeline's video_reference reading a Pi MJPEG stream.
+
+    monitor, if given, is told the receive time of every part
+    (frame_received) and about every switch to the standby connection
+    (record_outage), e.g. a PipelineSupervisor.
+    """
+    import cv2
+    from inference.core.interfaces.camera.entities import SourceProperties, VideoFrameProducer
+
+    class MjpegStreamProducer(VideoFrameProducer):
+        """Feeds InferencePipeline from the Pi stream, tracing each decoded frame."""
+
+        def __init__(self):
+            self.reader = None
+            self.part = None
+            self.fps = 30.0
+            self.standby = None
+            self.upgrade = None
+            try:
+                self.reader = MjpegPartReader(url, timeout=STALL_SECONDS)
+                # Read one part up front to learn the frame size
+                self.part = self.reader.next_part()
+                sample = cv2.imdecode(np.frombuffer(self.part[1], dtype=np.uint8), cv2.IMREAD_COLOR)
+                self.height, self.width = sample.shape[:2]
+                self.fps = float(self.part[0].get('x-stream-fps', self.fps))
+            except STREAM_ERRORS + (AttributeError,) as e:  # AttributeError: undecodable first frame
+                print(f"✗ Cannot read MJPEG stream {url}: {e}", flush=True)
+                self.release()
+                return
+            if standby:
+                self.standby = StandbyStream(url)
+
+        def isOpened(self):
+            return self.reader is not None
+
+        def grab(self):
+            if self.upgrade is not None:
+                # The full-rate connection is back; retire the promoted standby
+                self.reader.close()
+                self.reader, self.upgrade = self.upgrade, None
+                self.standby = StandbyStream(url)
+            try:
+                self.part = self.reader.next_part()
+            except STREAM_ERRORS as e:
+                if not self._fail_over(e):
+                    return False
+            if monitor is not None:
+                monitor.frame_received(self.part[2])
+            return True
+
+        def _fail_over(self, error):
+            """Continue on the standby connection. Returns False if it is not available."""
+            detected = time.time()
+            last_frame = self.part[2] if self.part else detected
+            promoted = self.standby.promote() if self.standby else None
+            self.standby = None
+            if promoted is None:
+                return False
+            self.reader.close()
+            self.reader, self.part = promoted
+            print(f"⚠ Stream {url} stalled ({error or 'timeout'}); continuing on the standby connection", flush=True)
+            if monitor is not None:
+                monitor.record_outage("stream", f"stream stalled: {error or 'timeout'}",
+                                      last_frame, detected, time.time())
+            threading.Thread(target=self._reconnect, name="mjpeg-reconnect", daemon=True).start()
+            return True
+
+        def _reconnect(self):
+            """Reopen the full-rate connection with backoff; grab() switches to it."""
+            delay = 1
+            while self.reader is not None:
+                try:
+                    reader = MjpegPartReader(url, timeout=STALL_SECONDS)
+                    reader.next_part()
+                    if self.reader is None:
+                        reader.close()  # Released meanwhile
+                    else:
+                        self.upgrade = reader
+                    return
+                except STREAM_ERRORS:
+                    time.sleep(delay)
+                    delay = min(delay * 2, 30)
+
+        def retrieve(self):
+            headers, jpeg, received_at = self.part
+            image = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if image is None:
+                return False, None
+            trace = {"received": received_at, "decoded": time.time()}
+            if 'x-capture-timestamp' in headers:
+                trace["captured"] = float(headers['x-capture-timestamp'])
+            if 'x-frame-id' in headers:
+                trace["frame_id"] = int(headers['x-frame-id'])
+            _record_trace(image, trace)
+            return True, image
+
+        def release(self):
+            if self.standby is not None:
+                self.standby.close()
+                self.standby = None
+            if self.upgrade is not None:
+                self.upgrade.close()
+                self.upgrade = None
+            if self.reader is not None:
+                self.reader.close()
+                self.reader = None
+
+        def discover_source_properties(self):
+            return SourceProperties(width=self.width, height=self.height,
+                                    total_frames=-1, is_file=False, fps=self.fps)
+
+        def initialize_source_properties(self, properties):
+            pass
+
+    return MjpegStreamProducer
@@ -0,0 +1,55 @@
+"""
+Pre-serialized JSON payloads for the dashboard API and Socket.IO feed.
+Payloads are built once per data change, stored as ready-to-send bytes with a
+version-based ETag, and swapped in atomically so readers never take a lock.
+"""
+
+import json
+import time
+from itertools import count
+from threading import Lock
+
+from flask import Response, request
+
+
+class PayloadCache:
+    """A JSON payload rebuilt by the writer and served as cached bytes."""
+
+    _versions = count(1)
+    # Distinguishes ETags across restarts, when the version counter starts over
+    _boot = format(int(time.time()), 'x')
+
+    def __init__(self, name, builder):
+        self.name = name
+        self.builder = builder
+        self._lock = Lock()  # serializes writers only; readers never lock
+        # (version, body bytes, body text, etag) - replaced as a whole on rebuild
+        self._snapshot = (0, b'null', 'null', f'{name}-{self._boot}-0')
+
+    def rebuild(self):
+        """Build and serialize the payload. Call after every data change."""
+        with self._lock:
+            text = json.dumps(self.builder(), separators=(',', ':'))
+            version = next(self._versions)
+            self._snapshot = (version, text.encode('utf-8'), text, f'{self.name}-{self._boot}-{version}')
+            return text
+
+    @property
+    def version(self):
+        return self._snapshot[0]
+
+    @property
+    def text(self):
+        """Serialized payload as a str, ready to emit over Socket.IO."""
+        return self._snapshot[2]
+
+    def response(self):
+        """Serve the cached bytes, answering conditional GETs with 304."""
+        _, body, _, etag = self._snapshot
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = Response(body, mimetype='application/json')
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
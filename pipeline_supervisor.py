@@ -0,0 +1,157 @@
+"""
+Supervisor for an InferencePipeline.
+A pipeline whose stream drops can hang in join() or end quietly, leaving the
+dashboard frozen on its last frame. The supervisor watches the time since the
+last sink result (and since the last frame arrived, when the source reports
+it), restarts a pipeline that stalled or exited with exponential backoff, and
+records every outage: how long results were missing and how long recovery
+took once the problem was noticed.
+"""
+
+import os
+import csv
+import time
+import threading
+from collections import deque
+from datetime import datetime
+
+STALL_SECONDS = 20  # No results for this long means the pipeline is stuck
+STARTUP_GRACE_SECONDS = 120  # First result after a (re)start may wait on model loading
+CHECK_SECONDS = 1.0
+MIN_BACKOFF_SECONDS = 1
+MAX_BACKOFF_SECONDS = 60
+TERMINATE_TIMEOUT_SECONDS = 10
+OUTAGE_LOG = "outages.csv"
+MAX_OUTAGES = 100  # Kept in memory for /api/outages
+
+# Every camera's supervisor appends to the same log; one writer at a time keeps rows whole
+outage_log_lock = threading.Lock()
+
+
+class PipelineSupervisor:
+    """Runs, watches and restarts one pipeline; records outages and recovery times."""
+
+    def __init__(self, name, build, readiness=None, stall_seconds=STALL_SECONDS, log_path=OUTAGE_LOG):
+        self.name = name
+        # Callable returning a new, not yet started pipeline
+        self.build = build
+        self.readiness = readiness
+        self.stall_seconds = stall_seconds
+        self.log_path = log_path
+
+        self.last_result = 0
+        self.last_frame = 0
+        self.restarts = 0
+        self.backoff = MIN_BACKOFF_SECONDS
+        self.outage = None  # Open outage, closed by the next result
+        self.outages = deque(maxlen=MAX_OUTAGES)
+        self.lock = threading.Lock()
+
+    def frame_received(self, received_at):
+        """Called by the stream source for every frame it reads."""
+        self.last_frame = received_at
+
+    def result_received(self, received_at):
+        """Called by the sink for every result; closes an open outage."""
+        self.last_result = received_at
+        if self.outage is None:
+            return
+        with self.lock:
+            outage, self.outage = self.outage, None
+        if outage is not None:
+            self.backoff = MIN_BACKOFF_SECONDS
+            self.record_outage(outage["kind"], outage["cause"], outage["started"], outage["detected"], received_at)
+
+    def record_outage(self, kind, cause, started, detected, recovered):
+        """Record an outage from the last good frame/result to the first one after recovery."""
+        record = {
+            "pipeline": self.name,
+            "kind": kind,
+            "cause": cause,
+            "started": datetime.fromtimestamp(started).strftime('%Y-%m-%d %H:%M:%S'),
+            "recovered": datetime.fromtimestamp(recovered).strftime('%Y-%m-%d %H:%M:%S'),
+            "outage_seconds": round(recovered - started, 2),
+            "recovery_seconds": round(recovered - detected, 2),
+        }
+        self.outages.append(record)
+        print(f"✓ [{self.name}] Recovered from {kind} outage after {record['outage_seconds']:.1f}s "
+              f"({record['recovery_seconds']:.1f}s after detection)", flush=True)
+
+        with outage_log_lock:
+            new_file = not os.path.exists(self.log_path)
+            with open(self.log_path, "a", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=list(record))
+                if new_file:
+                    writer.writeheader()
+                writer.writerow(record)
+
+    def run(self):
+        """Build, start and watch the pipeline, restarting it forever. Blocks."""
+        while True:
+            try:
+                pipeline = self.build()
+                pipeline.start()
+            except Exception as e:
+                self._restart_after(f"pipeline failed to start: {e}")
+                continue
+
+            started = time.time()
+            joiner = threading.Thread(target=pipeline.join, name=f"join-{self.name}", daemon=True)
+            joiner.start()
+            cause = self._watch(joiner, started)
+
+            pipeline.terminate()
+            joiner.join(TERMINATE_TIMEOUT_SECONDS)
+            if joiner.is_alive():
+                print(f"⚠ [{self.name}] Pipeline did not stop within {TERMINATE_TIMEOUT_SECONDS}s; abandoning it",
+                      flush=True)
+            self._restart_after(cause)
+
+    def _watch(self, joiner, started):
+        """Wait until the pipeline exits or stalls. Returns the reason."""
+        while True:
+            joiner.join(CHECK_SECONDS)
+            if not joiner.is_alive():
+                return "pipeline exited"
+            now = time.time()
+            if self.last_result >= started:
+                idle, limit = now - self.last_result, self.stall_seconds
+            else:
+                idle, limit = now - started, STARTUP_GRACE_SECONDS
+            if idle > limit:
+                cause = f"no results for {idle:.0f}s"
+                if self.last_frame:
+                    cause += f", last frame {now - self.last_frame:.0f}s ago"
+                return cause
+
+    def _restart_after(self, cause):
+        now = time.time()
+        with self.lock:
+            if self.outage is None:
+                self.outage = {"kind": "pipeline", "cause": cause, "started": self.last_result or now, "detected": now}
+        self.restarts += 1
+        print(f"⚠ [{self.name}] {cause}; restarting pipeline in {self.backoff}s (restart {self.restarts})", flush=True)
+        if self.readiness is not None:
+            # Never produced a result: a startup error rather than an outage
+            state = "recovering" if self.last_result else "error"
+            self.readiness.set(state, f"{cause}; restarting in {self.backoff}s")
+        time.sleep(self.backoff)
+        self.backoff = min(self.backoff * 2, MAX_BACKOFF_SECONDS)
+
+    def status(self):
+        now = time.time()
+        outages = list(self.outages)
+        outage = self.outage
+        return {
+            "restarts": self.restarts,
+            "last_result_age": round(now - self.last_result, 1) if self.last_result else None,
+            "last_frame_age": round(now - self.last_frame, 1) if self.last_frame else None,
+            "down_since": datetime.fromtimestamp(outage["started"]).strftime('%Y-%m-%d %H:%M:%S') if outage else None,
+            "outages": len(outages),
+            "mttr_seconds": round(sum(o["outage_seconds"] for o in outages) / len(outages), 2) if outages else None,
+            "mean_recovery_seconds": round(sum(o["recovery_seconds"] for o in outages) / len(outages), 2)
+            if outages else None,
+        }
+
+    def recent_outages(self):
+        return list(self.outages)
@@ -0,0 +1,170 @@
+"""
+On-demand sampling profiler for the running servers.
+When inference FPS drops there was no way to see where the time goes inside
+the sink, generate_frames or the Socket.IO threads without restarting under
+a profiler. GET /admin/profile?seconds=N samples the stack of every Python
+thread for N seconds, from the request's own thread, and returns:
+
+    collapsed (default)  one 'thread;outer;...;inner count' line per stack,
+                         ready for flamegraph.pl, speedscope or inferno
+    json                 CPU per thread (including native threads such as
+                         OpenCV's on Linux), process CPU and the hottest
+                         functions by samples at the top of the stack
+
+Nothing runs between requests, and only one profile runs at a time. The
+endpoint answers 404 unless the server has an ADMIN_TOKEN and the request
+sends it (Authorization: Bearer <token> or X-Admin-Token). Stdlib only, so
+the Pi can use it too.
+
+    curl -H "Authorization: Bearer $ADMIN_TOKEN" "http://localhost:5050/admin/profile?seconds=10" > app.folded
+    flamegraph.pl app.folded > app.svg
+"""
+
+import os
+import sys
+import hmac
+import time
+import threading
+from collections import Counter
+
+DEFAULT_SECONDS = 10
+MAX_SECONDS = 60
+DEFAULT_INTERVAL_MS = 10  # 100 Hz; a few percent of one core while sampling
+MIN_INTERVAL_MS = 1
+TOP_FUNCTIONS = 25
+
+profile_lock = threading.Lock()
+
+
+def is_admin(request, token):
+    """True if the server has an admin token and the Flask request carries it."""
+    if not token:
+        return False
+    supplied = request.headers.get("X-Admin-Token", "")
+    authorization = request.headers.get("Authorization", "")
+    if authorization.startswith("Bearer "):
+        supplied = authorization[len("Bearer "):]
+    return hmac.compare_digest(supplied.encode(), token.encode())
+
+
+def thread_cpu_times():
+    """{native thread id: (name, cpu seconds)} for every thread of this process, where the OS tells us."""
+    times = {}
+    names = {thread.native_id: thread.name for thread in threading.enumerate()}
+    task_dir = "/proc/self/task"
+    if os.path.isdir(task_dir):
+        # Linux: every thread, including native ones the interpreter never sees
+        ticks = os.sysconf("SC_CLK_TCK")
+        for task in os.listdir(task_dir):
+            try:
+                with open(os.path.join(task_dir, task, "stat")) as f:
+                    comm, fields = f.read().rsplit(")", 1)
+                fields = fields.split()
+                native_id = int(task)
+                name = names.get(native_id) or comm.split("(", 1)[1]
+                times[native_id] = (name, (int(fields[11]) + int(fields[12])) / ticks)
+            except (OSError, ValueError, IndexError):
+                continue  # Thread exited
+        return times
+    for thread in threading.enumerate():
+        try:
+            times[thread.native_id] = (thread.name, time.clock_gettime(time.pthread_getcpuclockid(thread.ident)))
+        except (AttributeError, OSError, TypeError):
+            continue  # No per-thread CPU clock on this platform (e.g. macOS)
+    return times
+
+
+def frame_label(code, labels):
+    label = labels.get(code)
+    if label is None:
+        label = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+        labels[code] = label
+    return label
+
+
+def sample(seconds, interval):
+    """Sample all other threads' stacks. Returns (Counter of (thread name, code objects root first), samples)."""
+    stacks = Counter()
+    me = threading.get_ident()
+    names = {}
+    samples = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        frames = sys._current_frames()
+        if any(ident not in names for ident in frames):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in frames.items():
+            if ident == me:
+                continue
+            codes = []
+            while frame is not None:
+                codes.append(frame.f_code)
+                frame = frame.f_back
+            stacks[(names.get(ident, f"thread-{ident}"), tuple(reversed(codes)))] += 1
+        samples += 1
+        time.sleep(interval)
+    return stacks, samples
+
+
+def profile(seconds=DEFAULT_SECONDS, interval=DEFAULT_INTERVAL_MS / 1000):
+    """Sample for seconds; returns (collapsed stack lines, summary dict)."""
+    wall_start, process_start = time.perf_counter(), time.process_time()
+    cpu_start = thread_cpu_times()
+    stacks, samples = sample(seconds, interval)
+    cpu_end = thread_cpu_times()
+    elapsed = time.perf_counter() - wall_start
+    process_cpu = time.process_time() - process_start
+
+    labels = {}
+    collapsed = []
+    self_samples = Counter()
+    thread_samples = Counter()
+    for (name, codes), hits in stacks.most_common():
+        frames = [frame_label(code, labels) for code in codes]
+        collapsed.append(";".join([name.replace(";", ":")] + frames) + f" {hits}")
+        if frames:
+            self_samples[frames[-1]] += hits
+        thread_samples[name] += hits
+
+    threads = []
+    for native_id, (name, cpu) in cpu_end.items():
+        if native_id in cpu_start:
+            threads.append({"name": name, "native_id": native_id,
+                            "cpu_percent": round(100 * (cpu - cpu_start[native_id][1]) / elapsed, 1),
+                            "samples": thread_samples.get(name, 0)})
+    threads.sort(key=lambda thread: thread["cpu_percent"], reverse=True)
+    # Python threads without a CPU figure (e.g. on macOS) still show their samples
+    listed = {thread["name"] for thread in threads}
+    threads += [{"name": name, "native_id": None, "cpu_percent": None, "samples": hits}
+                for name, hits in thread_samples.most_common() if name not in listed]
+
+    total = sum(self_samples.values()) or 1
+    summary = {
+        "seconds": round(elapsed, 2),
+        "interval_ms": round(interval * 1000, 1),
+        "samples": samples,
+        "process_cpu_percent": round(100 * process_cpu / elapsed, 1),
+        "threads": threads,
+        "top_functions": [{"function": label, "samples": hits, "percent": round(100 * hits / total, 1)}
+                          for label, hits in self_samples.most_common(TOP_FUNCTIONS)],
+    }
+    return collapsed, summary
+
+
+def profile_response(args):
+    """Run a profile for a Flask request's query args; returns a Flask response value."""
+    try:
+        seconds = min(float(args.get("seconds", DEFAULT_SECONDS)), MAX_SECONDS)
+        interval = max(float(args.get("interval_ms", DEFAULT_INTERVAL_MS)), MIN_INTERVAL_MS) / 1000
+    except ValueError:
+        return {"error": "seconds and interval_ms must be numbers"}, 400
+    if not profile_lock.acquire(blocking=False):
+        return {"error": "a profile is already running"}, 409
+    try:
+        print(f"⚠ Profiling all threads for {seconds:g}s", flush=True)
+        collapsed, summary = profile(seconds, interval)
+    finally:
+        profile_lock.release()
+    if args.get("format") == "json":
+        return summary
+    return "\n".join(collapsed) + "\n", 200, {"Content-Type": "text/plain; charset=utf-8"}
@@ -0,0 +1,323 @@
+"""
+Shared-memory frame ring for running camera capture and inference on one host.
+A single capture process reads the camera into fixed-size slots of a
+multiprocessing.shared_memory block; inference, recording and snapshot tools
+attach as readers and get NumPy views tagged with sequence numbers, and copy()
+the frames they keep.
+"""
+
+import os
+import sys
+import atexit
+import time
+import signal
+import argparse
+import subprocess
+from multiprocessing import shared_memory, resource_tracker
+
+import numpy as np
+
+RING_MAGIC = 0x4D494C4B  # "MILK"
+HEADER_FIELDS = 8  # magic, slots, height, width, channels, latest_seq, writer pid, reserved
+DEFAULT_RING_NAME = "milk_frames"
+DEFAULT_SLOTS = 16  # ~0.5 s of history at 30 FPS before a slot is reused
+
+
+def _align(offset, alignment=64):
+    return (offset + alignment - 1) // alignment * alignment
+
+
+def _layout(slots, height, width, channels):
+    """Return (seq offset, timestamp offset, pixels offset, total size)."""
+    seq_offset = HEADER_FIELDS * 8
+    ts_offset = seq_offset + slots * 8
+    pixels_offset = _align(ts_offset + slots * 8)
+    total = pixels_offset + slots * height * width * channels
+    return seq_offset, ts_offset, pixels_offset, total
+
+
+class FrameRing:
+    """Fixed-size frame slots in shared memory, one writer and many readers.
+
+    Views returned by read(), latest() and frames_iter() point into a slot the
+    writer reuses after `slots` frames, without waiting for readers. A reader
+    that keeps a frame, or hands it to code that may hold it, must use copy(),
+    or copy the view itself and then check is_current(seq): a False result
+    means the slot was rewritten during the copy and the pixels may be torn.
+    """
+
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.owner = owner
+        buf = shm.buf
+        self.header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=buf)
+        if self.header[0] != RING_MAGIC:
+            raise ValueError(f"Shared memory '{shm.name}' is not a frame ring")
+        self.slots, self.height, self.width, self.channels = (int(v) for v in self.header[1:5])
+        seq_offset, ts_offset, pixels_offset, _ = _layout(self.slots, self.height, self.width, self.channels)
+        self.slot_seq = np.ndarray((self.slots,), dtype=np.int64, buffer=buf, offset=seq_offset)
+        self.slot_ts = np.ndarray((self.slots,), dtype=np.float64, buffer=buf, offset=ts_offset)
+        self.frames = np.ndarray((self.slots, self.height, self.width, self.channels),
+                                 dtype=np.uint8, buffer=buf, offset=pixels_offset)
+
+    @classmethod
+    def create(cls, name, height, width, channels=3, slots=DEFAULT_SLOTS):
+        """Create a new ring. The creator is the single writer and unlinks it on close."""
+        _, _, _, total = _layout(slots, height, width, channels)
+        try:
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+        except FileNotFoundError:
+            pass
+        shm = shared_memory.SharedMemory(name=name, create=True, size=total)
+        header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=shm.buf)
+        header[:] = [RING_MAGIC, slots, height, width, channels, 0, os.getpid(), 0]
+        del header
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name=DEFAULT_RING_NAME):
+        """Attach to an existing ring as a reader."""
+        try:
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # Python < 3.13: stop the resource tracker unlinking the writer's block on exit
+            shm = shared_memory.SharedMemory(name=name)
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        return cls(shm, owner=False)
+
+    @property
+    def latest_seq(self):
+        return int(self.header[5])
+
+    @property
+    def writer_pid(self):
+        """PID of the process that created the ring (a ring left by a crashed run has a dead one)."""
+        return int(self.header[6])
+
+    def write(self, frame, timestamp=None):
+        """Copy a frame into the next slot and publish it. Returns its sequence number."""
+        seq = self.latest_seq + 1
+        slot = seq % self.slots
+        self.slot_seq[slot] = -1  # mark slot as being written
+        np.copyto(self.frames[slot], frame)
+        self.slot_ts[slot] = time.time() if timestamp is None else timestamp
+        self.slot_seq[slot] = seq
+        self.header[5] = seq
+        return seq
+
+    def next_slot(self):
+        """Claim the next slot for an in-place write; publish it with commit()."""
+        seq = self.latest_seq + 1
+        slot = seq % self.slots
+        self.slot_seq[slot] = -1
+        return seq, self.frames[slot]
+
+    def commit(self, seq, timestamp=None):
+        """Publish a slot previously claimed with next_slot()."""
+        slot = seq % self.slots
+        self.slot_ts[slot] = time.time() if timestamp is None else timestamp
+        self.slot_seq[slot] = seq
+        self.header[5] = seq
+
+    def read(self, seq):
+        """Return (timestamp, view) for a sequence number, or None if overwritten."""
+        slot = seq % self.slots
+        if seq <= 0 or self.slot_seq[slot] != seq:
+            return None
+        return float(self.slot_ts[slot]), self.frames[slot]
+
+    def is_current(self, seq):
+        """Check a view obtained for seq has not been overwritten since."""
+        return seq > 0 and self.slot_seq[seq % self.slots] == seq
+
+    def copy(self, seq, out=None):
+        """Return (timestamp, private copy) for a sequence number, or None if overwritten before or during the copy."""
+        entry = self.read(seq)
+        if entry is None:
+            return None
+        timestamp, view = entry
+        if out is None:
+            frame = view.copy()
+        else:
+            frame = out
+            np.copyto(frame, view)
+        if not self.is_current(seq):
+            return None  # The writer reached this slot while we were copying
+        return timestamp, frame
+
+    def latest(self):
+        """Return (seq, timestamp, view) for the newest frame, or None if empty."""
+        seq = self.latest_seq
+        entry = self.read(seq)
+        if entry is None:
+            return None
+        return (seq,) + entry
+
+    def wait_next(self, after_seq, timeout=1.0, poll_interval=0.002):
+        """Block until a frame newer than after_seq is published."""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            entry = self.latest()
+            if entry is not None and entry[0] > after_seq:
+                return entry
+            time.sleep(poll_interval)
+        return None
+
+    def frames_iter(self, timeout=5.0):
+        """Yield (seq, timestamp, view) for each new frame, skipping ones we fell behind on."""
+        seq = 0
+        while True:
+            entry = self.wait_next(seq, timeout=timeout)
+            if entry is None:
+                return
+            seq = entry[0]
+            yield entry
+
+    def close(self):
+        # Views must be dropped before the mapping can be closed
+        self.header = self.slot_seq = self.slot_ts = self.frames = None
+        self.shm.close()
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def run_capture(name=DEFAULT_RING_NAME, camera_index=0, width=1280, height=720,
+                fps=30, slots=DEFAULT_SLOTS):
+    """Capture loop: the only reader of the camera device. Runs until SIGTERM/Ctrl+C."""
+    import cv2
+
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda *_: stopping.append(True))
+
+    camera = cv2.VideoCapture(camera_index)
+    camera.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+    camera.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+    camera.set(cv2.CAP_PROP_FPS, fps)
+    ret, frame = camera.read() if camera.isOpened() else (False, None)
+    if not ret:
+        print(f"✗ ERROR: Could not open camera {camera_index}")
+        camera.release()
+        return 1
+
+    ring = FrameRing.create(name, frame.shape[0], frame.shape[1], frame.shape[2], slots)
+    ring.write(frame)
+    print(f"✓ Writing {frame.shape[1]}x{frame.shape[0]} frames to shared memory '{name}' ({slots} slots)")
+    try:
+        while not stopping:
+            seq, slot = ring.next_slot()
+            # Decode straight into the shared slot when OpenCV can reuse the buffer
+            ret, frame = camera.read(slot)
+            if not ret:
+                time.sleep(0.01)
+                continue
+            if not np.shares_memory(frame, slot):
+                np.copyto(slot, frame)
+            ring.commit(seq)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        camera.release()
+        ring.close()
+        print("Camera released, frame ring removed")
+    return 0
+
+
+def start_capture_process(name=DEFAULT_RING_NAME, camera_index=0, width=1280, height=720,
+                          fps=30, slots=DEFAULT_SLOTS, timeout=10):
+    """Launch run_capture() in its own process and wait until the ring is ready.
+
+    A plain subprocess is used so the capture side never imports the app or the
+    inference stack. Raises RuntimeError if the ring does not appear in time.
+    """
+    process = subprocess.Popen([
+        sys.executable, os.path.abspath(__file__),
+        "--name", name, "--camera", str(camera_index),
+        "--width", str(width), "--height", str(height),
+        "--fps", str(fps), "--slots", str(slots),
+    ])
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            break
+        try:
+            ring = FrameRing.attach(name)
+        except (FileNotFoundError, ValueError):
+            time.sleep(0.1)
+            continue
+        # A ring left in /dev/shm by a killed run attaches at once; wait for our child's
+        fresh = ring.writer_pid == process.pid
+        ring.close()
+        if not fresh:
+            time.sleep(0.1)
+            continue
+        atexit.register(process.terminate)
+        return process
+    process.terminate()
+    raise RuntimeError(f"Capture process for camera {camera_index} did not start")
+
+
+def make_frame_producer(name=DEFAULT_RING_NAME):
+    """Return a factory for InferencePipeline's video_reference reading the ring."""
+    from inference.core.interfaces.camera.entities import SourceProperties, VideoFrameProducer
+
+    class SharedMemoryFrameProducer(VideoFrameProducer):
+        """Feeds InferencePipeline with frames copied out of the shared frame ring.
+
+        The pipeline queues frames and the sink may still hold one long after
+        the writer has reused its slot, so each frame is copied and verified.
+        """
+
+        def __init__(self):
+            self.ring = FrameRing.attach(name)
+            self.seq = 0
+            self.fps = 30.0
+
+        def isOpened(self):
+            return self.ring is not None
+
+        def grab(self):
+            entry = self.ring.wait_next(self.seq, timeout=5.0)
+            if entry is None:
+                return False
+            self.seq = entry[0]
+            return True
+
+        def retrieve(self):
+            # A frame overwritten during the copy is retried with the newest one
+            for _ in range(3):
+                entry = self.ring.copy(self.seq)
+                if entry is not None:
+                    return True, entry[1]
+                self.seq = self.ring.latest_seq
+            return False, None
+
+        def release(self):
+            if self.ring is not None:
+                self.ring.close()
+                self.ring = None
+
+        def discover_source_properties(self):
+            return SourceProperties(width=self.ring.width, height=self.ring.height,
+                                    total_frames=-1, is_file=False, fps=self.fps)
+
+        def initialize_source_properties(self, properties):
+            self.fps = properties.get("fps", self.fps)
+
+    return SharedMemoryFrameProducer
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Capture camera frames into a shared-memory ring")
+    parser.add_argument("--name", default=DEFAULT_RING_NAME)
+    parser.add_argument("--camera", type=int, default=0)
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--slots", type=int, default=DEFAULT_SLOTS)
+    args = parser.parse_args()
+    sys.exit(run_capture(args.name, args.camera, args.width, args.height, args.fps, args.slots))
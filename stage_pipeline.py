@@ -0,0 +1,96 @@
+"""
+Bounded-queue stage pipeline for the inference sink.
+The inference callback only enqueues work; each heavier stage (overlay and
+JPEG encode, persistence and broadcast, ...) runs on its own worker thread so
+a slow stage can never reduce inference throughput.
+"""
+
+import time
+import queue
+import threading
+
+
+class Stage:
+    """A worker thread consuming items from a bounded queue."""
+
+    def __init__(self, name, handler, maxsize=2, drop_oldest=True, thread_name=None):
+        self.name = name
+        self.handler = handler
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.drop_oldest = drop_oldest
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.max_depth = 0
+        self.last_duration = 0.0
+        self.total_duration = 0.0
+        self.thread = threading.Thread(target=self._run, name=thread_name or f"stage-{name}",
+                                       daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def submit(self, item):
+        """Enqueue without blocking. When full, drop the oldest (or the new) item."""
+        while True:
+            try:
+                self.queue.put_nowait(item)
+                break
+            except queue.Full:
+                self.dropped += 1
+                if not self.drop_oldest:
+                    return False
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    pass
+        depth = self.queue.qsize()
+        if depth > self.max_depth:
+            self.max_depth = depth
+        return True
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            started = time.perf_counter()
+            try:
+                self.handler(item)
+            except Exception as e:
+                self.errors += 1
+                print(f"✗ Stage '{self.name}' error: {e}", flush=True)
+            self.last_duration = time.perf_counter() - started
+            self.total_duration += self.last_duration
+            self.processed += 1
+
+    def stats(self):
+        return {
+            "depth": self.queue.qsize(),
+            "capacity": self.queue.maxsize,
+            "max_depth": self.max_depth,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "last_ms": round(self.last_duration * 1000, 2),
+            "avg_ms": round(self.total_duration * 1000 / self.processed, 2) if self.processed else 0.0,
+        }
+
+
+class StagePipeline:
+    """A set of named stages fed by the inference sink."""
+
+    def __init__(self, prefix=None):
+        self.prefix = prefix
+        self.stages = {}
+
+    def add(self, name, handler, maxsize=2, drop_oldest=True):
+        thread_name = f"stage-{self.prefix}-{name}" if self.prefix else None
+        self.stages[name] = Stage(name, handler, maxsize, drop_oldest, thread_name).start()
+        return self.stages[name]
+
+    def submit(self, name, item):
+        return self.stages[name].submit(item)
+
+    def stats(self):
+        """Per-stage queue depth and timing metrics."""
+        return {name: stage.stats() for name, stage in self.stages.items()}
@@ -0,0 +1,109 @@
+"""
+Shared encoding variants for the dashboard's /video_feed.
+The overlay stage publishes each annotated frame once; clients asking for a
+smaller or lighter stream (?fps=5&width=640&quality=60) are mapped to a fixed
+set of (width, quality) variants, and each variant is resized and encoded at
+most once per frame however many clients subscribe to it.
+"""
+
+import time
+import threading
+
+VARIANT_WIDTHS = (320, 480, 640, 960, 1280)
+VARIANT_QUALITIES = (40, 50, 60, 70, 80, 90)
+MAX_STREAM_FPS = 30
+
+
+def snap(value, choices):
+    """Snap a requested value to the nearest allowed choice at or above it."""
+    for choice in choices:
+        if value <= choice:
+            return choice
+    return choices[-1]
+
+
+class StreamVariants:
+    """Latest frame plus lazily encoded, cached (width, quality) variants."""
+
+    def __init__(self):
+        self.frame = None
+        self.default_jpeg = None
+        self.seq = 0
+        self.ready = threading.Condition()
+        self.cache = {}  # (width, quality) -> (seq, JPEG bytes)
+        self.locks = {}
+        self.encodes = {}
+        self.subscribers = {}
+        self.subscribers_lock = threading.Lock()
+
+    def publish(self, image, jpeg_bytes):
+        """Make a new frame (and its full-size default encoding) current."""
+        with self.ready:
+            self.frame = image
+            self.default_jpeg = jpeg_bytes
+            self.seq += 1
+            self.ready.notify_all()
+
+    def variant_key(self, width=None, quality=None):
+        """Map requested parameters to a shared variant, or None for the default stream."""
+        if width is None and quality is None:
+            return None
+        return (snap(width, VARIANT_WIDTHS) if width else None,
+                snap(quality, VARIANT_QUALITIES) if quality else VARIANT_QUALITIES[-1])
+
+    def get(self, key):
+        """Return (seq, JPEG bytes) of the newest frame for a variant, or None."""
+        with self.ready:
+            frame, jpeg_bytes, seq = self.frame, self.default_jpeg, self.seq
+        if frame is None:
+            return None
+        if key is None:
+            return seq, jpeg_bytes
+
+        lock = self.locks.setdefault(key, threading.Lock())
+        with lock:
+            cached = self.cache.get(key)
+            if cached is not None and cached[0] >= seq:
+                return cached
+            import cv2
+            width, quality = key
+            if width and width < frame.shape[1]:
+                height = round(frame.shape[0] * width / frame.shape[1])
+                frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+            ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+            if not ret:
+                return None
+            cached = (seq, buffer.tobytes())
+            self.cache[key] = cached
+            self.encodes[key] = self.encodes.get(key, 0) + 1
+            return cached
+
+    def generate(self, fps=None, width=None, quality=None):
+        """Yield an MJPEG stream of one variant, one part per new frame, at most fps."""
+        key = self.variant_key(width, quality)
+        interval = 1.0 / max(1, min(fps or MAX_STREAM_FPS, MAX_STREAM_FPS))
+        with self.subscribers_lock:
+            self.subscribers[key] = self.subscribers.get(key, 0) + 1
+        last_seq = 0
+        try:
+            while True:
+                with self.ready:
+                    self.ready.wait_for(lambda: self.seq > last_seq, timeout=1.0)
+                entry = self.get(key)
+                if entry is not None and entry[0] != last_seq:
+                    last_seq = entry[0]
+                    yield (b'--frame\r\n'
+                           b'Content-Type: image/jpeg\r\n\r\n' + entry[1] + b'\r\n')
+                # Pace on a shared clock so clients at the same rate pick the
+                # same frames and share their encodings
+                time.sleep(interval - time.time() % interval)
+        finally:
+            with self.subscribers_lock:
+                self.subscribers[key] -= 1
+
+    def stats(self):
+        """Subscribers and encode counts per variant ('default' is the full-size stream)."""
+        name = lambda key: "default" if key is None else f"{key[0] or 'full'}w_q{key[1]}"
+        with self.subscribers_lock:
+            return {name(key): {"subscribers": count, "encodes": self.encodes.get(key, 0)}
+                    for key, count in self.subscribers.items()}
@@ -13,7 +13,7 @@ echo "======================================================"
 echo ""
 
 echo "Step 1: Copying updated camera_server_pi.py to Pi..."
-scp camera_server_pi.py ${PI_HOST}:~/${REPO_DIR}/
+scp camera_server_pi.py frame_pack.py sampling_profiler.py ${PI_HOST}:~/${REPO_DIR}/
 
 echo ""
 echo "Step 2: Restarting camera server..."
@@ -0,0 +1,114 @@
+"""
+Fast-start helpers for the dashboards.
+The past hour of counts and the recent alerts live in memory, so a restart
+used to show an empty dashboard until new results arrived. The apps now write
+them to a small JSON snapshot on shutdown (and whenever counts change, in case
+of a crash) and load it back before the server starts listening. Readiness tracks
+the inference pipeline warming up in the background so the dashboard can say
+what it is waiting for.
+"""
+
+import os
+import csv
+import json
+import time
+import threading
+from datetime import datetime, timedelta
+
+SNAPSHOT_VERSION = 1
+SNAPSHOT_MAX_AGE = timedelta(hours=1)  # Matches the in-memory history window
+STARTUP_LOG = "startup_times.csv"
+
+# Snapshots are saved from the persist stages and from atexit; writers share the .tmp file
+snapshot_lock = threading.Lock()
+
+
+def save_snapshot(path, timestamps, data_history, alerts, **extra):
+    """Atomically write the in-memory history to path."""
+    state = {
+        "version": SNAPSHOT_VERSION,
+        "saved_at": time.time(),
+        "timestamps": [ts.isoformat() for ts in timestamps],
+        "data": data_history,
+        "alerts": alerts,
+        **extra,
+    }
+    tmp_path = path + ".tmp"
+    with snapshot_lock:
+        with open(tmp_path, "w") as f:
+            json.dump(state, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+
+def load_snapshot(path, max_age=SNAPSHOT_MAX_AGE):
+    """Load a snapshot, dropping samples older than max_age. Returns None if unusable.
+
+    Samples are only recorded on changes, so the newest sample before the
+    cutoff is kept as the value in effect at its start.
+    """
+    try:
+        with open(path) as f:
+            state = json.load(f)
+    except (FileNotFoundError, ValueError) as e:
+        if not isinstance(e, FileNotFoundError):
+            print(f"⚠ Ignoring unreadable snapshot {path}: {e}")
+        return None
+    if state.get("version") != SNAPSHOT_VERSION:
+        return None
+
+    timestamps = [datetime.fromisoformat(ts) for ts in state["timestamps"]]
+    cutoff = datetime.now() - max_age
+    first = max(0, next((i for i, ts in enumerate(timestamps) if ts >= cutoff), len(timestamps)) - 1)
+    state["timestamps"] = timestamps[first:]
+    state["data"] = {flavor: values[first:] for flavor, values in state["data"].items()}
+    return state
+
+
+class Readiness:
+    """Startup state of one pipeline: loading -> connecting -> warming -> ready (or error, recovering)."""
+
+    def __init__(self, name, started_at, on_change=None, log_path=STARTUP_LOG):
+        self.name = name
+        self.started_at = started_at
+        self.on_change = on_change
+        self.log_path = log_path
+        self.state = "starting"
+        self.detail = ""
+        # Seconds from process start to entering each state
+        self.timings = {}
+        # Extra startup facts, e.g. where the workflow definition came from
+        self.info = {}
+        self.lock = threading.Lock()
+
+    @property
+    def ready(self):
+        return self.state == "ready"
+
+    def set(self, state, detail=""):
+        with self.lock:
+            if state == self.state and detail == self.detail:
+                return
+            self.state, self.detail = state, detail
+            first_time = state not in self.timings
+            self.timings.setdefault(state, round(time.time() - self.started_at, 2))
+        print(f"[{self.name}] {state} ({self.timings[state]:.2f}s){': ' + detail if detail else ''}", flush=True)
+        if state == "ready" and first_time and self.log_path:
+            self.log_startup()
+        if self.on_change:
+            self.on_change(self.status())
+
+    def log_startup(self):
+        """Append this start's time to first inference to the startup log."""
+        new_file = not os.path.exists(self.log_path)
+        with open(self.log_path, "a", newline="") as f:
+            writer = csv.writer(f)
+            if new_file:
+                writer.writerow(["started", "pipeline", "workflow_source", "workflow_seconds",
+                                 "first_inference_seconds"])
+            writer.writerow([datetime.fromtimestamp(self.started_at).strftime('%Y-%m-%d %H:%M:%S'), self.name,
+                             self.info.get("source", ""), self.info.get("load_seconds", ""),
+                             self.timings["ready"]])
+
+    def status(self):
+        return {"name": self.name, "state": self.state, "detail": self.detail,
+                "timings": dict(self.timings), "info": dict(self.info)}
@@ -0,0 +1,196 @@
+"""
+Local cache of the Roboflow workflow definition.
+Fetching the workflow over the network on every start is slow, and fails
+outright when the shop's uplink is down. The resolved specification is stored
+under workflow_cache/<workspace>/<workflow>/, one file per version (a hash of
+the specification) plus current.json, and the apps start from it without
+touching the network. Refresh explicitly when the workflow changes in Roboflow.
+
+Usage:
+    python workflow_cache.py info
+    python workflow_cache.py refresh
+    python workflow_cache.py use <version>    # roll back to an earlier version
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+load_dotenv("config.env")
+
+CACHE_DIR = "workflow_cache"
+WORKSPACE_NAME = "edss"
+WORKFLOW_ID = "count-milk-alerts"
+# Warn (but still start) when the cached definition is older than this
+MAX_AGE_DAYS = float(os.environ.get("WORKFLOW_CACHE_MAX_AGE_DAYS", "30"))
+# Set WORKFLOW_CACHE=0 to always fetch from Roboflow, as before
+USE_CACHE = os.environ.get("WORKFLOW_CACHE", "1").lower() in ("1", "true", "yes")
+
+
+def cache_path(workspace, workflow_id, name="current"):
+    return os.path.join(CACHE_DIR, workspace, workflow_id, f"{name}.json")
+
+
+def spec_version(specification):
+    """Short content hash identifying one version of a specification."""
+    canonical = json.dumps(specification, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()[:12]
+
+
+def find_models(node):
+    """Model IDs referenced anywhere in a specification, e.g. 'milk-bottles/3'."""
+    models = set()
+    if isinstance(node, dict):
+        for key, value in node.items():
+            if key == "model_id" and isinstance(value, str) and not value.startswith("$"):
+                models.add(value)
+            else:
+                models |= find_models(value)
+    elif isinstance(node, list):
+        for value in node:
+            models |= find_models(value)
+    return models
+
+
+def fetch_specification(api_key, workspace, workflow_id):
+    """Fetch the workflow specification from Roboflow, bypassing the library's caches."""
+    from inference.core.roboflow_api import get_workflow_specification
+    return get_workflow_specification(api_key=api_key, workspace_id=workspace,
+                                      workflow_id=workflow_id, use_cache=False)
+
+
+def write_entry(path, entry):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(entry, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def save_entry(workspace, workflow_id, specification, fetch_seconds):
+    """Store a fetched specification as its own version and make it current."""
+    entry = {
+        "workspace": workspace,
+        "workflow_id": workflow_id,
+        "version": spec_version(specification),
+        "fetched_at": time.time(),
+        "fetch_seconds": round(fetch_seconds, 2),
+        "models": sorted(find_models(specification)),
+        "specification": specification,
+    }
+    os.makedirs(os.path.dirname(cache_path(workspace, workflow_id)), exist_ok=True)
+    write_entry(cache_path(workspace, workflow_id, entry["version"]), entry)
+    write_entry(cache_path(workspace, workflow_id), entry)
+    return entry
+
+
+def load_entry(workspace, workflow_id, name="current"):
+    try:
+        with open(cache_path(workspace, workflow_id, name)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def refresh(api_key, workspace=WORKSPACE_NAME, workflow_id=WORKFLOW_ID):
+    """Fetch the latest definition and cache it. Returns (entry, changed)."""
+    previous = load_entry(workspace, workflow_id)
+    started = time.time()
+    specification = fetch_specification(api_key, workspace, workflow_id)
+    entry = save_entry(workspace, workflow_id, specification, time.time() - started)
+    return entry, previous is None or previous["version"] != entry["version"]
+
+
+def load_workflow(api_key, workspace=WORKSPACE_NAME, workflow_id=WORKFLOW_ID):
+    """Return (specification, info) for InferencePipeline, preferring the local cache.
+
+    info records where the definition came from ('cache', 'api', or 'cache
+    (offline)' when a fetch failed and an older cached copy was used) and how
+    long loading it took.
+    """
+    started = time.time()
+    entry = load_entry(workspace, workflow_id) if USE_CACHE else None
+    if entry is not None:
+        age_days = (time.time() - entry["fetched_at"]) / 86400
+        if age_days > MAX_AGE_DAYS:
+            print(f"⚠ Cached workflow {entry['version']} is {age_days:.0f} days old; "
+                  f"run 'python workflow_cache.py refresh' if it changed in Roboflow")
+        source = "cache"
+    else:
+        try:
+            entry, _ = refresh(api_key, workspace, workflow_id)
+            source = "api"
+        except Exception as e:
+            # Fall back to whatever was cached, even with WORKFLOW_CACHE=0
+            entry = load_entry(workspace, workflow_id)
+            if entry is None:
+                raise
+            print(f"⚠ Could not fetch workflow ({e}); using cached version {entry['version']}")
+            source = "cache (offline)"
+
+    info = {
+        "source": source,
+        "version": entry["version"],
+        "models": entry["models"],
+        "load_seconds": round(time.time() - started, 3),
+    }
+    print(f"✓ Workflow {workspace}/{workflow_id} version {entry['version']} from {source} "
+          f"({info['load_seconds']:.2f}s)")
+    return entry["specification"], info
+
+
+def list_versions(workspace, workflow_id):
+    directory = os.path.dirname(cache_path(workspace, workflow_id))
+    if not os.path.isdir(directory):
+        return []
+    entries = [load_entry(workspace, workflow_id, os.path.splitext(f)[0])
+               for f in os.listdir(directory) if f.endswith(".json") and f != "current.json"]
+    return sorted(entries, key=lambda entry: entry["fetched_at"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the local cache of the Roboflow workflow definition")
+    parser.add_argument("--workspace", default=WORKSPACE_NAME)
+    parser.add_argument("--workflow", default=WORKFLOW_ID)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("info", help="Show the cached versions")
+    commands.add_parser("refresh", help="Fetch the latest definition from Roboflow")
+    use_cmd = commands.add_parser("use", help="Make an earlier cached version current")
+    use_cmd.add_argument("version")
+    args = parser.parse_args()
+
+    if args.command == "refresh":
+        entry, changed = refresh(os.environ.get("ROBOFLOW_API_KEY"), args.workspace, args.workflow)
+        state = "new version" if changed else "unchanged"
+        print(f"✓ {args.workspace}/{args.workflow} version {entry['version']} ({state}, "
+              f"fetched in {entry['fetch_seconds']:.2f}s)")
+        print(f"  Models: {', '.join(entry['models']) or '-'}")
+        if changed:
+            print("  Restart the app to use it")
+    elif args.command == "use":
+        entry = load_entry(args.workspace, args.workflow, args.version)
+        if entry is None:
+            print(f"✗ No cached version {args.version}")
+            return 1
+        write_entry(cache_path(args.workspace, args.workflow), entry)
+        print(f"✓ Version {args.version} is now current; restart the app to use it")
+    else:
+        current = load_entry(args.workspace, args.workflow)
+        versions = list_versions(args.workspace, args.workflow)
+        if not versions:
+            print(f"No cached definition for {args.workspace}/{args.workflow}; run 'refresh'")
+            return 0
+        for entry in versions:
+            marker = "*" if current and entry["version"] == current["version"] else " "
+            fetched = datetime.fromtimestamp(entry["fetched_at"]).strftime("%Y-%m-%d %H:%M")
+            print(f"{marker} {entry['version']}  {fetched}  models: {', '.join(entry['models']) or '-'}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())